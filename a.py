@@ -1,9 +1,37 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import dataclasses
 import uuid  # Added to assign unique IDs to dynamic rows
-from datetime import datetime
-import plotly.express as px
+import os
+import threading
+
+from analytic import summarize_analytic
+from cache import ResultCache, normalize_scenario, scenario_key
+from charts import chart_data, stacked_line_chart
+from engine import (
+    RESULT_COLUMNS,
+    TOTAL_YEARS,
+    InputError,
+    PlanConstants,
+    Scenario,
+    bracket_summary,
+    build_schedules,
+    default_start_year,
+    extra_segments_from_rows,
+    inflation_segments_from_rows,
+    period_summary,
+    plan_interest,
+    plan_thresholds,
+    salary_segments_from_rows,
+)
+import kernels
+from plans import PLANS, compare_plans
+import timing
+import warmup
+# The modules behind the page's buttons (export, highres, incremental,
+# montecarlo, overpay, solver, store, sweep) are imported by the sections
+# that use them, and warmed up in the background (see warmup.py).
 
 # -------------------------
 # Custom CSS: Minimal styling and hide spinner for salary inputs only
@@ -52,29 +80,109 @@ st.markdown("""
 # App Title and Disclaimer
 # -------------------------
 st.title("UK Student Loan Repayment Simulator")
-st.markdown("#### Calculate your repayment over 40 years")
+st.markdown("#### Calculate your repayment until your loan is repaid or written off")
 st.markdown("""
 **Disclaimer:** This tool is for informational purposes only and does not constitute financial advice.  
 Always verify with an official source such as the UK Government website [https://www.gov.uk/repaying-your-student-loan](https://www.gov.uk/repaying-your-student-loan) before making financial decisions. I am not responsible for any inaccuracies or decisions made based on this tool.
 """, unsafe_allow_html=True)
 
+# -------------------------
+# Saved Scenarios: Loading a Shared Link (?s=<token>)
+# -------------------------
+@st.cache_resource
+def get_scenario_store():
+    # One SQLite store per server process (see store.py).
+    from store import ScenarioStore
+
+    return ScenarioStore.from_env()
+
+def load_inputs(inputs):
+    # Put saved inputs (the API's request format) into the widgets and rows,
+    # before the widgets are created.
+    study = int(inputs.get("study_years", 4))
+    if "tuition" in inputs:
+        st.session_state.tuition_loan = float(inputs["tuition"])
+        st.session_state.maintenance_loan = float(inputs["maintenance"])
+    else:
+        st.session_state.tuition_loan = float(inputs["starting_loan"]) / max(study, 1)
+        st.session_state.maintenance_loan = 0.0
+    st.session_state.study_years = study
+    # The saved start year is kept while the years of study stay as saved,
+    # so a shared link shows the dates the sharer saw.
+    st.session_state.saved_start_year = (int(inputs["start_year"]), study) if "start_year" in inputs else None
+    st.session_state.repayment_plan = inputs.get("plan") or "custom"
+    for name in ("salary_rows", "inflation_rows", "extra_repayment_rows"):
+        st.session_state[name] = [{"id": str(uuid.uuid4()), **row} for row in inputs.get(name, [])]
+        st.session_state.pop(f"{name}_draft", None)
+
+shared_token = st.query_params.get("s")
+if shared_token and st.session_state.get("loaded_token") != shared_token:
+    st.session_state.loaded_token = shared_token
+    shared = get_scenario_store().load(shared_token)
+    if shared is None:
+        st.warning("The shared scenario in this link was not found.")
+    else:
+        load_inputs(shared.inputs)
+        st.session_state.loaded_scenario = shared
+
 # -------------------------
 # Student Loan Details Inputs
 # -------------------------
 st.markdown("### Student Loan Details")
+st.session_state.setdefault("tuition_loan", 9535.0)
+st.session_state.setdefault("maintenance_loan", 6647.0)
+st.session_state.setdefault("study_years", 4)
 tuition_loan = st.number_input(
     "Tuition Loan Amount (£ per year)", 
-    value=9535.0, 
     step=100.0,
-    format="%.2f"
+    format="%.2f",
+    key="tuition_loan",
 )
 maintenance_loan = st.number_input(
     "Maintenance Loan Amount (£ per year)", 
-    value=6647.0, 
     step=100.0,
-    format="%.2f"
+    format="%.2f",
+    key="maintenance_loan",
+)
+study_years = st.number_input("Number of Years of Study", step=1, key="study_years")
+saved_start_year = st.session_state.get("saved_start_year")
+if saved_start_year and saved_start_year[1] == study_years:
+    start_year = saved_start_year[0]
+else:
+    start_year = default_start_year(study_years)
+plan_key = st.selectbox(
+    "Repayment Plan",
+    options=["custom"] + list(PLANS),
+    format_func=lambda key: "Custom (£27,295 threshold, interest as entered, 40 years)" if key == "custom" else PLANS[key].name,
+    key="repayment_plan",
 )
-study_years = st.number_input("Number of Years of Study", value=4, step=1)
+if plan_key != "custom":
+    selected_plan = PLANS[plan_key]
+    st.caption(f"{selected_plan.description} Written off after {selected_plan.write_off_years} years.")
+
+# -------------------------
+# Timeline Editors: Fragments with an Apply Step
+# -------------------------
+# Each editor is a fragment, so typing in it, adding or removing a row only
+# reruns that editor.  Edits go to a draft copy of the rows; "Apply" copies
+# the draft to the rows the simulations use and reruns the whole page.
+def draft_rows(name):
+    draft = f"{name}_draft"
+    if draft not in st.session_state:
+        st.session_state[draft] = [dict(row) for row in st.session_state[name]]
+    return st.session_state[draft]
+
+def apply_controls(name):
+    pending = draft_rows(name) != st.session_state[name]
+    cols = st.columns([3, 4])
+    with cols[0]:
+        clicked = st.button("Apply Changes", key=f"apply_{name}", type="primary", disabled=not pending)
+    with cols[1]:
+        if pending:
+            st.caption("Changes not applied yet: the simulations use the rows as last applied.")
+    if clicked:
+        st.session_state[name] = [dict(row) for row in draft_rows(name)]
+        st.rerun()
 
 # -------------------------
 # Dynamic Salary Timeline Inputs (Working Perfectly)
@@ -94,37 +202,41 @@ if "salary_rows" not in st.session_state:
     ]
 
 def add_salary_row():
-    st.session_state.salary_rows.append({"id": str(uuid.uuid4()), "salary": 0.0, "years": 0})
+    draft_rows("salary_rows").append({"id": str(uuid.uuid4()), "salary": 0.0, "years": 0})
 
 def remove_salary_row(row_id):
-    st.session_state.salary_rows = [row for row in st.session_state.salary_rows if row["id"] != row_id]
-    if len(st.session_state.salary_rows) == 0:
-        st.session_state.salary_rows.append({"id": str(uuid.uuid4()), "salary": 0.0, "years": 0})
+    st.session_state.salary_rows_draft = [row for row in draft_rows("salary_rows") if row["id"] != row_id]
+    if len(st.session_state.salary_rows_draft) == 0:
+        st.session_state.salary_rows_draft.append({"id": str(uuid.uuid4()), "salary": 0.0, "years": 0})
 
-for row in st.session_state.salary_rows:
-    cols = st.columns([3, 3, 1])
-    with cols[0]:
-        row["salary"] = st.number_input(
-            label=f"Salary (£ per year)",
-            value=row["salary"],
-            key=f"salary_{row['id']}",
-            format="%.2f",
-            step=1000.0  # Change salary in steps of 1,000
-        )
-    with cols[1]:
-        row["years"] = st.number_input(
-            label=f"Years at this salary\n(Enter 0 for indefinite)",
-            value=int(row["years"]),
-            key=f"years_{row['id']}",
-            step=1,
-            format="%d"
-        )
-    with cols[2]:
-        st.markdown("<div class='remove-button-container'>", unsafe_allow_html=True)
-        st.button("Remove", key=f"remove_salary_{row['id']}", on_click=remove_salary_row, args=(row["id"],))
-        st.markdown("</div>", unsafe_allow_html=True)
-st.button("Add Salary Row", on_click=add_salary_row)
+@st.fragment
+def salary_editor():
+    for row in draft_rows("salary_rows"):
+        cols = st.columns([3, 3, 1])
+        with cols[0]:
+            row["salary"] = st.number_input(
+                label=f"Salary (£ per year)",
+                value=row["salary"],
+                key=f"salary_{row['id']}",
+                format="%.2f",
+                step=1000.0  # Change salary in steps of 1,000
+            )
+        with cols[1]:
+            row["years"] = st.number_input(
+                label=f"Years at this salary\n(Enter 0 for indefinite)",
+                value=int(row["years"]),
+                key=f"years_{row['id']}",
+                step=1,
+                format="%d"
+            )
+        with cols[2]:
+            st.markdown("<div class='remove-button-container'>", unsafe_allow_html=True)
+            st.button("Remove", key=f"remove_salary_{row['id']}", on_click=remove_salary_row, args=(row["id"],))
+            st.markdown("</div>", unsafe_allow_html=True)
+    st.button("Add Salary Row", on_click=add_salary_row)
+    apply_controls("salary_rows")
 
+salary_editor()
 salary_df = pd.DataFrame(st.session_state.salary_rows)
 
 # -------------------------
@@ -134,8 +246,8 @@ st.markdown("### Inflation Timeline")
 st.markdown("""
 Enter the estimated annual inflation rate and the number of years that rate applies.  
 For the final row, enter **0** in "Years" to continue until the end of the simulation.  
-**For loans taken out from 2023 (Plan 5):** Interest is charged at the Retail Price Index (RPI).  
-**For loans taken out before 2023 (Plan 2):** Interest is charged at RPI + 3%.  
+With a **Custom** repayment plan, the rate entered is the interest rate charged on your loan.  
+With a UK repayment plan, enter the Retail Price Index (RPI): the plan adds its own margin, e.g. Plan 2 charges RPI plus up to 3% depending on your income and Plan 5 charges RPI.  
 More details can be found on the [government website](https://www.gov.uk/repaying-your-student-loan/what-you-pay).
 """)
 
@@ -146,37 +258,41 @@ if "inflation_rows" not in st.session_state:
     ]
 
 def add_inflation_row():
-    st.session_state.inflation_rows.append({"id": str(uuid.uuid4()), "inflation": 0.0, "years": 0})
+    draft_rows("inflation_rows").append({"id": str(uuid.uuid4()), "inflation": 0.0, "years": 0})
     # No experimental_rerun() to avoid lag
 
 def remove_inflation_row(row_id):
-    st.session_state.inflation_rows = [row for row in st.session_state.inflation_rows if row["id"] != row_id]
-    if len(st.session_state.inflation_rows) == 0:
-        st.session_state.inflation_rows.append({"id": str(uuid.uuid4()), "inflation": 0.0, "years": 0})
+    st.session_state.inflation_rows_draft = [row for row in draft_rows("inflation_rows") if row["id"] != row_id]
+    if len(st.session_state.inflation_rows_draft) == 0:
+        st.session_state.inflation_rows_draft.append({"id": str(uuid.uuid4()), "inflation": 0.0, "years": 0})
     # No experimental_rerun() to avoid lag
 
-for row in st.session_state.inflation_rows:
-    cols = st.columns([3, 3, 1])
-    with cols[0]:
-        row["inflation"] = st.number_input(
-            label=f"Inflation Rate % (Row)",
-            value=row["inflation"],
-            key=f"inflation_{row['id']}"
-        )
-    with cols[1]:
-        row["years"] = st.number_input(
-            label=f"Years\n(Enter 0 for indefinite)",
-            value=int(row["years"]),
-            key=f"inflation_years_{row['id']}",
-            step=1,
-            format="%d"
-        )
-    with cols[2]:
-        st.markdown("<div class='remove-button-container'>", unsafe_allow_html=True)
-        st.button("Remove", key=f"remove_inflation_{row['id']}", on_click=remove_inflation_row, args=(row["id"],))
-        st.markdown("</div>", unsafe_allow_html=True)
-st.button("Add Inflation Row", on_click=add_inflation_row)
+@st.fragment
+def inflation_editor():
+    for row in draft_rows("inflation_rows"):
+        cols = st.columns([3, 3, 1])
+        with cols[0]:
+            row["inflation"] = st.number_input(
+                label=f"Inflation Rate % (Row)",
+                value=row["inflation"],
+                key=f"inflation_{row['id']}"
+            )
+        with cols[1]:
+            row["years"] = st.number_input(
+                label=f"Years\n(Enter 0 for indefinite)",
+                value=int(row["years"]),
+                key=f"inflation_years_{row['id']}",
+                step=1,
+                format="%d"
+            )
+        with cols[2]:
+            st.markdown("<div class='remove-button-container'>", unsafe_allow_html=True)
+            st.button("Remove", key=f"remove_inflation_{row['id']}", on_click=remove_inflation_row, args=(row["id"],))
+            st.markdown("</div>", unsafe_allow_html=True)
+    st.button("Add Inflation Row", on_click=add_inflation_row)
+    apply_controls("inflation_rows")
 
+inflation_editor()
 inflation_df = pd.DataFrame(st.session_state.inflation_rows)
 
 # -------------------------
@@ -194,411 +310,736 @@ if "extra_repayment_rows" not in st.session_state:
     ]
 
 def add_extra_row():
-    st.session_state.extra_repayment_rows.append({"id": str(uuid.uuid4()), "extra_payment": 0.0, "start_month": 1, "duration_months": 0})
+    draft_rows("extra_repayment_rows").append({"id": str(uuid.uuid4()), "extra_payment": 0.0, "start_month": 1, "duration_months": 0})
     # No experimental_rerun() to avoid lag
 
 def remove_extra_row(row_id):
-    st.session_state.extra_repayment_rows = [row for row in st.session_state.extra_repayment_rows if row["id"] != row_id]
-    if len(st.session_state.extra_repayment_rows) == 0:
-        st.session_state.extra_repayment_rows.append({"id": str(uuid.uuid4()), "extra_payment": 0.0, "start_month": 1, "duration_months": 0})
+    st.session_state.extra_repayment_rows_draft = [row for row in draft_rows("extra_repayment_rows") if row["id"] != row_id]
+    if len(st.session_state.extra_repayment_rows_draft) == 0:
+        st.session_state.extra_repayment_rows_draft.append({"id": str(uuid.uuid4()), "extra_payment": 0.0, "start_month": 1, "duration_months": 0})
     # No experimental_rerun() to avoid lag
 
-for row in st.session_state.extra_repayment_rows:
-    cols = st.columns([3, 3, 3, 1.5])
-    with cols[0]:
-        row["extra_payment"] = st.number_input(
-            label="Extra Payment\n(£ per month)",
-            value=row["extra_payment"],
-            key=f"extra_payment_{row['id']}",
-            format="%.2f",
-            step=50.0
-        )
-    with cols[1]:
-        row["start_month"] = st.number_input(
-            label="Start Month\n(Relative to repayment start)",
-            value=row["start_month"],
-            key=f"extra_start_month_{row['id']}",
-            step=1,
-            format="%d"
-        )
-    with cols[2]:
-        row["duration_months"] = st.number_input(
-            label="Duration in Months\n(Enter 0 for indefinite)",
-            value=row["duration_months"],
-            key=f"extra_duration_{row['id']}",
-            step=1,
-            format="%d"
-        )
-    with cols[3]:
-        st.markdown("<div class='remove-button-container'>", unsafe_allow_html=True)
-        st.button("Remove", key=f"remove_extra_{row['id']}", on_click=remove_extra_row, args=(row["id"],))
-        st.markdown("</div>", unsafe_allow_html=True)
-st.button("Add Extra Repayment Row", on_click=add_extra_row)
+@st.fragment
+def extra_repayment_editor():
+    for row in draft_rows("extra_repayment_rows"):
+        cols = st.columns([3, 3, 3, 1.5])
+        with cols[0]:
+            row["extra_payment"] = st.number_input(
+                label="Extra Payment\n(£ per month)",
+                value=row["extra_payment"],
+                key=f"extra_payment_{row['id']}",
+                format="%.2f",
+                step=50.0
+            )
+        with cols[1]:
+            row["start_month"] = st.number_input(
+                label="Start Month\n(Relative to repayment start)",
+                value=row["start_month"],
+                key=f"extra_start_month_{row['id']}",
+                step=1,
+                format="%d"
+            )
+        with cols[2]:
+            row["duration_months"] = st.number_input(
+                label="Duration in Months\n(Enter 0 for indefinite)",
+                value=row["duration_months"],
+                key=f"extra_duration_{row['id']}",
+                step=1,
+                format="%d"
+            )
+        with cols[3]:
+            st.markdown("<div class='remove-button-container'>", unsafe_allow_html=True)
+            st.button("Remove", key=f"remove_extra_{row['id']}", on_click=remove_extra_row, args=(row["id"],))
+            st.markdown("</div>", unsafe_allow_html=True)
+    st.button("Add Extra Repayment Row", on_click=add_extra_row)
+    apply_controls("extra_repayment_rows")
 
+extra_repayment_editor()
 extra_df = pd.DataFrame(st.session_state.extra_repayment_rows)
 
+# -------------------------
+# Other Repayment Details & Constants
+# -------------------------
+if plan_key == "custom":
+    plan = PlanConstants()  # UK Plan 2 annual threshold, 9% of income above it
+    total_years = TOTAL_YEARS
+else:
+    plan = PLANS[plan_key].constants
+    total_years = PLANS[plan_key].write_off_years
+try:
+    first_inflation = float(inflation_df.iloc[0]["inflation"])
+except Exception:
+    first_inflation = 2.0
+# Threshold in force when repayments start.
+repayment_threshold = plan_thresholds(plan, start_year, np.array([first_inflation]))[0][0]
+
 # -------------------------
 # Calculation Information (Moved Just Above the Run Button)
 # -------------------------
 st.markdown("#### Calculation Information")
-st.markdown("""
-- **Regular Repayment:** Calculated as 9% of your annual income above £25,000 (pre‑tax).  
+st.markdown(f"""
+- **Regular Repayment:** Calculated as {plan.repayment_rate:.0%} of your annual income above £{repayment_threshold:,.0f} (pre‑tax){", with the threshold raised by RPI each April" if plan.uprate_with_rpi else ""}.  
 - **Extra Repayments:** Any extra repayment is applied directly to your outstanding loan balance, reducing future interest accrual and potentially shortening your repayment period.
 """)
 
+RESOLUTIONS = {
+    "model": "Monthly (one repayment and interest charge a month)",
+    "monthly": "Daily interest, monthly pay",
+    "four-weekly": "Daily interest, four-weekly pay",
+    "weekly": "Daily interest, weekly pay",
+}
+pay_frequency = st.selectbox(
+    "Simulation Resolution", list(RESOLUTIONS), format_func=RESOLUTIONS.get,
+    help="The daily modes accrue interest every day and take repayments from each pay (weekly and four-weekly pay days are Fridays, monthly ones the last day of the month), with the interest rate changing each April (September under Plan 1).",
+)
+
+def build_scenario(starting_loan):
+    # Convert the timeline rows into the engine's typed inputs (raises InputError).
+    return Scenario(
+        starting_loan=starting_loan,
+        salary_segments=salary_segments_from_rows(st.session_state.salary_rows),
+        inflation_segments=inflation_segments_from_rows(st.session_state.inflation_rows),
+        extra_segments=extra_segments_from_rows(st.session_state.extra_repayment_rows),
+        start_year=start_year,
+        total_years=total_years,
+        plan=plan,
+    )
+
 # -------------------------
-# Other Repayment Details & Constants
+# Save and Share
 # -------------------------
-repayment_threshold = 27295  # UK Plan 2 annual threshold
+def page_inputs():
+    # The inputs in the API's request format, as saved by the scenario store.
+    return {
+        "tuition": tuition_loan,
+        "maintenance": maintenance_loan,
+        "study_years": int(study_years),
+        "start_year": start_year,
+        "plan": None if plan_key == "custom" else plan_key,
+        "salary_rows": st.session_state.salary_rows,
+        "inflation_rows": st.session_state.inflation_rows,
+        "extra_repayment_rows": st.session_state.extra_repayment_rows,
+    }
+
+def current_user(create=False):
+    # Signed-in users keep their saved scenarios under their email; anyone
+    # else under a random id kept in the URL, so a bookmark keeps the list.
+    if st.user.get("is_logged_in"):
+        return st.user.get("email")
+    if create and "u" not in st.query_params:
+        st.query_params["u"] = uuid.uuid4().hex[:12]
+    return st.query_params.get("u")
+
+def share_link(token):
+    return f"{(st.context.url or '').split('?')[0]}?s={token}"
+
+def saved_summary_text(summary):
+    payoff = summary["payoff_month"]
+    outcome = (f"repaid in {payoff // 12} years, {payoff % 12} months" if payoff
+               else f"£{summary['written_off']:,.2f} written off")
+    return f"£{summary['total_repaid']:,.2f} repaid in total, {outcome}"
+
+def load_saved(token):
+    # The shared-link loader at the top of the page picks this up.
+    st.query_params["s"] = token
+
+st.markdown("### Save and Share")
+st.markdown("""
+Save the inputs above (as last applied) to come back to them, or share them: anyone with the link opens the same inputs. Saved results are shown without re-running the simulation.
+""")
+loaded = st.session_state.get("loaded_scenario")
+if loaded is not None and st.query_params.get("s") == loaded.token:
+    st.info(f"Opened from a shared link: {saved_summary_text(loaded.summary)}.")
+save_cols = st.columns([3, 1])
+with save_cols[0]:
+    scenario_name = st.text_input("Scenario Name", value="My scenario", max_chars=100)
+with save_cols[1]:
+    st.markdown("<div class='remove-button-container'>", unsafe_allow_html=True)
+    save_clicked = st.button("Save Scenario")
+    st.markdown("</div>", unsafe_allow_html=True)
+if save_clicked:
+    try:
+        saved = get_scenario_store().save(page_inputs(), current_user(create=True), scenario_name.strip() or "Untitled")
+    except InputError as exc:
+        st.error(str(exc))
+    else:
+        st.success(f"Saved: {saved_summary_text(saved.summary)}. Share it with this link:")
+        st.code(share_link(saved.token), language=None)
+
+user_id = current_user()
+saved_scenarios = get_scenario_store().list_saved(user_id) if user_id else []
+if saved_scenarios:
+    with st.expander("Your Saved Scenarios (most recent first)"):
+        for item in saved_scenarios:
+            item_cols = st.columns([3, 5, 1])
+            item_cols[0].markdown(f"**{item.name}**  \n[Link]({share_link(item.token)})")
+            item_cols[1].caption(saved_summary_text(item.summary))
+            item_cols[2].button("Load", key=f"load_{item.token}", on_click=load_saved, args=(item.token,))
 
 # -------------------------
-# Simulation Function with Extra Repayments
+# Simulation Report (Cached Across Sessions)
 # -------------------------
-def simulate_repayment(salary_df, inflation_df, starting_loan, total_years=40):
-    total_months = total_years * 12  # 40 years
-    # Set simulation start date: current year + study years + 1
-    start_year = datetime.now().year + int(study_years) + 1
-    start_date = pd.to_datetime(f"{start_year}-01-01")
-    
-    # Build month-by-month salary schedule.
-    month_salary_schedule = []
-    bracket_indices = []  # row index in salary_df for each month
-    bracket_details = []  # list of tuples: (salary, months_in_bracket)
-    assigned_months = 0
-    for idx, row in salary_df.iterrows():
-        try:
-            sal = float(row["salary"])
-        except Exception:
-            st.error(f"Invalid salary value in row {idx+1}")
-            return None, None, None
-        # For the "years" value: 0 means indefinite, so treat as None.
-        yrs = int(row["years"]) if row["years"] != 0 else None
-        if yrs is None:
-            months = total_months - assigned_months
-        else:
-            months = int(yrs * 12)
-        months = min(months, total_months - assigned_months)
-        bracket_details.append((sal, months))
-        month_salary_schedule.extend([sal] * months)
-        bracket_indices.extend([idx] * months)
-        assigned_months += months
-        if assigned_months >= total_months:
-            break
-    if assigned_months < total_months:
-        last_sal = bracket_details[-1][0] if bracket_details else 0
-        extra_months = total_months - assigned_months
-        bracket_details.append((last_sal, extra_months))
-        month_salary_schedule.extend([last_sal] * extra_months)
-        bracket_indices.extend([len(bracket_details)-1] * extra_months)
-    
-    # Build month-by-month inflation schedule.
-    month_inflation_schedule = []
-    inflation_assigned = 0
-    for idx, row in inflation_df.iterrows():
-        try:
-            inf_rate = float(row["inflation"])
-        except Exception:
-            st.error(f"Invalid inflation rate in row {idx+1}")
-            return None, None, None
-        try:
-            yrs_val = int(row["years"]) if row["years"] != 0 else None
-        except Exception:
-            yrs_val = None
-        if yrs_val is None:
-            months = total_months - inflation_assigned
-        else:
-            months = int(yrs_val * 12)
-        months = min(months, total_months - inflation_assigned)
-        month_inflation_schedule.extend([inf_rate] * months)
-        inflation_assigned += months
-        if inflation_assigned >= total_months:
-            break
-    if inflation_assigned < total_months:
-        last_inf = month_inflation_schedule[-1] if month_inflation_schedule else 0
-        extra_months = total_months - inflation_assigned
-        month_inflation_schedule.extend([last_inf] * extra_months)
-    
-    # Build month-by-month extra repayment schedule.
-    extra_repayment_schedule = [0.0] * total_months
-    if "extra_repayment_rows" in st.session_state:
-        for row in st.session_state.extra_repayment_rows:
-            try:
-                extra_amount = float(row["extra_payment"])
-            except Exception:
-                extra_amount = 0.0
-            # Adjust for 0-based indexing: if user enters month 1, start at index 0.
-            start_month_offset = int(row["start_month"]) - 1  
-            duration = int(row["duration_months"])
-            if duration == 0:
-                months_active = total_months - start_month_offset
-            else:
-                months_active = duration
-            for m in range(start_month_offset, min(start_month_offset + months_active, total_months)):
-                extra_repayment_schedule[m] += extra_amount
-    
-    # -------------------------
-    # Simulation Loop
-    # -------------------------
-    loan_repaid_month = None  # Month when loan is fully repaid
-    balance = starting_loan
-    cumulative_paid = 0.0
-
-    months_list = []
-    dates_list = []
-    salary_list = []
-    regular_payment_list = []
-    extra_payment_list = []
-    total_payment_list = []
-    balance_list = []
-    cumulative_paid_list = []
-    interest_list = []
-    bracket_list = []
-    min_salary_list = []  # Minimum salary required to cover interest
-
-    for month in range(total_months):
-        current_salary = month_salary_schedule[month]
-        current_inf = month_inflation_schedule[month]
-        current_monthly_inflation = (current_inf / 100) / 12
-
-        # Regular monthly payment from salary (if above threshold)
-        if current_salary > repayment_threshold:
-            regular_payment = ((current_salary - repayment_threshold) * 0.09) / 12
-        else:
-            regular_payment = 0.0
+@st.cache_resource
+def get_result_cache():
+    # One cache per server process, shared by every session.
+    return ResultCache.from_env()
 
-        # Extra payment from extra repayments schedule
-        extra_payment = extra_repayment_schedule[month]
+@st.cache_resource
+def start_metrics_server():
+    # Stage timings of every session in Prometheus format, if LOAN_METRICS_PORT is set.
+    port = os.environ.get("LOAN_METRICS_PORT")
+    return timing.start_metrics_server(int(port)) if port else None
 
-        # Total scheduled payment before capping by remaining balance
-        scheduled_payment = regular_payment + extra_payment
+start_metrics_server()
 
-        # Accrue interest first
-        interest = balance * current_monthly_inflation
-        balance += interest
+def simulate_from_last_run(scenario):
+    # Each session keeps its last run so an edit only re-simulates the months
+    # from the first one it changes (see incremental.py).
+    from incremental import simulate_incremental
 
-        # Cap payment if it exceeds remaining balance
-        if scheduled_payment > balance:
-            # Apply regular payment first, then extra repayment as possible.
-            if regular_payment >= balance:
-                regular_payment = balance
-                extra_payment = 0.0
-            else:
-                extra_payment = balance - regular_payment
-            scheduled_payment = balance
+    result, st.session_state.last_run = simulate_incremental(
+        scenario, st.session_state.get("last_run"), dtype=os.environ.get("LOAN_RESULT_DTYPE", "float64"),
+    )
+    return result
 
-        balance -= scheduled_payment
-        cumulative_paid += scheduled_payment
+def simulate_report(scenario):
+    if pay_frequency == "model":
+        return build_report(simulate_from_last_run(scenario), scenario)
+    from highres import simulate_high_resolution
 
-        # Calculate the minimum salary required to cover a year's worth of interest at this balance.
-        min_salary = repayment_threshold + (balance * current_monthly_inflation * 12) / 0.09
-        
-        months_list.append(month + 1)
-        current_date = start_date + pd.DateOffset(months=month)
-        dates_list.append(current_date)
-        salary_list.append(current_salary)
-        regular_payment_list.append(regular_payment)
-        extra_payment_list.append(extra_payment)
-        total_payment_list.append(scheduled_payment)
-        balance_list.append(balance)
-        cumulative_paid_list.append(cumulative_paid)
-        interest_list.append(interest)
-        bracket_list.append(bracket_indices[month])
-        min_salary_list.append(min_salary)
-
-        if balance <= 0:
-            loan_repaid_month = month + 1
-            # Fill in remaining months with zeros if loan is repaid early.
-            for extra_month in range(month+1, total_months):
-                months_list.append(extra_month+1)
-                current_date = start_date + pd.DateOffset(months=extra_month)
-                dates_list.append(current_date)
-                salary_list.append(month_salary_schedule[extra_month])
-                regular_payment_list.append(0.0)
-                extra_payment_list.append(0.0)
-                total_payment_list.append(0.0)
-                balance_list.append(0.0)
-                cumulative_paid_list.append(cumulative_paid)
-                interest_list.append(0.0)
-                bracket_list.append(bracket_indices[extra_month])
-                min_salary_list.append(repayment_threshold)
-            break
-
-    sim_df = pd.DataFrame({
-        "Month": months_list,
-        "Date": dates_list,
-        "Salary": salary_list,
-        "Regular Payment": regular_payment_list,
-        "Extra Payment": extra_payment_list,
-        "Total Payment": total_payment_list,
-        "Interest Accrued": interest_list,
-        "Cumulative Paid": cumulative_paid_list,
-        "Loan Balance": balance_list,
-        "Bracket": bracket_list,
-        "Minimum Salary (to Offset Interest)": min_salary_list
+    result, payoff_date = simulate_high_resolution(
+        scenario, pay_frequency, dtype=os.environ.get("LOAN_RESULT_DTYPE", "float64"),
+    )
+    return {**build_report(result, scenario), "payoff_date": payoff_date}
+
+def build_report(result, scenario):
+    timer = timing.Stopwatch()
+
+    # Line chart data (rounded to 2dp): one frame for the three charts, with
+    # only as many dates as they need (see charts.py).  Balances are taken at
+    # the start of each period, payments and minimum salaries averaged.
+    sim_df_graph = chart_data(
+        result.frame(["Date", "Loan Balance", "Total Payment", "Minimum Salary (to Offset Interest)"]).set_index("Date"),
+        how={"Loan Balance": "first"},
+    ).round(2)
+    timer.lap("chart_data")
+
+    # -------------------------
+    # Detailed Salary Bracket Summary
+    # -------------------------
+    brackets = bracket_summary(result)
+    months_in_bracket = brackets["Months"].to_numpy()
+    # Threshold in force in each bracket's first month.
+    threshold = build_schedules(scenario).threshold
+    bracket_starts = np.minimum(np.r_[0, np.cumsum(months_in_bracket)[:-1]], len(threshold) - 1)
+    bracket_threshold = threshold[bracket_starts]
+    m_payment = np.where(
+        brackets["Salary"] > bracket_threshold,
+        ((brackets["Salary"] - bracket_threshold) * scenario.plan.repayment_rate) / 12,
+        0.0,
+    )
+    annual_payment = m_payment * 12
+    weekly_payment = annual_payment / 52
+    avg_growth = np.divide(
+        brackets["Total Interest"], months_in_bracket,
+        out=np.zeros(len(brackets)), where=months_in_bracket > 0,
+    )
+    summary_df = pd.DataFrame({
+        "Salary (Annual, £)": [f"£{sal:,.0f}" for sal in brackets["Salary"]],
+        "Years in Bracket": [f"{months / 12:.0f}" for months in months_in_bracket],
+        "Monthly Payment (£)": np.round(m_payment, 2),
+        "Annual Payment (£)": np.round(annual_payment, 2),
+        "Weekly Payment (£)": np.round(weekly_payment, 2),
+        "Total Payment in Bracket (£)": brackets["Total Payment"].round(2),
+        "Total Interest Accrued (£)": brackets["Total Interest"].round(2),
+        "Avg Loan Growth per Month (£)": np.round(avg_growth, 2),
+        "Avg Minimum Salary (to Offset Interest)": brackets["Avg Minimum Salary"].round(2),
     })
-    
-    return sim_df, bracket_details, loan_repaid_month
+    timer.lap("bracket_summary")
+
+    # -------------------------
+    # Yearly and Tax-Year Summaries
+    # -------------------------
+    yearly_df = period_summary(result, by="year").round(2)
+    tax_year_df = period_summary(result, by="tax_year").round(2)
+    timer.lap("period_summaries")
+
+    # The month-by-month table is the largest part of a report, so it is
+    # built from the compact result only when displayed (monthly_table).
+    return {
+        "result": result,
+        "chart_df": sim_df_graph,
+        "summary_df": summary_df,
+        "yearly_df": yearly_df,
+        "tax_year_df": tax_year_df,
+    }
+
+def download_buttons(label, file_stem, reader):
+    # One button per format.  The file is only written (from a fresh, lazy
+    # reader) when its button is clicked, and clicking does not rerun the page.
+    from export import available_formats, export_bytes
+
+    formats = available_formats()
+    columns = st.columns([3] + [1] * len(formats))
+    columns[0].markdown(f"**{label}**")
+    for column, (fmt, mime) in zip(columns[1:], formats.items()):
+        column.download_button(
+            fmt.upper(),
+            data=lambda fmt=fmt: export_bytes(reader(), fmt),
+            file_name=f"{file_stem}.{fmt}",
+            mime=mime,
+            key=f"download_{file_stem}_{fmt}",
+            on_click="ignore",
+        )
+
+def monthly_table(result):
+    # Final month-by-month repayment details (rounded to 2dp).
+    final_df = result.frame([name for name in RESULT_COLUMNS if name not in ("Month", "Bracket")])
+    final_df["Date"] = final_df["Date"].dt.date
+    return final_df.round(2)
 
 # -------------------------
 # Run Simulation Button
 # -------------------------
+# The headline numbers alone, in closed form, are cheap enough for every rerun.
+try:
+    quick_estimate = summarize_analytic(build_scenario((tuition_loan + maintenance_loan) * study_years))
+except InputError:
+    quick_estimate = None
+if quick_estimate is not None:
+    model = "" if pay_frequency == "model" else " (monthly resolution)"
+    st.caption(f"Quick estimate{model}: {saved_summary_text(dataclasses.asdict(quick_estimate))}. "
+               "Run the simulation for the month-by-month breakdown.")
+
 if st.button("Run Simulation"):
-    starting_loan = (tuition_loan + maintenance_loan) * study_years
-    colA, colB = st.columns(2)
-    with colA:
-        st.metric("Starting Loan (when you graduate)", f"£{starting_loan:,.2f}")
-    try:
-        first_inflation = float(inflation_df.iloc[0]["inflation"])
-    except Exception:
-        first_inflation = 2.0
-    first_monthly_inflation = (first_inflation / 100) / 12
-    initial_min_salary = repayment_threshold + (starting_loan * first_monthly_inflation * 12) / 0.09
-    with colB:
-        st.metric("Initial Minimum Salary to Offset Interest", f"£{initial_min_salary:,.2f}")
+    import plotly.express as px  # only needed for results (see warmup.py)
+
+    with timing.trace("run_simulation") as run_timings:
+        starting_loan = (tuition_loan + maintenance_loan) * study_years
+        colA, colB = st.columns(2)
+        with colA:
+            st.metric("Starting Loan (when you graduate)", f"£{starting_loan:,.2f}")
+        try:
+            first_salary = float(salary_df.iloc[0]["salary"])
+        except Exception:
+            first_salary = 0.0
+        # The plan's interest rate in the first month (the inflation rate entered, plus any margin).
+        first_interest = float(plan_interest(np.array([first_inflation]), np.array([first_salary]), plan)[0])
+        first_monthly_inflation = (first_interest / 100) / 12
+        initial_min_salary = repayment_threshold + (starting_loan * first_monthly_inflation * 12) / plan.repayment_rate
+        with colB:
+            st.metric("Initial Minimum Salary to Offset Interest", f"£{initial_min_salary:,.2f}")
     
-    result = simulate_repayment(salary_df, inflation_df, starting_loan, total_years=40)
-    if result[0] is None:
-        st.error("Simulation failed due to input errors.")
-    else:
-        sim_df, bracket_details, loan_repaid_month = result
-        st.markdown("### Simulation Summary")
-        if loan_repaid_month:
-            years = loan_repaid_month // 12
-            rem_months = loan_repaid_month % 12
-            st.success(f"### Loan fully repaid in {years} years, {rem_months} months.")
+        try:
+            scenario = normalize_scenario(build_scenario(starting_loan))
+            with timing.span("simulation_report"):
+                report_key = scenario_key(scenario) if pay_frequency == "model" else f"{scenario_key(scenario)}:{pay_frequency}"
+                report = get_result_cache().get_or_compute(report_key, lambda: simulate_report(scenario))
+        except InputError as exc:
+            st.error(str(exc))
+            report = None
+        if report is None:
+            st.error("Simulation failed due to input errors.")
         else:
-            st.error(f"##### Loan not fully repaid within 40 years. \n ### Outstanding Balance: £{sim_df['Loan Balance'].iloc[-1]:,.2f}")
+            # Cached reports are shared between sessions, so they are never modified here.
+            timer = timing.Stopwatch()
+            result = report["result"]
+            bracket_details, loan_repaid_month = result.bracket_details, result.loan_repaid_month
+            final_balance = float(result.column("Loan Balance")[-1])
+            st.markdown("### Simulation Summary")
+            if loan_repaid_month:
+                years = loan_repaid_month // 12
+                rem_months = loan_repaid_month % 12
+                st.success(f"### Loan fully repaid in {years} years, {rem_months} months.")
+                if report.get("payoff_date"):
+                    st.caption(f"Last repayment on {report['payoff_date']:%d %B %Y}.")
+            else:
+                st.error(f"##### Loan not fully repaid within {scenario.total_years} years. \n ### Outstanding Balance: £{final_balance:,.2f}")
        
-        total_repaid = sim_df['Cumulative Paid'].iloc[-1]
-        total_months = 40 * 12
-        if loan_repaid_month is not None:
-            avg_monthly_repayment = total_repaid / loan_repaid_month
-        else:
-            avg_monthly_repayment = total_repaid / total_months
+            total_repaid = float(result.column("Cumulative Paid")[-1])
+            total_months = scenario.total_months
+            if loan_repaid_month is not None:
+                avg_monthly_repayment = total_repaid / loan_repaid_month
+            else:
+                avg_monthly_repayment = total_repaid / total_months
         
-        colC, colD = st.columns(2)
-        with colC:
-            st.metric("Total Amount Repaid", f"£{total_repaid:,.2f}")
-        with colD:
-            st.metric("Average Monthly Repayment", f"£{avg_monthly_repayment:,.2f}")
+            colC, colD = st.columns(2)
+            with colC:
+                st.metric("Total Amount Repaid", f"£{total_repaid:,.2f}")
+            with colD:
+                st.metric("Average Monthly Repayment", f"£{avg_monthly_repayment:,.2f}")
+            timer.lap("summary_metrics")
                 
-        # -------------------------
-        # Pie Chart for Repayment Breakdown using Plotly
-        # -------------------------
-        if loan_repaid_month is not None:
-            labels = ["Original Loan", "Interest Paid"]
-            interest_paid = total_repaid - starting_loan
-            values = [starting_loan, interest_paid]
-            title = "Breakdown of Total Repayments: Original Loan vs Interest"
-            color_sequence = ["forestgreen", "darkorange"]
-        else:
-            labels = ["Amount Repaid", "Outstanding Balance"]
-            values = [total_repaid, sim_df["Loan Balance"].iloc[-1]]
-            title = "Repaid vs Outstanding Balance"
-            color_sequence = ["crimson", "royalblue"]
-
-        values = [round(v, 2) for v in values]
-        pie_fig = px.pie(
-            names=labels,
-            values=values,
-            title=title,
-            template="plotly_white",
-            color_discrete_sequence=color_sequence
-        )
-        pie_fig.update_traces(
-            texttemplate='£%{value:,.2f}',
-            textfont_size=20
-        )
-        st.plotly_chart(pie_fig, use_container_width=True)
-
-        # Additional pie chart if not fully repaid and total repaid > starting loan.
-        if loan_repaid_month is None and total_repaid > starting_loan:
-            labels2 = ["Original Loan", "Interest Paid"]
-            values2 = [starting_loan, total_repaid - starting_loan]
-            title2 = "Breakdown: Original Loan vs Interest Paid"
-            color_sequence2 = ["forestgreen", "darkorange"]
-            values2 = [round(v, 2) for v in values2]
-            pie_fig2 = px.pie(
-                names=labels2,
-                values=values2,
-                title=title2,
+            # -------------------------
+            # Pie Chart for Repayment Breakdown using Plotly
+            # -------------------------
+            if loan_repaid_month is not None:
+                labels = ["Original Loan", "Interest Paid"]
+                interest_paid = total_repaid - starting_loan
+                values = [starting_loan, interest_paid]
+                title = "Breakdown of Total Repayments: Original Loan vs Interest"
+                color_sequence = ["forestgreen", "darkorange"]
+            else:
+                labels = ["Amount Repaid", "Outstanding Balance"]
+                values = [total_repaid, final_balance]
+                title = "Repaid vs Outstanding Balance"
+                color_sequence = ["crimson", "royalblue"]
+
+            values = [round(v, 2) for v in values]
+            pie_fig = px.pie(
+                names=labels,
+                values=values,
+                title=title,
                 template="plotly_white",
-                color_discrete_sequence=color_sequence2
+                color_discrete_sequence=color_sequence
             )
-            pie_fig2.update_traces(
+            pie_fig.update_traces(
                 texttemplate='£%{value:,.2f}',
                 textfont_size=20
             )
-            st.plotly_chart(pie_fig2, use_container_width=True)
-
-        # -------------------------
-        # Line Charts using Streamlit's st.line_chart
-        # -------------------------
-        sim_df_graph = sim_df.copy()
-        sim_df_graph["Loan Balance"] = sim_df_graph["Loan Balance"].round(2)
-        sim_df_graph["Total Payment"] = sim_df_graph["Total Payment"].round(2)
-        sim_df_graph["Minimum Salary (to Offset Interest)"] = sim_df_graph["Minimum Salary (to Offset Interest)"].round(2)
-        sim_df_graph = sim_df_graph.set_index("Date")
-        
-        st.markdown("#### Loan Balance Over Time")
-        st.line_chart(sim_df_graph[["Loan Balance"]])
-        st.markdown("#### Total Monthly Payment Over Time")
-        st.line_chart(sim_df_graph[["Total Payment"]])
-        st.markdown("#### Minimum Salary to Offset Interest Over Time")
-        st.line_chart(sim_df_graph[["Minimum Salary (to Offset Interest)"]])
-        
-        # -------------------------
-        # Detailed Salary Bracket Summary
-        # -------------------------
-        summary_data = {
-            "Salary (Annual, £)": [],
-            "Years in Bracket": [],
-            "Monthly Payment (£)": [],
-            "Annual Payment (£)": [],
-            "Weekly Payment (£)": [],
-            "Total Payment in Bracket (£)": [],
-            "Total Interest Accrued (£)": [],
-            "Avg Loan Growth per Month (£)": [],
-            "Avg Minimum Salary (to Offset Interest)": []
+            st.plotly_chart(pie_fig, width="stretch")
+
+            # Additional pie chart if not fully repaid and total repaid > starting loan.
+            if loan_repaid_month is None and total_repaid > starting_loan:
+                labels2 = ["Original Loan", "Interest Paid"]
+                values2 = [starting_loan, total_repaid - starting_loan]
+                title2 = "Breakdown: Original Loan vs Interest Paid"
+                color_sequence2 = ["forestgreen", "darkorange"]
+                values2 = [round(v, 2) for v in values2]
+                pie_fig2 = px.pie(
+                    names=labels2,
+                    values=values2,
+                    title=title2,
+                    template="plotly_white",
+                    color_discrete_sequence=color_sequence2
+                )
+                pie_fig2.update_traces(
+                    texttemplate='£%{value:,.2f}',
+                    textfont_size=20
+                )
+                st.plotly_chart(pie_fig2, width="stretch")
+            timer.lap("pie_charts")
+
+            # -------------------------
+            # Line Charts (one chart, one dataset, shared dates)
+            # -------------------------
+            sim_df_graph = report["chart_df"]
+            st.altair_chart(stacked_line_chart(sim_df_graph, titles={
+                "Loan Balance": "Loan Balance Over Time",
+                "Total Payment": "Total Monthly Payment Over Time",
+                "Minimum Salary (to Offset Interest)": "Minimum Salary to Offset Interest Over Time",
+            }), width="stretch")
+            timer.lap("line_charts")
+
+            st.markdown("#### Salary Bracket Summary")
+            st.dataframe(report["summary_df"])
+
+            st.markdown("#### Yearly Summary")
+            year_tab, tax_year_tab = st.tabs(["Calendar Year", "Tax Year (April to March)"])
+            with year_tab:
+                st.dataframe(report["yearly_df"], hide_index=True)
+            with tax_year_tab:
+                st.dataframe(report["tax_year_df"], hide_index=True)
+            timer.lap("summary_tables")
+
+            st.markdown("#### Month-by-Month Repayment Details")
+            st.dataframe(monthly_table(result))
+            # Serializing the table to Arrow; sending it to the browser happens after the script.
+            timer.lap("monthly_table")
+
+            from export import bracket_reader, monthly_reader
+
+            st.markdown("#### Download (full precision)")
+            download_buttons("Month-by-Month Repayment Details", "monthly_repayments", lambda: monthly_reader(result))
+            download_buttons("Salary Bracket Summary", "salary_brackets", lambda: bracket_reader(result))
+
+    # -------------------------
+    # Debug Panel: Stage Timings (add ?debug=timings to the URL)
+    # -------------------------
+    if st.query_params.get("debug") == "timings":
+        with st.expander("Performance Timings (debug)", expanded=True):
+            st.markdown(f"**This run:** {run_timings.seconds * 1000:,.1f} ms")
+            st.dataframe(pd.DataFrame({
+                "Stage": list(run_timings.stages()),
+                "Milliseconds": [round(seconds * 1000, 3) for seconds in run_timings.stages().values()],
+            }), hide_index=True)
+            stats = timing.stage_stats()
+            st.markdown("**All runs in this server process:**")
+            st.dataframe(pd.DataFrame({
+                "Stage": list(stats),
+                "Count": [s.count for s in stats.values()],
+                "p50 (ms)": [round(s.p50 * 1000, 3) for s in stats.values()],
+                "p95 (ms)": [round(s.p95 * 1000, 3) for s in stats.values()],
+            }), hide_index=True)
+
+# -------------------------
+# Side-by-Side Repayment Plan Comparison
+# -------------------------
+st.markdown("### Compare Repayment Plans")
+st.markdown("""
+Run your inputs under every UK repayment plan at once. Your inflation timeline is read as RPI, and each plan applies its own threshold, repayment rate, interest margin and write-off term.
+""")
+if st.button("Compare Plans"):
+    from export import frame_reader
+
+    starting_loan = (tuition_loan + maintenance_loan) * study_years
+    try:
+        comparison = compare_plans(build_scenario(starting_loan))
+    except InputError as exc:
+        st.error(str(exc))
+        comparison = None
+    if comparison is not None:
+        plan_summary = comparison.summary
+        st.dataframe(pd.DataFrame({
+            "Repayment Rate": [f"{rate:.0%}" for rate in plan_summary["Repayment Rate"]],
+            "Written Off After (Years)": plan_summary["Write-Off (Years)"],
+            "Years to Repay": plan_summary["Years to Repay"].round(1),
+            "Total Repaid (£)": plan_summary["Total Repaid"].round(2),
+            "Interest Paid (£)": plan_summary["Interest Paid"].round(2),
+            "Written Off (£)": plan_summary["Written Off"].round(2),
+        }, index=plan_summary.index))
+        st.caption("Years to Repay is blank for plans whose balance is written off before it is repaid.")
+        st.markdown("#### Loan Balance by Plan")
+        st.line_chart(chart_data(comparison.balances, how={name: "first" for name in comparison.balances}).round(2))
+        download_buttons("Plan Comparison", "plan_comparison", lambda: frame_reader(comparison.summary))
+        download_buttons("Monthly Balance by Plan", "plan_balances", lambda: frame_reader(comparison.balances))
+
+# -------------------------
+# Monte Carlo: Stochastic Inflation and Salary Paths
+# -------------------------
+st.markdown("### Monte Carlo Simulation")
+st.markdown("""
+Instead of a single inflation and salary timeline, simulate many possible futures around the ones entered above.  
+Each path adds a random, persistent (AR(1)) deviation to your inflation timeline and random year-to-year pay growth to your salary timeline. Under plans whose threshold rises with RPI, each path raises it by its own inflation.
+""")
+with st.expander("Monte Carlo Settings"):
+    mc_cols = st.columns(2)
+    with mc_cols[0]:
+        mc_paths = st.number_input("Number of Paths", value=10000, min_value=100, max_value=200000, step=1000)
+        mc_inflation_vol = st.number_input("Inflation Volatility (% points per year)", value=1.0, min_value=0.0, step=0.25)
+        mc_persistence = st.number_input("Inflation Persistence (0 to 1)", value=0.6, min_value=0.0, max_value=0.99, step=0.05)
+    with mc_cols[1]:
+        mc_seed = st.number_input("Random Seed", value=42, step=1, format="%d")
+        mc_salary_vol = st.number_input("Salary Growth Volatility (% per year)", value=5.0, min_value=0.0, step=0.5)
+        mc_salary_drift = st.number_input("Extra Salary Growth (% per year)", value=0.0, step=0.5)
+
+if st.button("Run Monte Carlo"):
+    import plotly.express as px
+    from export import monte_carlo_reader
+    from montecarlo import MonteCarloConfig, simulate_monte_carlo
+
+    starting_loan = (tuition_loan + maintenance_loan) * study_years
+    config = MonteCarloConfig(
+        n_paths=int(mc_paths),
+        seed=int(mc_seed),
+        inflation_persistence=mc_persistence,
+        inflation_volatility=mc_inflation_vol,
+        salary_drift=mc_salary_drift / 100,
+        salary_volatility=mc_salary_vol / 100,
+    )
+    try:
+        mc_result = simulate_monte_carlo(build_scenario(starting_loan), config)
+    except InputError as exc:
+        st.error(str(exc))
+        mc_result = None
+    if mc_result is not None:
+        colE, colF = st.columns(2)
+        with colE:
+            st.metric(f"Probability of Repaying Within {total_years} Years", f"{mc_result.payoff_probability:.1%}")
+        with colF:
+            st.metric("Median Total Repaid", f"£{np.median(mc_result.total_repaid):,.2f}")
+
+        st.markdown("#### Loan Balance Percentile Bands")
+        st.line_chart(chart_data(mc_result.balance_bands).round(2))
+
+        st.markdown("#### Distribution of Total Amount Repaid")
+        counts, edges = np.histogram(mc_result.total_repaid, bins=40)
+        hist_fig = px.bar(
+            x=(edges[:-1] + edges[1:]) / 2,
+            y=counts / mc_result.n_paths,
+            labels={"x": "Total Repaid (£)", "y": "Share of Paths"},
+            template="plotly_white",
+        )
+        st.plotly_chart(hist_fig, width="stretch")
+
+        st.markdown("#### Outcome Percentiles (£)")
+        st.dataframe(mc_result.distribution().round(2))
+        st.caption(f"Simulated {mc_result.n_paths:,} paths with the {kernels.active_backend()} kernel backend.")
+        download_buttons("Outcome of Every Path", "monte_carlo_paths", lambda: monte_carlo_reader(mc_result))
+
+# -------------------------
+# Sensitivity Analysis: Parameter Sweep Heatmaps
+# -------------------------
+st.markdown("### Sensitivity Analysis")
+st.markdown("""
+See how the total repaid and the time to repay change across a grid of starting salaries, interest rates and extra monthly payments.  
+The starting salary replaces the salary in your first salary row and the interest rate replaces your inflation timeline; everything else is taken from the inputs above.
+""")
+with st.expander("Sweep Ranges"):
+    sweep_cols = st.columns(3)
+    with sweep_cols[0]:
+        sweep_salary_min = st.number_input("Starting Salary From (£)", value=20000.0, step=1000.0, format="%.2f")
+        sweep_salary_max = st.number_input("Starting Salary To (£)", value=80000.0, step=1000.0, format="%.2f")
+        sweep_salary_steps = st.number_input("Salary Steps", value=25, min_value=2, max_value=500, step=1)
+    with sweep_cols[1]:
+        sweep_inflation_min = st.number_input("Interest Rate From (%)", value=0.0, step=0.5)
+        sweep_inflation_max = st.number_input("Interest Rate To (%)", value=8.0, step=0.5)
+        sweep_inflation_steps = st.number_input("Interest Rate Steps", value=25, min_value=2, max_value=500, step=1)
+    with sweep_cols[2]:
+        sweep_extra_min = st.number_input("Extra Payment From (£ per month)", value=0.0, step=50.0, format="%.2f")
+        sweep_extra_max = st.number_input("Extra Payment To (£ per month)", value=500.0, step=50.0, format="%.2f")
+        sweep_extra_steps = st.number_input("Extra Payment Steps", value=6, min_value=1, max_value=500, step=1)
+
+if st.button("Run Sensitivity Analysis"):
+    from sweep import SweepAxis, run_sweep
+
+    starting_loan = (tuition_loan + maintenance_loan) * study_years
+    axes = [
+        SweepAxis.linspace("starting_salary", sweep_salary_min, sweep_salary_max, int(sweep_salary_steps)),
+        SweepAxis.linspace("inflation", sweep_inflation_min, sweep_inflation_max, int(sweep_inflation_steps)),
+        SweepAxis.linspace("extra_payment", sweep_extra_min, sweep_extra_max, int(sweep_extra_steps)),
+    ]
+    sweep_progress = st.progress(0.0, text="Simulating grid...")
+    try:
+        st.session_state.sweep_result = run_sweep(
+            build_scenario(starting_loan),
+            axes,
+            progress=lambda done, total: sweep_progress.progress(done / total, text=f"Simulated {done:,} of {total:,} scenarios"),
+        )
+    except InputError as exc:
+        st.error(str(exc))
+    sweep_progress.empty()
+
+if "sweep_result" in st.session_state:
+    import plotly.express as px
+    from export import sweep_reader
+
+    sweep_result = st.session_state.sweep_result
+    salary_axis, inflation_axis, extra_axis = sweep_result.axes
+    metric = st.radio("Show", ["Total Amount Repaid (£)", "Years to Repay"], horizontal=True)
+    extra_value = st.select_slider(
+        "Extra Payment (£ per month)",
+        options=list(range(len(extra_axis.values))),
+        format_func=lambda i: f"£{extra_axis.values[i]:,.2f}",
+    )
+    if metric == "Total Amount Repaid (£)":
+        grid = sweep_result.total_repaid[:, :, extra_value].round(2)
+    else:
+        payoff = sweep_result.payoff_month[:, :, extra_value]
+        # Loans written off before being repaid are left blank.
+        grid = np.where(payoff > 0, payoff / 12, np.nan).round(1)
+    heatmap_fig = px.imshow(
+        grid,
+        x=[f"{v:.2f}%" for v in inflation_axis.values],
+        y=[f"£{v:,.0f}" for v in salary_axis.values],
+        labels={"x": "Interest Rate", "y": "Starting Salary", "color": metric},
+        aspect="auto",
+        origin="lower",
+        color_continuous_scale="Viridis",
+    )
+    st.plotly_chart(heatmap_fig, width="stretch")
+    download_buttons("Every Grid Point", "sensitivity_grid", lambda: sweep_reader(sweep_result))
+
+# -------------------------
+# Goal Seek: Repay by a Target Date
+# -------------------------
+st.markdown("### Repay by a Target Date")
+st.markdown("""
+Find the smallest constant **extra monthly payment** (on top of your extra repayment rows) or the smallest constant **salary** (instead of your salary timeline) that clears the loan within a chosen number of years.
+""")
+goal_years = st.number_input("Repay Within (Years)", value=20, min_value=1, max_value=total_years, step=1)
+
+def add_solved_extra_row(amount):
+    st.session_state.extra_repayment_rows.append({"id": str(uuid.uuid4()), "extra_payment": amount, "start_month": 1, "duration_months": 0})
+    # Added to the applied rows and to the editor's draft.
+    draft_rows("extra_repayment_rows").append(dict(st.session_state.extra_repayment_rows[-1]))
+
+if st.button("Solve"):
+    from solver import SolverError, break_even_salary, minimum_extra_payment
+
+    starting_loan = (tuition_loan + maintenance_loan) * study_years
+    try:
+        goal_scenario = build_scenario(starting_loan)
+        st.session_state.goal_seek = {
+            "years": int(goal_years),
+            "extra": minimum_extra_payment(goal_scenario, int(goal_years) * 12),
+            "salary": break_even_salary(goal_scenario, int(goal_years) * 12),
         }
-        
-        start_idx = 0
-        for i, (sal, months_in_bracket) in enumerate(bracket_details):
-            end_idx = start_idx + months_in_bracket
-            df_bracket = sim_df[(sim_df["Month"] > start_idx) & (sim_df["Month"] <= end_idx)]
-            if sal > repayment_threshold:
-                m_payment = ((sal - repayment_threshold) * 0.09) / 12
-            else:
-                m_payment = 0.0
-            annual_payment = m_payment * 12
-            weekly_payment = annual_payment / 52
-            total_payment_bracket = df_bracket["Total Payment"].sum()
-            total_interest = df_bracket["Interest Accrued"].sum()
-            avg_growth = total_interest / len(df_bracket) if len(df_bracket) > 0 else 0
-            avg_min_salary = df_bracket["Minimum Salary (to Offset Interest)"].mean() if len(df_bracket) > 0 else 0
-            
-            summary_data["Salary (Annual, £)"].append(f"£{sal:,.0f}")
-            years_in_bracket = len(df_bracket) / 12
-            summary_data["Years in Bracket"].append(f"{years_in_bracket:.0f}")
-            summary_data["Monthly Payment (£)"].append(round(m_payment, 2))
-            summary_data["Annual Payment (£)"].append(round(annual_payment, 2))
-            summary_data["Weekly Payment (£)"].append(round(weekly_payment, 2))
-            summary_data["Total Payment in Bracket (£)"].append(round(total_payment_bracket, 2))
-            summary_data["Total Interest Accrued (£)"].append(round(total_interest, 2))
-            summary_data["Avg Loan Growth per Month (£)"].append(round(avg_growth, 2))
-            summary_data["Avg Minimum Salary (to Offset Interest)"].append(round(avg_min_salary, 2))
-            
-            start_idx = end_idx
-        
-        summary_df = pd.DataFrame(summary_data)
-        st.markdown("#### Salary Bracket Summary")
-        st.dataframe(summary_df)
-        
-        # -------------------------
-        # Final Month-by-Month Repayment Details (Rounded to 2dp)
-        # -------------------------
-        sim_df["Date"] = sim_df["Date"].apply(lambda x: x.date())
-        final_df = sim_df.drop(columns=["Month", "Bracket"]).reset_index(drop=True)
-        final_df = final_df.round(2)
-        st.markdown("#### Month-by-Month Repayment Details")
-        st.dataframe(final_df)
+    except (InputError, SolverError) as exc:
+        st.error(str(exc))
+
+if "goal_seek" in st.session_state:
+    goal = st.session_state.goal_seek
+    colG, colH = st.columns(2)
+    with colG:
+        st.metric(f"Minimum Extra Payment to Repay Within {goal['years']} Years", f"£{goal['extra'].value:,.2f} / month")
+    with colH:
+        st.metric(f"Minimum Salary to Repay Within {goal['years']} Years", f"£{goal['salary'].value:,.2f}")
+    if goal["extra"].value > 0:
+        st.button(
+            "Add This Extra Payment to My Extra Repayments",
+            on_click=add_solved_extra_row,
+            args=(goal["extra"].value,),
+        )
+
+# -------------------------
+# Overpay or Invest
+# -------------------------
+st.markdown("### Overpay or Invest?")
+st.markdown("""
+With the balance written off at the end of the term, overpaying is not always worth it: money you do not overpay can be invested instead. Find the month-by-month overpayments, within a monthly budget, whose repayments cost least in today's money at a chosen investment return. The schedule found can replace your extra repayment rows.
+""")
+colI, colJ = st.columns(2)
+with colI:
+    overpay_budget = st.number_input("Monthly Overpayment Budget (£)", value=200.0, min_value=0.0, step=50.0)
+with colJ:
+    investment_return = st.number_input("Investment Return (% a year)", value=5.0, min_value=-10.0, max_value=30.0, step=0.5)
+
+def use_overpayment_schedule(rows):
+    st.session_state.extra_repayment_rows = [{"id": str(uuid.uuid4()), **row} for row in rows]
+    # The editor's draft is rebuilt from the new rows.
+    st.session_state.pop("extra_repayment_rows_draft", None)
+
+if st.button("Find the Best Overpayments"):
+    from overpay import optimize_overpayments
+
+    starting_loan = (tuition_loan + maintenance_loan) * study_years
+    try:
+        st.session_state.overpay = {
+            "return": investment_return,
+            "result": optimize_overpayments(build_scenario(starting_loan), overpay_budget, investment_return),
+        }
+    except InputError as exc:
+        st.error(str(exc))
+
+if "overpay" in st.session_state:
+    best = st.session_state.overpay["result"]
+    colK, colL, colM = st.columns(3)
+    with colK:
+        st.metric("Cost With the Best Overpayments", f"£{best.present_cost:,.2f}")
+    with colL:
+        st.metric("Cost Never Overpaying", f"£{best.no_overpayment_cost:,.2f}")
+    with colM:
+        st.metric("Cost Overpaying the Whole Budget", f"£{best.full_budget_cost:,.2f}")
+    st.caption(f"Costs are the present value of every repayment, discounted at {st.session_state.overpay['return']:.1f}% a year.")
+    best_rows = best.rows()
+    if best_rows:
+        st.dataframe(pd.DataFrame(best_rows).rename(columns={
+            "extra_payment": "Extra Payment (£)", "start_month": "Start Month", "duration_months": "Duration (Months)",
+        }), hide_index=True)
+        st.button("Use This Schedule as My Extra Repayments", on_click=use_overpayment_schedule, args=(best_rows,))
+    else:
+        st.info("Overpaying does not pay at this return: investing the whole budget costs least.")
+
+# -------------------------
+# Background Warm-Up (once per server process, after the first page run)
+# -------------------------
+@st.cache_resource
+def warm_up_in_background():
+    # Loads the chart libraries and the compiled kernels while the first
+    # visitor fills in the form; next to nothing if `warmup.py serve` already did.
+    thread = threading.Thread(target=warmup.warm_up, name="loan-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+warm_up_in_background()
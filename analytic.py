@@ -0,0 +1,269 @@
+"""Closed-form evaluation of the repayment summary.
+
+Between changes in the salary, threshold, interest or extra payment, every
+month applies the same step, ``balance * (1 + r) - p``.  After ``k`` such
+months the balance is::
+
+    B_k = B_0 (1 + r)^k - p ((1 + r)^k - 1) / r       (B_0 - k p if r = 0)
+
+so :func:`summarize_analytic` crosses each run of constant months in one
+step, and finds the payoff month inside the run where the balance reaches
+zero by solving ``B_k <= 0`` for ``k``, stopping there.  The cost no
+longer depends on the 480 months of the horizon but on the number of runs:
+a handful for the page's timelines, about one per year under plans whose
+threshold is raised every April.  The runs are found from the edges of the
+scenario's timelines without building its monthly schedules, and their
+payments and rates are worked out exactly as the engine's schedules would
+have them, so both see the same inputs.
+
+Only the summary comes out (payoff month, total repaid, interest paid and
+the written-off balance), not the month-by-month table.  The results agree
+with the month-by-month engine to rounding error; ``python analytic.py``
+checks that on random scenarios.
+"""
+import argparse
+import math
+import sys
+import time
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from itertools import accumulate
+from typing import Optional
+
+import numpy as np
+
+from engine import (
+    ExtraPaymentSegment,
+    InflationSegment,
+    SalarySegment,
+    Scenario,
+    extra_intervals,
+    inflation_timeline,
+    monthly_rates,
+    plan_interest,
+    plan_thresholds_at,
+    regular_payments,
+    salary_brackets,
+    simulate_repayment,
+)
+
+# Relative agreement with the month-by-month engine checked by the CLI.
+DEFAULT_TOLERANCE = 1e-9
+
+
+@dataclass(frozen=True)
+class ConstantRuns:
+    start: np.ndarray  # first month (0-based) of each run
+    length: np.ndarray  # months in each run
+    payment: np.ndarray  # regular plus extra payment per month
+    rate: np.ndarray  # monthly interest rate
+
+
+@dataclass(frozen=True)
+class AnalyticSummary:
+    payoff_month: Optional[int]  # 1-based, None if not repaid within the horizon
+    total_repaid: float
+    interest_paid: float
+    written_off: float  # balance left at the end of the horizon
+    runs: int  # constant runs crossed
+
+
+def constant_runs(scenario: Scenario) -> ConstantRuns:
+    """The runs of months with the same payment and interest rate.
+
+    Only the months where an input can change are looked at: the edges of
+    the salary, inflation and extra repayment rows, and each April when the
+    plan's threshold changes or is uprated.  The payment and rate in those
+    months are worked out as the engine's schedules would have them, and
+    neighbouring runs that turn out equal are joined.
+    """
+    runs = _runs(scenario)
+    start, length, payment, rate = zip(*runs) if runs else ((), (), (), ())
+    return ConstantRuns(np.array(start, dtype=int), np.array(length, dtype=int),
+                        np.array(payment, dtype=float), np.array(rate, dtype=float))
+
+
+def _runs(scenario: Scenario) -> list:
+    # (start, length, payment, rate) of each run, as Python numbers: there
+    # are only a few dozen edges, so plain Python beats numpy's per-call
+    # overhead everywhere but in the plan's formulas.
+    total_months = scenario.total_months
+    plan = scenario.plan
+    brackets = salary_brackets(scenario)
+    salary_ends = list(accumulate(max(months, 0) for _, months in brackets))
+    rates, rate_counts = inflation_timeline(scenario)
+    rate_ends = list(accumulate(max(months, 0) for months in rate_counts))
+    intervals = extra_intervals(scenario)
+
+    edges = {0, *salary_ends, *rate_ends}
+    for first, stop, _ in intervals:
+        edges.update((first, stop))
+    if plan.threshold_schedule or plan.uprate_with_rpi:
+        edges.update(range(3, total_months, 12))
+    start = sorted(edge for edge in edges if edge < total_months)
+
+    salary = np.array([brackets[bisect_right(salary_ends, month)][0] for month in start], dtype=float)
+    inflation = np.array([rates[bisect_right(rate_ends, month)] for month in start], dtype=float)
+    threshold, uprating = plan.repayment_threshold, 1.0
+    if plan.threshold_schedule or plan.uprate_with_rpi:
+        april_inflation = [rates[bisect_right(rate_ends, month)] for month in range(3, total_months, 12)]
+        threshold, uprating = plan_thresholds_at(plan, scenario.start_year, np.array(start),
+                                                 np.array(april_inflation, dtype=float), rates[0])
+    # Extra payments are added row by row, as the engine adds them, so each
+    # value is identical.
+    extra = [0.0] * len(start)
+    for first, stop, amount in intervals:
+        for i in range(bisect_left(start, first), bisect_left(start, stop)):
+            extra[i] += amount
+    payment = [regular + amount for regular, amount in zip(regular_payments(salary, plan, threshold).tolist(), extra)]
+    rate = monthly_rates(plan_interest(inflation, salary, plan, uprating)).tolist()
+
+    runs = []
+    for month, stop, p, r in zip(start, start[1:] + [total_months], payment, rate):
+        if runs and runs[-1][2] == p and runs[-1][3] == r:
+            runs[-1][1] += stop - month
+        else:
+            runs.append([month, stop - month, p, r])
+    return runs
+
+
+def _growth(rate: float, months: float) -> float:
+    # (1 + r)^k - 1, accurate for small rates.
+    return math.expm1(months * math.log1p(rate))
+
+
+def _balance_after(balance: float, payment: float, rate: float, months: int) -> float:
+    # B_k, written with g = (1 + r)^k - 1 so that g / r stays accurate as r -> 0.
+    if rate == 0:
+        return balance - payment * months
+    growth = _growth(rate, months)
+    return balance + balance * growth - payment * (growth / rate)
+
+
+def _payoff_within(balance: float, payment: float, rate: float, months: int) -> Optional[int]:
+    # The first k in 1..months with B_k <= 0, or None.
+    if balance * (1 + rate) - payment <= 0:
+        return 1
+    if payment <= 0:
+        return None
+    if rate == 0:
+        estimate = balance / payment
+    else:
+        # (1 + r)^k >= p / (p - r B_0), with log1p keeping small rates exact.
+        ratio = rate * balance / payment
+        if ratio >= 1:
+            return None  # the interest is at least the payment: never repaid
+        estimate = -math.log1p(-ratio) / math.log1p(rate)
+    k = max(int(math.ceil(estimate)), 1)
+    if k > months + 1:
+        return None
+    # The estimate is exact up to rounding; settle the month against B_k itself.
+    while k > 1 and _balance_after(balance, payment, rate, k - 1) <= 0:
+        k -= 1
+    while k <= months and _balance_after(balance, payment, rate, k) > 0:
+        k += 1
+    return k if k <= months else None
+
+
+def summarize_analytic(scenario: Scenario) -> AnalyticSummary:
+    """Payoff month, total repaid, interest paid and written-off balance of
+    ``scenario``, in closed form across its constant runs."""
+    runs = _runs(scenario)
+    balance = loan = float(scenario.starting_loan)
+    paid = 0.0
+    for crossed, (first, n, p, r) in enumerate(runs, 1):
+        closing = _balance_after(balance, p, r, n)
+        # The balance moves monotonically within a run, so the loan is
+        # repaid in the first run that closes at or below zero.
+        if closing <= 0:
+            k = _payoff_within(balance, p, r, n) or n  # None only by rounding at the run's last month
+            # k - 1 full payments, then the balance with its last month's interest.
+            before = _balance_after(balance, p, r, k - 1)
+            total_repaid = paid + p * (k - 1) + min(p, before * (1 + r))
+            # Interest is whatever was repaid beyond the loan.
+            return AnalyticSummary(first + k, total_repaid, total_repaid - loan, 0.0, crossed)
+        balance = closing
+        paid += p * n
+    return AnalyticSummary(None, paid, balance - loan + paid, max(balance, 0.0), len(runs))
+
+
+# -------------------------
+# Validation Against the Engine
+# -------------------------
+def engine_summary(scenario: Scenario) -> AnalyticSummary:
+    """The same summary from the month-by-month engine."""
+    result = simulate_repayment(scenario)
+    months = result.loan_repaid_month or scenario.total_months
+    interest = result.column("Interest Accrued")[:months]
+    return AnalyticSummary(
+        payoff_month=result.loan_repaid_month,
+        total_repaid=float(result.column("Cumulative Paid")[months - 1]),
+        interest_paid=float(np.cumsum(interest)[-1]),
+        written_off=max(float(result.column("Loan Balance")[months - 1]), 0.0),
+        runs=0,
+    )
+
+
+def random_scenario(rng: np.random.Generator) -> Scenario:
+    """A random page-like scenario, under a random plan, for validation."""
+    from plans import PLANS, plan_scenario
+
+    salaries = tuple(SalarySegment(float(rng.integers(15, 150) * 1000), int(rng.integers(0, 15)))
+                     for _ in range(rng.integers(1, 5)))
+    inflation = tuple(InflationSegment(round(float(rng.uniform(-1, 9)), 2), int(rng.integers(0, 15)))
+                      for _ in range(rng.integers(1, 4)))
+    extras = tuple(ExtraPaymentSegment(float(rng.integers(0, 100) * 10), int(rng.integers(1, 240)),
+                                       int(rng.integers(0, 120)))
+                   for _ in range(rng.integers(0, 3)))
+    scenario = Scenario(float(rng.integers(5, 120) * 1000), salaries, inflation, int(rng.integers(2024, 2034)), extras)
+    plan = rng.integers(0, len(PLANS) + 1)
+    return scenario if plan == len(PLANS) else plan_scenario(scenario, list(PLANS.values())[plan])
+
+
+def validate(n: int = 2000, seed: int = 0, tolerance: float = DEFAULT_TOLERANCE) -> dict:
+    """Compare :func:`summarize_analytic` with the engine on ``n`` random scenarios."""
+    rng = np.random.default_rng(seed)
+    worst = 0.0
+    payoff_mismatches = runs = 0
+    analytic_seconds = engine_seconds = 0.0
+    for _ in range(n):
+        scenario = random_scenario(rng)
+        start = time.perf_counter()
+        closed = summarize_analytic(scenario)
+        analytic_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        exact = engine_summary(scenario)
+        engine_seconds += time.perf_counter() - start
+        runs += closed.runs
+        payoff_mismatches += closed.payoff_month != exact.payoff_month
+        scale = max(scenario.starting_loan, exact.total_repaid, 1.0)
+        for field in ("total_repaid", "interest_paid", "written_off"):
+            worst = max(worst, abs(getattr(closed, field) - getattr(exact, field)) / scale)
+    return {
+        "scenarios": n,
+        "payoff_mismatches": payoff_mismatches,
+        "max_relative_error": worst,
+        "ok": payoff_mismatches == 0 and worst <= tolerance,
+        "mean_runs": runs / n,
+        "analytic_us": analytic_seconds / n * 1e6,
+        "engine_us": engine_seconds / n * 1e6,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Validate the closed-form summary against the month-by-month engine.")
+    parser.add_argument("--scenarios", type=int, default=2000, help="random scenarios to compare")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="largest relative error allowed (of the loan or total repaid)")
+    args = parser.parse_args(argv)
+    report = validate(args.scenarios, args.seed, args.tolerance)
+    print(f"{report['scenarios']:,} scenarios, {report['mean_runs']:.1f} constant runs each on average")
+    print(f"payoff month mismatches: {report['payoff_mismatches']}")
+    print(f"largest relative error:  {report['max_relative_error']:.2e} (tolerance {args.tolerance:.0e})")
+    print(f"closed form {report['analytic_us']:.1f} us, engine {report['engine_us']:.1f} us per scenario")
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""Local HTTP JSON API for the repayment model.
+
+    python api.py --port 8000 --workers 4
+
+``POST /simulate``
+    One scenario; returns its summary, plus the month-by-month table as
+    columns when the request has ``"monthly": true``.
+``POST /simulate/batch``
+    ``{"scenarios": [...]}``; returns ``{"results": [...]}`` in the same
+    order.  An invalid scenario gets ``{"error": ...}`` in its place.
+``GET /health``
+    Worker pid, kernel backend and result cache statistics.
+
+Scenarios use the request format of ``scenarios.py``: the page's loan
+fields and timeline rows, with an optional ``plan``.
+
+The listening socket is opened once and a pool of worker processes is
+forked to accept connections from it, so requests never wait for a process
+to start.  Each worker keeps its own :class:`ResultCache` and simulates the
+uncached scenarios of a batch together with the batched kernel.
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import traceback
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+import numpy as np
+
+import kernels
+from cache import ResultCache, normalize_scenario, scenario_key
+from engine import RESULT_COLUMNS, InputError, SimulationResult, simulate_repayment
+from scenarios import scenario_from_request, scenario_summaries
+import warmup
+
+MAX_BODY_BYTES = 32 * 2**20
+MAX_BATCH_SCENARIOS = 10_000
+
+
+class RequestError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+# -------------------------
+# Results as JSON
+# -------------------------
+def monthly_columns(result: SimulationResult) -> dict:
+    # The month-by-month table as JSON columns.
+    columns = {name: result.column(name).tolist() for name in RESULT_COLUMNS if name != "Date"}
+    columns["Date"] = np.datetime_as_string(result.column("Date"), unit="D").tolist()
+    return columns
+
+
+# -------------------------
+# Request Handlers
+# -------------------------
+_cache = None
+
+
+def get_cache() -> ResultCache:
+    # Created on first use, i.e. in each worker after it is forked.
+    global _cache
+    if _cache is None:
+        _cache = ResultCache.from_env()
+    return _cache
+
+
+def simulate_batch(items: list, cache: Optional[ResultCache] = None) -> list:
+    """Summaries of the request objects in ``items`` (errors in place)."""
+    cache = cache if cache is not None else get_cache()
+    results = [None] * len(items)
+    missing = {}  # cache key -> (scenario, indices of items)
+    for i, item in enumerate(items):
+        try:
+            scenario = normalize_scenario(scenario_from_request(item))
+        except InputError as exc:
+            results[i] = {"error": str(exc)}
+            continue
+        key = "summary:" + scenario_key(scenario)
+        results[i] = cache.get(key)
+        if results[i] is None:
+            missing.setdefault(key, (scenario, []))[1].append(i)
+
+    if missing:
+        summaries = scenario_summaries([scenario for scenario, _ in missing.values()])
+        for (key, (_, indices)), summary in zip(missing.items(), summaries):
+            cache.put(key, summary)
+            for i in indices:
+                results[i] = summary
+    return results
+
+
+def simulate_one(item, cache: Optional[ResultCache] = None) -> dict:
+    cache = cache if cache is not None else get_cache()
+    summary = simulate_batch([item], cache)[0]
+    if "error" in summary:
+        raise RequestError(400, summary["error"])
+    response = dict(summary)
+    if item.get("monthly"):
+        scenario = normalize_scenario(scenario_from_request(item))
+        result = cache.get_or_compute("monthly:" + scenario_key(scenario), lambda: simulate_repayment(scenario))
+        response["monthly"] = monthly_columns(result)
+    return response
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so clients can reuse connections
+    disable_nagle_algorithm = True  # small responses would otherwise wait on delayed ACKs
+    server_version = "StudentLoanAPI/1.0"
+    quiet = True
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._send(404, {"error": f"Unknown path {self.path}"})
+        stats = get_cache().stats()
+        self._send(200, {
+            "status": "ok",
+            "pid": os.getpid(),
+            "backend": kernels.active_backend(),
+            "cache": dict(asdict(stats), hit_rate=stats.hit_rate),
+        })
+
+    def do_POST(self):
+        try:
+            body = self._read_json()
+            if self.path == "/simulate":
+                self._send(200, simulate_one(body))
+            elif self.path == "/simulate/batch":
+                items = body.get("scenarios") if isinstance(body, dict) else None
+                if not isinstance(items, list):
+                    raise RequestError(400, "Expected {\"scenarios\": [...]}")
+                if len(items) > MAX_BATCH_SCENARIOS:
+                    raise RequestError(413, f"At most {MAX_BATCH_SCENARIOS} scenarios per request")
+                self._send(200, {"results": simulate_batch(items)})
+            else:
+                raise RequestError(404, f"Unknown path {self.path}")
+        except RequestError as exc:
+            self._send(exc.status, {"error": str(exc)})
+        except InputError as exc:
+            self._send(400, {"error": str(exc)})
+        except Exception:
+            # A bug, not a bad request: answer anyway, and keep the traceback.
+            traceback.print_exc()
+            self._send(500, {"error": "Internal server error"})
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            raise RequestError(413, f"Request bodies are limited to {MAX_BODY_BYTES} bytes")
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            raise RequestError(400, "Request body is not valid JSON")
+
+    def _send(self, status: int, payload) -> None:
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+# -------------------------
+# Pre-Forked Server
+# -------------------------
+def serve(host: str = "127.0.0.1", port: int = 8000, workers: Optional[int] = None, quiet: bool = True) -> None:
+    """Serve until interrupted, with ``workers`` processes (default: CPU count)."""
+    _Handler.quiet = quiet
+    server = ThreadingHTTPServer((host, port), _Handler)
+    # Load (or compile) the kernels once so every forked worker inherits them.
+    warmup.warm_up(page=False)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or not hasattr(os, "fork"):  # no fork on Windows: serve in-process
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        server.server_close()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Serve the repayment model as a local JSON API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+    print(f"Serving on http://{args.host}:{args.port}", file=sys.stderr)
+    serve(args.host, args.port, args.workers, quiet=not args.verbose)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""Simulate a file of borrower profiles from the command line.
+
+    python batch.py borrowers.csv summaries.parquet --detail months.parquet
+
+Output files are written as Parquet, CSV or XLSX by their extension (see
+``export.py``).
+
+Each input row (CSV or Parquet) is one borrower profile:
+
+``borrower_id`` (optional)
+    Copied to the output; the 0-based input row number is used if absent.
+``tuition``, ``maintenance``, ``study_years``
+    As on the page; the starting loan is ``(tuition + maintenance) * study_years``.
+``salary_segments``, ``inflation_segments``, ``extra_payments``
+    Lists of rows with the same keys as the page's timelines, e.g.
+    ``[{"salary": 30000, "years": 5}, {"salary": 45000, "years": 0}]``,
+    ``[{"inflation": 4.3, "years": 0}]`` and
+    ``[{"extra_payment": 100, "start_month": 1, "duration_months": 12}]``.
+    JSON text in CSV files; JSON text or lists of structs in Parquet files.
+    ``extra_payments`` may be left empty.
+``start_year`` (optional)
+    First repayment year; defaults to the page's default for ``study_years``.
+
+With ``--payroll weekly`` (or ``four-weekly``, ``monthly``) every profile is
+simulated day by day, with daily interest and a repayment from each pay
+(see ``highres.py``), instead of by the monthly model.
+
+With ``--bands PATH``, the cohort's percentiles of ``Loan Balance``,
+``Total Payment`` and ``Cumulative Paid`` in each month of repayment, and
+the number of borrowers repaid in each month, are written to ``PATH``.
+They are built from mergeable sketches (see ``streaming.py``): each chunk
+is aggregated by the worker that simulated it and merged as it is written,
+so they also take constant memory.
+
+Profiles are read, simulated and written a chunk at a time, with at most a
+few chunks per worker in flight, so memory use does not grow with the size
+of the input.  Summaries are written in input order.  A profile that cannot
+be simulated gets a summary row with its ``error`` and no results; it does
+not stop the run.
+"""
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import kernels
+from engine import (
+    TOTAL_YEARS,
+    InputError,
+    Scenario,
+    build_schedules,
+    default_start_year,
+    extra_intervals,
+    extra_segments_from_rows,
+    inflation_segments_from_rows,
+    monthly_rates,
+    month_start_dates,
+    regular_payments,
+    salary_segments_from_rows,
+    summarize_scenarios,
+)
+from export import aggregate_reader, open_writer, write as write_table
+from highres import PAY_FREQUENCIES, day_schedules, summarize_high_resolution
+from streaming import MonthlyAggregate
+
+DEFAULT_CHUNK_SIZE = 1000
+# Chunks queued per worker; bounds memory while keeping the workers busy.
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+
+SUMMARY_SCHEMA = pa.schema([
+    ("borrower_id", pa.string()),
+    ("starting_loan", pa.float64()),
+    ("payoff_month", pa.int32()),  # 1-based, null if not repaid
+    ("total_repaid", pa.float64()),
+    ("interest_paid", pa.float64()),
+    ("written_off", pa.float64()),
+    ("error", pa.string()),  # null unless the profile could not be simulated
+])
+
+# One row per borrower and month up to payoff (payments and balance are zero
+# after it), with the same columns as the page's month-by-month table.
+DETAIL_SCHEMA = pa.schema([
+    ("borrower_id", pa.string()),
+    ("Month", pa.int32()),
+    ("Date", pa.date32()),
+    ("Salary", pa.float64()),
+    ("Regular Payment", pa.float64()),
+    ("Extra Payment", pa.float64()),
+    ("Total Payment", pa.float64()),
+    ("Interest Accrued", pa.float64()),
+    ("Cumulative Paid", pa.float64()),
+    ("Loan Balance", pa.float64()),
+])
+_DETAIL_ROWS = {
+    "Regular Payment": kernels.REGULAR,
+    "Extra Payment": kernels.EXTRA,
+    "Total Payment": kernels.PAYMENT,
+    "Interest Accrued": kernels.INTEREST,
+    "Cumulative Paid": kernels.CUMULATIVE,
+    "Loan Balance": kernels.BALANCE,
+}
+
+
+@dataclass(frozen=True)
+class BatchStats:
+    profiles: int
+    failed: int
+
+
+# -------------------------
+# Profiles
+# -------------------------
+def _segment_rows(value) -> list:
+    # A timeline cell: JSON text, a list of dicts (Parquet) or empty.
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return []
+    if isinstance(value, str):
+        return json.loads(value) if value.strip() else []
+    return list(value)
+
+
+def _number(profile: dict, column: str) -> float:
+    value = profile.get(column)
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        value = float("nan")
+    if not np.isfinite(value):
+        raise InputError(f"Invalid {column} value")
+    return value
+
+
+def profile_scenario(profile: dict, total_years: int = TOTAL_YEARS) -> Scenario:
+    """The :class:`Scenario` of one input row (raises InputError or ValueError)."""
+    study_years = int(_number(profile, "study_years"))
+    start_year = profile.get("start_year")
+    if start_year is None or pd.isna(start_year):
+        start_year = default_start_year(study_years)
+    scenario = Scenario(
+        starting_loan=(_number(profile, "tuition") + _number(profile, "maintenance")) * study_years,
+        salary_segments=salary_segments_from_rows(_segment_rows(profile.get("salary_segments"))),
+        inflation_segments=inflation_segments_from_rows(_segment_rows(profile.get("inflation_segments"))),
+        start_year=int(start_year),
+        extra_segments=extra_segments_from_rows(_segment_rows(profile.get("extra_payments"))),
+        total_years=total_years,
+    )
+    # Rows that only fail when the schedules are built (an extra payment
+    # starting before the horizon) fail here, with the rest of the row's checks.
+    extra_intervals(scenario)
+    return scenario
+
+
+def read_profiles(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Yield the profiles in ``path`` (``.parquet`` or CSV) ``chunk_size`` rows at a time."""
+    if path.endswith(".parquet"):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size, dtype={"borrower_id": str})
+
+
+# -------------------------
+# Simulating a Chunk
+# -------------------------
+def simulate_profiles(profiles: pd.DataFrame, first_row: int = 0, total_years: int = TOTAL_YEARS,
+                      detail: bool = False, payroll: Optional[str] = None,
+                      aggregate: Optional[MonthlyAggregate] = None) -> Tuple[pa.Table, Optional[pa.Table]]:
+    """Summary (and, with ``detail``, month-level) tables for a chunk of profiles.
+
+    Summaries alone are simulated together by the batched kernel; month-level
+    detail needs every column of the single-path kernel.  Both give the same
+    summaries.  With ``payroll`` (one of :data:`highres.PAY_FREQUENCIES`),
+    each profile is simulated day by day instead.  The profiles that could
+    be simulated are also added to ``aggregate``, if given.
+    """
+    n = len(profiles)
+    total_months = total_years * 12
+    if "borrower_id" in profiles:
+        ids = [str(i) if not pd.isna(i) else str(first_row + k) for k, i in enumerate(profiles["borrower_id"])]
+    else:
+        ids = [str(first_row + k) for k in range(n)]
+
+    starting_loan = np.full(n, np.nan)
+    payoff_month = np.full(n, -1, dtype=np.int32)
+    total_repaid = np.full(n, np.nan)
+    interest_paid = np.full(n, np.nan)
+    written_off = np.full(n, np.nan)
+    errors = [None] * n
+
+    scenarios = {}
+    for k, profile in enumerate(profiles.to_dict("records")):
+        try:
+            scenarios[k] = profile_scenario(profile, total_years)
+        except (InputError, ValueError, TypeError, KeyError) as exc:
+            errors[k] = str(exc) or type(exc).__name__
+    ok = list(scenarios)
+
+    detail_columns = {name: [] for name in DETAIL_SCHEMA.names}
+    if detail:
+        out = np.empty((kernels.N_COLUMNS, total_months))
+        dates = {}
+        if aggregate is not None:
+            balances = np.empty((total_months, len(ok)))
+            cumulative_paid = np.empty((total_months, len(ok)))
+        for j, (k, scenario) in enumerate(scenarios.items()):
+            schedules = build_schedules(scenario)
+            if payroll:
+                days = day_schedules(scenario, schedules, payroll)
+                simulated, payoff, _ = kernels.daily_recurrence(
+                    scenario.starting_loan, days.month_days, days.day_rate, days.regular, days.extra, out,
+                )
+            else:
+                rate = monthly_rates(schedules.interest)
+                regular = regular_payments(schedules.salary, scenario.plan, schedules.threshold)
+                simulated, payoff = kernels.recurrence(scenario.starting_loan, regular, schedules.extra, rate, out)
+            total_repaid[k] = out[kernels.CUMULATIVE, simulated - 1]
+            # Added up month by month, like the batched kernel.
+            interest_paid[k] = np.cumsum(out[kernels.INTEREST, :simulated])[-1]
+            written_off[k] = max(out[kernels.BALANCE, simulated - 1], 0.0)
+            payoff_month[k] = payoff or -1
+            starting_loan[k] = scenario.starting_loan
+
+            if scenario.start_year not in dates:
+                dates[scenario.start_year] = month_start_dates(scenario.start_year, total_months).to_numpy()
+            detail_columns["borrower_id"].append(np.full(simulated, ids[k], dtype=object))
+            detail_columns["Month"].append(np.arange(1, simulated + 1, dtype=np.int32))
+            detail_columns["Date"].append(dates[scenario.start_year][:simulated])
+            detail_columns["Salary"].append(schedules.salary[:simulated])
+            for name, row in _DETAIL_ROWS.items():
+                detail_columns[name].append(out[row, :simulated].copy())
+            if aggregate is not None:
+                # Flat after payoff, as the batched kernel leaves them.
+                for values, row in ((balances, kernels.BALANCE), (cumulative_paid, kernels.CUMULATIVE)):
+                    values[:simulated, j] = out[row, :simulated]
+                    values[simulated:, j] = out[row, simulated - 1]
+        if aggregate is not None and scenarios:
+            aggregate.update(balances, cumulative_paid)
+            aggregate.add_payoffs(payoff_month[ok])
+    elif scenarios:
+        monthly = aggregate is not None
+        if payroll:
+            summaries = summarize_high_resolution(list(scenarios.values()), payroll, balances=monthly)
+        else:
+            summaries = summarize_scenarios(list(scenarios.values()), balances=monthly)
+        if monthly:
+            aggregate.update(summaries["balances"], summaries["cumulative_paid"])
+            aggregate.add_payoffs(summaries["payoff_month"])
+        starting_loan[ok] = [scenario.starting_loan for scenario in scenarios.values()]
+        payoff_month[ok] = summaries["payoff_month"]
+        total_repaid[ok] = summaries["total_repaid"]
+        interest_paid[ok] = summaries["interest_paid"]
+        written_off[ok] = summaries["written_off"]
+
+    summary = pa.table({
+        "borrower_id": pa.array(ids, pa.string()),
+        "starting_loan": starting_loan,
+        "payoff_month": pa.array(payoff_month, mask=payoff_month < 0),
+        "total_repaid": total_repaid,
+        "interest_paid": interest_paid,
+        "written_off": written_off,
+        "error": pa.array(errors, pa.string()),
+    }, schema=SUMMARY_SCHEMA)
+    if not detail:
+        return summary, None
+    if not scenarios:
+        return summary, DETAIL_SCHEMA.empty_table()
+    months = pa.table({name: np.concatenate(parts) for name, parts in detail_columns.items()}, schema=DETAIL_SCHEMA)
+    return summary, months
+
+
+def _simulate_chunk(profiles: pd.DataFrame, first_row: int, total_years: int, detail: bool,
+                    payroll: Optional[str], bands: bool) -> tuple:
+    # The chunk's tables and, with ``bands``, its own aggregate, which the
+    # parent merges into the run's.
+    aggregate = MonthlyAggregate.empty(total_years * 12) if bands else None
+    return (*simulate_profiles(profiles, first_row, total_years, detail, payroll, aggregate), aggregate)
+
+
+# -------------------------
+# Running a Batch
+# -------------------------
+def run_batch(input_path: str, summary_path: str, detail_path: Optional[str] = None,
+              workers: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+              total_years: int = TOTAL_YEARS, backend: Optional[str] = None, payroll: Optional[str] = None,
+              progress: Optional[Callable[[int, int], None]] = None, bands_path: Optional[str] = None) -> BatchStats:
+    """Simulate every profile in ``input_path`` and write the output files
+    (Parquet, CSV or XLSX, by extension).
+
+    ``workers`` defaults to the number of CPUs; 0 or 1 runs in-process.
+    ``backend`` selects the kernel backend (default: the active one).
+    ``payroll`` selects the high-resolution model (see :func:`simulate_profiles`).
+    ``progress`` is called with ``(profiles_done, failed)`` after each chunk.
+    ``bands_path``, if given, receives the cohort's monthly percentile bands
+    and payoff counts (see :meth:`streaming.MonthlyAggregate.table`).
+    """
+    if total_years < 1:
+        raise ValueError("The repayment horizon must be at least one year")
+    if payroll is not None and payroll not in PAY_FREQUENCIES:
+        raise ValueError(f"Unknown pay frequency {payroll!r}; expected one of {tuple(PAY_FREQUENCIES)}")
+    backend = kernels.set_backend(backend) if backend else kernels.active_backend()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    detail = detail_path is not None
+    bands = bands_path is not None
+    aggregate = MonthlyAggregate.empty(total_years * 12) if bands else None
+    profiles = failed = 0
+
+    summary_writer = open_writer(summary_path, SUMMARY_SCHEMA)
+    detail_writer = open_writer(detail_path, DETAIL_SCHEMA) if detail else None
+
+    def write(tables):
+        nonlocal profiles, failed
+        summary, months, chunk_aggregate = tables
+        summary_writer.write_table(summary)
+        if chunk_aggregate is not None:
+            aggregate.merge(chunk_aggregate)
+        if detail_writer is not None:
+            detail_writer.write_table(months)
+        profiles += summary.num_rows
+        failed += summary.num_rows - summary["error"].null_count
+        if progress:
+            progress(profiles, failed)
+
+    try:
+        chunks = read_profiles(input_path, chunk_size)
+        if workers <= 1:
+            first_row = 0
+            for chunk in chunks:
+                write(_simulate_chunk(chunk, first_row, total_years, detail, payroll, bands))
+                first_row += len(chunk)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=kernels.set_backend,
+                                     initargs=(backend,)) as pool:
+                pending = deque()
+                first_row = 0
+                for chunk in chunks:
+                    pending.append(pool.submit(_simulate_chunk, chunk, first_row, total_years, detail, payroll, bands))
+                    first_row += len(chunk)
+                    # Results are written in input order; waiting on the oldest
+                    # chunk also stops the reader from running ahead.
+                    if len(pending) >= workers * CHUNKS_IN_FLIGHT_PER_WORKER:
+                        write(pending.popleft().result())
+                while pending:
+                    write(pending.popleft().result())
+    finally:
+        summary_writer.close()
+        if detail_writer is not None:
+            detail_writer.close()
+    if bands:
+        write_table(aggregate_reader(aggregate), bands_path)
+    return BatchStats(profiles=profiles, failed=failed)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Simulate a CSV or Parquet file of borrower profiles.")
+    parser.add_argument("input", help="borrower profiles (.csv or .parquet)")
+    parser.add_argument("summary", help="per-borrower summary output (.parquet, .csv or .xlsx)")
+    parser.add_argument("--detail", metavar="PATH", help="also write month-level rows to this file (.parquet, .csv or .xlsx)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="profiles per chunk")
+    parser.add_argument("--years", type=int, default=TOTAL_YEARS, help="repayment horizon in years")
+    parser.add_argument("--backend", choices=("auto",) + kernels.BACKENDS, default=None,
+                        help="kernel backend (default: LOAN_KERNEL_BACKEND or auto)")
+    parser.add_argument("--payroll", choices=tuple(PAY_FREQUENCIES), default=None,
+                        help="simulate day by day, with daily interest and a repayment each pay day")
+    parser.add_argument("--bands", metavar="PATH",
+                        help="also write the cohort's monthly percentile bands to this file (.parquet, .csv or .xlsx)")
+    parser.add_argument("--quiet", action="store_true", help="do not report progress")
+    args = parser.parse_args(argv)
+
+    def report(done, failed):
+        print(f"\r{done:,} profiles simulated ({failed:,} failed)", end="", file=sys.stderr, flush=True)
+
+    stats = run_batch(
+        args.input, args.summary, args.detail, workers=args.workers, chunk_size=args.chunk_size,
+        total_years=args.years, backend=args.backend, payroll=args.payroll,
+        progress=None if args.quiet else report, bands_path=args.bands,
+    )
+    if not args.quiet:
+        print(file=sys.stderr)
+    if stats.failed:
+        print(f"{stats.failed:,} of {stats.profiles:,} profiles failed; see the error column of {args.summary}",
+              file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,285 @@
+"""Benchmarks for the engine, the summaries and the page.
+
+    python benchmark.py --output results.json
+    python benchmark.py --baseline results.json   # flag regressions against a saved run
+
+Every stage is timed on a fixed set of scenarios (see :data:`SCENARIOS`),
+given as page rows so the engine stages and the headless page run see the
+same inputs:
+
+``build_schedules``
+    Expanding the timelines into monthly arrays.
+``monthly_loop``
+    The balance recurrence, with the active kernel backend.
+``dataframe``
+    Wrapping the kernel output in a result (the table itself is built on demand).
+``bracket_summary``
+    The per-bracket totals.
+``simulate_repayment``
+    All of the above, end to end.
+``analytic_summary``
+    The summary alone, in closed form (``analytic.py``), schedules included.
+``high_resolution``
+    The day-by-day simulation with weekly pay (``highres.py``), end to end.
+``page_run``
+    Clicking "Run Simulation" in a headless run of ``a.py`` (Streamlit's
+    AppTest), with the result cache disabled so the simulation is included.
+
+Results are written as JSON.  With ``--baseline``, each stage's median is
+compared with the saved one and the exit status is 1 if any is slower by
+more than ``--tolerance``.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import kernels
+from analytic import summarize_analytic
+from engine import (
+    Scenario,
+    bracket_summary,
+    build_schedules,
+    default_start_year,
+    extra_segments_from_rows,
+    inflation_segments_from_rows,
+    monthly_rates,
+    regular_payments,
+    result_from_columns,
+    salary_segments_from_rows,
+    simulate_repayment,
+)
+from highres import simulate_high_resolution
+
+# The page's default loan: (tuition + maintenance) * study years.
+PAGE_STARTING_LOAN = (9535.0 + 6647.0) * 4
+PAGE_STUDY_YEARS = 4
+
+_DEFAULT_INFLATION = [{"inflation": 4.3, "years": 10}, {"inflation": 5, "years": 30}]
+_NO_EXTRA = [{"extra_payment": 0.0, "start_month": 1, "duration_months": 0}]
+
+SCENARIOS = {
+    # The page as it first loads.
+    "defaults": {
+        "salary_rows": [{"salary": 30000.0, "years": 5}, {"salary": 50000.0, "years": 10},
+                        {"salary": 70000.0, "years": 0}],
+        "inflation_rows": _DEFAULT_INFLATION,
+        "extra_repayment_rows": _NO_EXTRA,
+    },
+    # A salary for every year of the horizon.
+    "yearly_salary_40": {
+        "salary_rows": [{"salary": 25000.0 + 1500.0 * year, "years": 1} for year in range(40)],
+        "inflation_rows": _DEFAULT_INFLATION,
+        "extra_repayment_rows": _NO_EXTRA,
+    },
+    # Many overlapping extra repayment rows.
+    "heavy_extras": {
+        "salary_rows": [{"salary": 35000.0, "years": 10}, {"salary": 55000.0, "years": 0}],
+        "inflation_rows": _DEFAULT_INFLATION,
+        "extra_repayment_rows": [
+            {"extra_payment": 5.0 + 2.5 * i, "start_month": 1 + 9 * i, "duration_months": 6 + 12 * (i % 4)}
+            for i in range(50)
+        ],
+    },
+    # Repaid within a few years, so most months are padding after payoff.
+    "early_payoff": {
+        "salary_rows": [{"salary": 150000.0, "years": 0}],
+        "inflation_rows": _DEFAULT_INFLATION,
+        "extra_repayment_rows": [{"extra_payment": 1500.0, "start_month": 1, "duration_months": 0}],
+    },
+}
+
+STAGES = ("build_schedules", "monthly_loop", "dataframe", "bracket_summary", "simulate_repayment", "analytic_summary",
+          "high_resolution", "page_run")
+
+
+def page_scenario(rows: dict) -> Scenario:
+    # The scenario the page builds from these rows with its default loan inputs.
+    return Scenario(
+        starting_loan=PAGE_STARTING_LOAN,
+        salary_segments=salary_segments_from_rows(rows["salary_rows"]),
+        inflation_segments=inflation_segments_from_rows(rows["inflation_rows"]),
+        extra_segments=extra_segments_from_rows(rows["extra_repayment_rows"]),
+        start_year=default_start_year(PAGE_STUDY_YEARS),
+    )
+
+
+# -------------------------
+# Timing
+# -------------------------
+def time_call(fn, repeat: int = 7, min_seconds: float = 0.05, setup=None) -> dict:
+    """Median and minimum seconds per call of ``fn``.
+
+    Calls are grouped into loops of at least ``min_seconds``; ``setup``, if
+    given, is called untimed before each call and its result passed to ``fn``.
+    """
+    def run(loops):
+        elapsed = 0.0
+        for _ in range(loops):
+            args = (setup(),) if setup else ()
+            start = time.perf_counter()
+            fn(*args)
+            elapsed += time.perf_counter() - start
+        return elapsed
+
+    loops = 1
+    elapsed = run(loops)  # warm-up, and the first calibration step
+    while elapsed < min_seconds:
+        loops *= 10 if elapsed < min_seconds / 10 else 2
+        elapsed = run(loops)
+    per_call = [run(loops) / loops for _ in range(repeat)]
+    return {"median": statistics.median(per_call), "min": min(per_call), "loops": loops, "repeat": repeat}
+
+
+def _engine_stages(scenario: Scenario) -> dict:
+    schedules = build_schedules(scenario)
+    regular = regular_payments(schedules.salary, scenario.plan, schedules.threshold)
+    rate = monthly_rates(schedules.interest)
+    out = np.zeros((kernels.N_COLUMNS, scenario.total_months))
+    _, payoff = kernels.recurrence(scenario.starting_loan, regular, schedules.extra, rate, out)
+    result = result_from_columns(scenario, schedules, out.copy(), payoff)
+    return {
+        "build_schedules": time_call(lambda: build_schedules(scenario)),
+        "monthly_loop": time_call(lambda: kernels.recurrence(scenario.starting_loan, regular, schedules.extra, rate, out)),
+        "dataframe": time_call(lambda: result_from_columns(scenario, schedules, out, payoff)),
+        "bracket_summary": time_call(lambda: bracket_summary(result)),
+        "simulate_repayment": time_call(lambda: simulate_repayment(scenario)),
+        "analytic_summary": time_call(lambda: summarize_analytic(scenario)),
+        "high_resolution": time_call(lambda: simulate_high_resolution(scenario, "weekly")),
+    }
+
+
+def _page_run(rows: dict, repeat: int) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "a.py")
+
+    def loaded_page():
+        at = AppTest.from_file(script, default_timeout=120)
+        for key, value in rows.items():
+            at.session_state[key] = [dict(row, id=f"{key}-{i}") for i, row in enumerate(value)]
+        at.run()
+        return at
+
+    def click_run(at):
+        button = next(b for b in at.button if b.label == "Run Simulation")
+        button.click().run()
+        if at.exception:
+            raise RuntimeError(f"Page run failed: {at.exception}")
+
+    # A fresh page (session) per call, so nothing is reused from a previous run.
+    return time_call(click_run, repeat=repeat, min_seconds=0.0, setup=loaded_page)
+
+
+def run_benchmarks(scenarios=None, page: bool = True, page_repeat: int = 5, progress=None) -> dict:
+    """Time every stage on every scenario; returns the JSON-ready results."""
+    # Keep the page's shared result cache empty so page runs always simulate.
+    os.environ["LOAN_CACHE_MAX_MB"] = "0"
+    results = {}
+    for name in scenarios or SCENARIOS:
+        rows = SCENARIOS[name]
+        if progress:
+            progress(name)
+        results[name] = _engine_stages(page_scenario(rows))
+        if page:
+            results[name]["page_run"] = _page_run(rows, page_repeat)
+    return {"meta": environment(), "results": results}
+
+
+def environment() -> dict:
+    import streamlit
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "streamlit": streamlit.__version__,
+        "kernel_backend": kernels.active_backend(),
+    }
+
+
+# -------------------------
+# Comparing with a Baseline
+# -------------------------
+def compare(current: dict, baseline: dict, tolerance: float = 0.2) -> list:
+    """(scenario, stage, baseline median, current median, ratio, regressed) for
+    every stage present in both runs."""
+    rows = []
+    for scenario, stages in current["results"].items():
+        for stage, timing in stages.items():
+            before = baseline.get("results", {}).get(scenario, {}).get(stage)
+            if before is None:
+                continue
+            ratio = timing["median"] / before["median"]
+            rows.append((scenario, stage, before["median"], timing["median"], ratio, ratio > 1 + tolerance))
+    return rows
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:8.1f} us"
+    if seconds < 1:
+        return f"{seconds * 1e3:8.2f} ms"
+    return f"{seconds:8.2f} s "
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the engine, summaries and page.")
+    parser.add_argument("--output", metavar="PATH", help="write the results to this JSON file")
+    parser.add_argument("--baseline", metavar="PATH", help="compare with the results in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown against the baseline (default 0.2, i.e. 20%%)")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="benchmark only this scenario (repeatable)")
+    parser.add_argument("--no-page", action="store_true", help="skip the headless page runs")
+    parser.add_argument("--page-repeat", type=int, default=5, help="page runs per scenario")
+    parser.add_argument("--backend", choices=("auto",) + kernels.BACKENDS, default=None,
+                        help="kernel backend (default: LOAN_KERNEL_BACKEND or auto)")
+    args = parser.parse_args(argv)
+
+    if args.backend:
+        os.environ["LOAN_KERNEL_BACKEND"] = args.backend  # also seen by the page runs
+        kernels.set_backend(args.backend)
+    current = run_benchmarks(
+        args.scenario, page=not args.no_page, page_repeat=args.page_repeat,
+        progress=lambda name: print(f"Benchmarking {name}...", file=sys.stderr),
+    )
+
+    for scenario, stages in current["results"].items():
+        print(scenario)
+        for stage in STAGES:
+            if stage in stages:
+                print(f"  {stage:20s} {_format_seconds(stages[stage]['median'])}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    rows = compare(current, baseline, args.tolerance)
+    print(f"\nAgainst {args.baseline} from {baseline['meta']['timestamp']} "
+          f"({baseline['meta']['kernel_backend']} backend; this run: {current['meta']['kernel_backend']}):")
+    for scenario, stage, before, after, ratio, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"  {scenario:18s} {stage:20s} {_format_seconds(before)} -> {_format_seconds(after)}"
+              f"  x{ratio:5.2f}{flag}")
+    regressions = sum(row[-1] for row in rows)
+    if regressions:
+        print(f"{regressions} stage(s) slower than the baseline by more than {args.tolerance:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
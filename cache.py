@@ -0,0 +1,215 @@
+"""Result cache shared by every session served from one process.
+
+Scenarios are first normalized so that inputs which simulate identically
+(different row ids, rows past an indefinite row, float noise in money
+amounts, ...) map to the same key.  Entries are evicted least recently used
+first once the memory limit is reached, and expire after a time-to-live.
+"""
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, fields, is_dataclass, replace
+from typing import Any, Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from engine import ExtraPaymentSegment, Scenario
+
+DEFAULT_MAX_MB = 256
+DEFAULT_TTL_SECONDS = 3600
+
+
+# -------------------------
+# Input Normalization
+# -------------------------
+def _fold_timeline(segments, total_months: int, fold_tail: bool):
+    # Rows after the one that fills the horizon are never used, and a row that
+    # runs past the horizon is the same as an indefinite (0 years) row.
+    folded = []
+    assigned = 0
+    for seg in segments:
+        if seg.years == 0:
+            folded.append(seg)
+            return folded
+        months = int(seg.years * 12)
+        if months >= total_months - assigned:
+            folded.append(replace(seg, years=0))
+            return folded
+        folded.append(seg)
+        assigned += months
+    # Inflation timelines that stop short continue at the last rate that
+    # covered any months (see engine.inflation_timeline), so once trailing
+    # rows that cover no months are dropped, a last row that covers some can
+    # run to the end instead.  Salary timelines are left alone since the
+    # padding is reported as its own bracket.
+    if fold_tail:
+        while folded and int(folded[-1].years * 12) == 0:
+            folded.pop()
+        if folded and int(folded[-1].years * 12) > 0:
+            folded[-1] = replace(folded[-1], years=0)
+    return folded
+
+
+def _fold_extra(segments, total_months: int):
+    folded = []
+    for seg in segments:
+        amount = round(seg.extra_payment, 2)
+        if amount == 0:
+            continue
+        start = seg.start_month - 1
+        duration = seg.duration_months
+        if start >= 0:
+            end = total_months if duration == 0 else min(start + duration, total_months)
+            if end <= start:
+                continue
+            if end == total_months:
+                duration = 0
+        folded.append(ExtraPaymentSegment(amount, seg.start_month, duration))
+    # Overlapping rows add up, so their order does not matter.
+    folded.sort(key=lambda seg: (seg.start_month, seg.duration_months, seg.extra_payment))
+    return tuple(folded)
+
+
+def normalize_scenario(scenario: Scenario) -> Scenario:
+    total_months = scenario.total_months
+    salary = [replace(seg, salary=round(seg.salary, 2)) for seg in scenario.salary_segments]
+    inflation = [replace(seg, inflation=round(seg.inflation, 6)) for seg in scenario.inflation_segments]
+    return replace(
+        scenario,
+        starting_loan=round(scenario.starting_loan, 2),
+        salary_segments=tuple(_fold_timeline(salary, total_months, fold_tail=False)),
+        inflation_segments=tuple(_fold_timeline(inflation, total_months, fold_tail=True)),
+        extra_segments=_fold_extra(scenario.extra_segments, total_months),
+    )
+
+
+def scenario_key(scenario: Scenario) -> str:
+    # Hash of an already normalized scenario.  The dataclass repr names every
+    # field and round-trips floats exactly, and is far cheaper than asdict().
+    return hashlib.sha256(repr(scenario).encode()).hexdigest()
+
+
+# -------------------------
+# Size Estimation
+# -------------------------
+def estimate_size(value: Any) -> int:
+    if isinstance(value, (int, float, str, type(None))):
+        return sys.getsizeof(value)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if is_dataclass(value) and not isinstance(value, type):
+        return sys.getsizeof(value) + sum(estimate_size(getattr(value, f.name)) for f in fields(value))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+# -------------------------
+# LRU + TTL Cache
+# -------------------------
+@dataclass(frozen=True)
+class CacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    entries: int
+    bytes: int
+    max_bytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ResultCache:
+    """Thread-safe LRU cache bounded by estimated memory, with a TTL."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_MB * 2**20, ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS,
+                 sizeof: Callable[[Any], int] = estimate_size, clock: Callable[[], float] = time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._sizeof = sizeof
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = self._misses = self._evictions = self._expirations = 0
+
+    @classmethod
+    def from_env(cls) -> "ResultCache":
+        # LOAN_CACHE_MAX_MB and LOAN_CACHE_TTL_SECONDS (0 disables expiry).
+        max_mb = float(os.environ.get("LOAN_CACHE_MAX_MB", DEFAULT_MAX_MB))
+        ttl = float(os.environ.get("LOAN_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS))
+        return cls(max_bytes=int(max_mb * 2**20), ttl_seconds=ttl or None)
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= self._clock():
+                self._drop(key)
+                self._expirations += 1
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def put(self, key: str, value) -> None:
+        size = self._sizeof(value)
+        expires_at = self._clock() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self._evictions += 1
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                expirations=self._expirations,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                max_bytes=self.max_bytes,
+            )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _drop(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
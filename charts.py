@@ -0,0 +1,163 @@
+"""Chart data: as few points as the picture needs.
+
+Line charts over the 480-month horizon do not need every month, and several
+series of the same months do not need their dates sent once per chart.
+:func:`chart_data` turns a date-indexed frame of series into one smaller
+frame with shared dates, in two steps:
+
+1. Resolution.  Every series gets an equal share of a point budget.  If the
+   months are more than :data:`MAX_REDUCTION` times that share, the series
+   are first aggregated to quarters or years (:func:`resample`), each with
+   its own aggregation (a balance keeps its value at the start of the
+   period, payments are averaged, ...).
+2. Downsampling.  Largest-Triangle-Three-Buckets (:func:`lttb`) picks each
+   series' share of the remaining points so that its peaks, troughs and
+   corners (such as the payoff month) survive.  The frame keeps the union of
+   the picked dates, with every series' exact value at each of them.
+"""
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+RESOLUTIONS = {"monthly": 1, "quarterly": 3, "yearly": 12}
+DEFAULT_MAX_POINTS = 240  # rows of the merged frame; plenty for a phone-width chart
+# LTTB keeps the shape well down to about a quarter of the points; beyond
+# that, aggregating to a coarser resolution first gives a smoother line.
+MAX_REDUCTION = 4
+
+AGGREGATIONS = ("first", "last", "mean", "sum", "min", "max")
+
+
+# -------------------------
+# Resolution
+# -------------------------
+def pick_resolution(n_months: int, n_series: int = 1, max_points: int = DEFAULT_MAX_POINTS) -> str:
+    """The finest resolution whose points LTTB can bring within each series'
+    share of ``max_points`` without dropping more than 1 in MAX_REDUCTION."""
+    share = max(max_points // max(n_series, 1), 3)
+    for name, months in RESOLUTIONS.items():
+        if -(-n_months // months) <= share * MAX_REDUCTION:
+            return name
+    return "yearly"
+
+
+def resample(frame: pd.DataFrame, resolution: str, how: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """Aggregate a month-start DatetimeIndex frame to calendar quarters or
+    years.  ``how`` maps columns to one of :data:`AGGREGATIONS` (default
+    ``"mean"``); each period is labelled with its first month's date."""
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution {resolution!r}; expected one of {tuple(RESOLUTIONS)}")
+    if resolution == "monthly" or frame.empty:
+        return frame
+    dates = frame.index
+    period = dates.year.to_numpy() * 12 + dates.month.to_numpy() - 1
+    period //= RESOLUTIONS[resolution]
+    # Periods are contiguous runs of months, so each is one reduceat segment.
+    starts = np.flatnonzero(np.r_[True, period[1:] != period[:-1]])
+    ends = np.r_[starts[1:], len(period)] - 1
+    counts = ends - starts + 1
+    how = how or {}
+    columns = {}
+    for name in frame.columns:
+        values = frame[name].to_numpy(dtype=float)
+        method = how.get(name, "mean")
+        if method == "first":
+            columns[name] = values[starts]
+        elif method == "last":
+            columns[name] = values[ends]
+        elif method == "mean":
+            columns[name] = np.add.reduceat(values, starts) / counts
+        elif method == "sum":
+            columns[name] = np.add.reduceat(values, starts)
+        elif method == "min":
+            columns[name] = np.minimum.reduceat(values, starts)
+        elif method == "max":
+            columns[name] = np.maximum.reduceat(values, starts)
+        else:
+            raise ValueError(f"Unknown aggregation {method!r} for {name!r}; expected one of {AGGREGATIONS}")
+    return pd.DataFrame(columns, index=dates[starts])
+
+
+# -------------------------
+# Downsampling
+# -------------------------
+def lttb(y: np.ndarray, n_out: int, x: Optional[np.ndarray] = None) -> np.ndarray:
+    """Indices of the ``n_out`` points of ``y`` chosen by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept; every bucket in between keeps
+    the point forming the largest triangle with the previously kept point
+    and the mean of the next bucket.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n or n <= 2:
+        return np.arange(n)
+    n_out = max(n_out, 3)
+    x = np.arange(n, dtype=float) if x is None else np.asarray(x, dtype=float)
+    # Bucket boundaries for the n - 2 middle points.
+    every = (n - 2) / (n_out - 2)
+    edges = np.minimum((np.arange(n_out - 1) * every).astype(int) + 1, n - 1)
+    edges[-1] = n - 1
+    means_x = np.add.reduceat(x[1:-1], edges[:-1] - 1) / np.diff(edges)
+    means_y = np.add.reduceat(y[1:-1], edges[:-1] - 1) / np.diff(edges)
+    selected = np.empty(n_out, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for bucket in range(n_out - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        if bucket + 1 < n_out - 2:
+            next_x, next_y = means_x[bucket + 1], means_y[bucket + 1]
+        else:
+            next_x, next_y = x[-1], y[-1]
+        # Twice the triangle areas, for every candidate in the bucket.
+        area = np.abs((x[a] - next_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[bucket + 1] = a
+    return selected
+
+
+def chart_data(frame: pd.DataFrame, max_points: int = DEFAULT_MAX_POINTS, resolution: str = "auto",
+               how: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """At most about ``max_points`` rows of ``frame`` (month-start dates as
+    the index, one column per series) that keep the shape of every series.
+
+    ``resolution`` is ``"auto"`` (see :func:`pick_resolution`) or one of
+    :data:`RESOLUTIONS`; ``how`` is passed to :func:`resample`.
+    """
+    n_series = max(frame.shape[1], 1)
+    if resolution == "auto":
+        resolution = pick_resolution(len(frame), n_series, max_points)
+    frame = resample(frame, resolution, how)
+    if len(frame) <= max_points:
+        return frame
+    share = max(max_points // n_series, 3)
+    keep = np.zeros(len(frame), dtype=bool)
+    for name in frame.columns:
+        keep[lttb(frame[name].to_numpy(dtype=float), share)] = True
+    return frame[keep]
+
+
+# -------------------------
+# Stacked Line Chart
+# -------------------------
+def stacked_line_chart(frame: pd.DataFrame, titles: Optional[Dict[str, str]] = None, height: int = 220):
+    """One Altair chart with a line panel per column of ``frame``, stacked
+    with shared dates and their own y axes, built on a single dataset so the
+    dates and values are sent to the browser once."""
+    import altair as alt  # only needed by the page
+
+    titles = titles or {}
+    date = frame.index.name or "Date"
+    panels = [
+        alt.Chart(title=titles.get(name, name)).mark_line().encode(
+            x=alt.X(field=date, type="temporal", title=None),
+            y=alt.Y(field=name, type="quantitative", title=None),
+            tooltip=[
+                alt.Tooltip(field=date, type="temporal", title="Date", format="%b %Y"),
+                alt.Tooltip(field=name, type="quantitative", title=name, format=",.2f"),
+            ],
+        ).properties(height=height)
+        for name in frame.columns
+    ]
+    return alt.vconcat(*panels, data=frame.reset_index())
@@ -0,0 +1,634 @@
+"""Headless repayment engine for the UK student loan simulator.
+
+Nothing in this module imports Streamlit, so the model can be driven from
+worker processes and batch jobs as well as from the ``a.py`` page, which
+only converts its widget rows into a :class:`Scenario` and renders the
+returned :class:`SimulationResult`.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+import kernels
+import timing
+
+# -------------------------
+# Plan Constants
+# -------------------------
+REPAYMENT_THRESHOLD = 27295  # UK Plan 2 annual threshold
+REPAYMENT_RATE = 0.09  # 9% of income above the threshold
+TOTAL_YEARS = 40
+
+
+class InputError(ValueError):
+    """A timeline row could not be interpreted."""
+
+
+@dataclass(frozen=True)
+class PlanConstants:
+    repayment_threshold: float = REPAYMENT_THRESHOLD  # before the first scheduled change
+    repayment_rate: float = REPAYMENT_RATE
+    # (tax year, annual threshold) changes, each from the April that starts
+    # the tax year, in order.
+    threshold_schedule: Tuple[Tuple[int, float], ...] = ()
+    # Raise the threshold, and the incomes of the interest tiers, by the
+    # inflation (RPI) rate every April after the last scheduled change.
+    uprate_with_rpi: bool = False
+    # (annual income, margin in percentage points) points: interest is the
+    # inflation rate plus a margin interpolated linearly between them, and
+    # flat beyond the first and last.  No points means no margin.
+    interest_tiers: Tuple[Tuple[float, float], ...] = ()
+    # Month (1-12) from which each year's interest rate is charged by the
+    # daily model (see highres.py); the monthly model follows the timeline.
+    rate_change_month: int = 4
+
+
+@dataclass(frozen=True)
+class SalarySegment:
+    salary: float
+    years: int  # 0 means indefinite
+
+
+@dataclass(frozen=True)
+class InflationSegment:
+    inflation: float  # annual rate in percent
+    years: int  # 0 means indefinite
+
+
+@dataclass(frozen=True)
+class ExtraPaymentSegment:
+    extra_payment: float  # per month
+    start_month: int  # 1-based, relative to repayment start
+    duration_months: int  # 0 means until the end of the simulation
+
+
+@dataclass(frozen=True)
+class Scenario:
+    starting_loan: float
+    salary_segments: Tuple[SalarySegment, ...]
+    inflation_segments: Tuple[InflationSegment, ...]
+    start_year: int
+    extra_segments: Tuple[ExtraPaymentSegment, ...] = ()
+    total_years: int = TOTAL_YEARS
+    plan: PlanConstants = PlanConstants()
+
+    @property
+    def total_months(self) -> int:
+        return self.total_years * 12
+
+
+@dataclass
+class Schedules:
+    salary: np.ndarray
+    inflation: np.ndarray  # annual rate in percent
+    extra: np.ndarray
+    threshold: np.ndarray  # annual repayment threshold in force each month
+    uprating: np.ndarray  # growth of the plan's thresholds since its last scheduled change
+    interest: np.ndarray  # annual interest rate in percent: inflation plus the plan's margin
+    bracket_indices: np.ndarray  # salary bracket for each month
+    bracket_details: List[Tuple[float, int]]  # (salary, months_in_bracket)
+
+
+# Result columns, in table order.
+RESULT_COLUMNS = (
+    "Month", "Date", "Salary", "Regular Payment", "Extra Payment", "Total Payment", "Interest Accrued",
+    "Cumulative Paid", "Loan Balance", "Bracket", "Minimum Salary (to Offset Interest)",
+)
+# Columns that depend on the balance path, stored from the kernel's output rows.
+KERNEL_COLUMNS = {
+    "Regular Payment": kernels.REGULAR,
+    "Extra Payment": kernels.EXTRA,
+    "Total Payment": kernels.PAYMENT,
+    "Interest Accrued": kernels.INTEREST,
+    "Loan Balance": kernels.BALANCE,
+}
+
+
+@dataclass
+class SimulationResult:
+    """Month-by-month output, stored column by column.
+
+    Only the columns that depend on the balance path are stored (in
+    ``columns``, as float64 or float32), with the salary bracket of each
+    month as a small integer column.  The dates are just a start year and a
+    month count.  :meth:`column` derives every other column when it is
+    asked for: Month and Date from the start year, Salary from the bracket,
+    Cumulative Paid as the running total of Total Payment, and the minimum
+    salary from the scenario's threshold and interest schedules.  A column
+    present in ``columns`` is always returned as stored.
+    """
+    start_year: int
+    n_months: int
+    columns: Dict[str, np.ndarray]
+    bracket: np.ndarray  # salary bracket index of each month
+    bracket_details: List[Tuple[float, int]]  # (salary, months_in_bracket)
+    loan_repaid_month: Optional[int]  # None if not repaid within the horizon
+    scenario: Optional[Scenario] = None  # needed only for the minimum salary
+
+    @property
+    def nbytes(self) -> int:
+        return self.bracket.nbytes + sum(values.nbytes for values in self.columns.values())
+
+    def column(self, name: str) -> np.ndarray:
+        if name in self.columns:
+            return self.columns[name]
+        if name == "Month":
+            return np.arange(1, self.n_months + 1)
+        if name == "Date":
+            return month_start_dates(self.start_year, self.n_months).to_numpy()
+        if name == "Salary":
+            return np.array([salary for salary, _ in self.bracket_details], dtype=float)[self.bracket]
+        if name == "Bracket":
+            return self.bracket.astype(np.int64)
+        if name == "Cumulative Paid":
+            # Sequential, like the kernel's running total, so the sums agree exactly.
+            return np.cumsum(self.column("Total Payment"), dtype=float)
+        if name == "Minimum Salary (to Offset Interest)":
+            if self.scenario is None:
+                raise KeyError(f"{name!r} needs the scenario")
+            schedules = build_schedules(self.scenario)
+            balance = self.column("Loan Balance").astype(float, copy=False)
+            # Minimum salary required to cover a year's worth of interest at
+            # this balance; the threshold itself once the balance is repaid.
+            rate = monthly_rates(schedules.interest)
+            return schedules.threshold + (balance * rate * 12) / self.scenario.plan.repayment_rate
+        raise KeyError(f"Unknown result column {name!r}; expected one of {RESULT_COLUMNS}")
+
+    def frame(self, columns: Sequence[str] = RESULT_COLUMNS) -> pd.DataFrame:
+        """A DataFrame of just ``columns``, derived as needed."""
+        return pd.DataFrame({name: self.column(name) for name in columns})
+
+    @property
+    def sim_df(self) -> pd.DataFrame:
+        # The full table; prefer column() or frame() for just a few columns.
+        return self.frame()
+
+
+# -------------------------
+# Converting Page Rows to Typed Segments
+# -------------------------
+def salary_segments_from_rows(rows: Sequence[dict]) -> Tuple[SalarySegment, ...]:
+    segments = []
+    for idx, row in enumerate(rows):
+        try:
+            sal = float(row["salary"])
+        except Exception:
+            raise InputError(f"Invalid salary value in row {idx+1}")
+        segments.append(SalarySegment(salary=sal, years=int(row["years"])))
+    return tuple(segments)
+
+
+def inflation_segments_from_rows(rows: Sequence[dict]) -> Tuple[InflationSegment, ...]:
+    segments = []
+    for idx, row in enumerate(rows):
+        try:
+            inf_rate = float(row["inflation"])
+        except Exception:
+            raise InputError(f"Invalid inflation rate in row {idx+1}")
+        # An unreadable "years" value is treated as indefinite.
+        try:
+            yrs = int(row["years"])
+        except Exception:
+            yrs = 0
+        segments.append(InflationSegment(inflation=inf_rate, years=yrs))
+    return tuple(segments)
+
+
+def extra_segments_from_rows(rows: Sequence[dict]) -> Tuple[ExtraPaymentSegment, ...]:
+    segments = []
+    for row in rows:
+        try:
+            extra_amount = float(row["extra_payment"])
+        except Exception:
+            extra_amount = 0.0
+        segments.append(ExtraPaymentSegment(
+            extra_payment=extra_amount,
+            start_month=int(row["start_month"]),
+            duration_months=int(row["duration_months"]),
+        ))
+    return tuple(segments)
+
+
+def default_start_year(study_years: int) -> int:
+    # Repayments start on 1 January after graduating: current year + study years + 1
+    return datetime.now().year + int(study_years) + 1
+
+
+# -------------------------
+# Schedule Building
+# -------------------------
+def _segment_months(years: Sequence[int], total_months: int) -> List[int]:
+    # Months covered by each timeline row; 0 years means "until the end".
+    # Rows after the horizon is filled are dropped.
+    counts = []
+    assigned = 0
+    for yrs in years:
+        months = total_months - assigned if yrs == 0 else int(yrs * 12)
+        months = min(months, total_months - assigned)
+        counts.append(months)
+        assigned += months
+        if assigned >= total_months:
+            break
+    return counts
+
+
+def salary_brackets(scenario: Scenario) -> List[Tuple[float, int]]:
+    """(salary, months) of each bracket; a timeline that stops short is
+    padded with its last salary as an extra bracket."""
+    total_months = scenario.total_months
+    salaries = [seg.salary for seg in scenario.salary_segments]
+    salary_counts = _segment_months([seg.years for seg in scenario.salary_segments], total_months)
+    bracket_details = list(zip(salaries, salary_counts))
+    assigned = sum(salary_counts)
+    if assigned < total_months:
+        last_sal = bracket_details[-1][0] if bracket_details else 0
+        bracket_details.append((last_sal, total_months - assigned))
+    return bracket_details
+
+
+def inflation_timeline(scenario: Scenario) -> Tuple[List[float], List[int]]:
+    """Annual inflation rates and the months each covers; padded with the
+    last rate that covered any months."""
+    total_months = scenario.total_months
+    rates = [seg.inflation for seg in scenario.inflation_segments]
+    rate_counts = _segment_months([seg.years for seg in scenario.inflation_segments], total_months)
+    rates = rates[:len(rate_counts)]
+    assigned = sum(rate_counts)
+    if assigned < total_months:
+        covered = [rate for rate, months in zip(rates, rate_counts) if months > 0]
+        rates.append(covered[-1] if covered else 0)
+        rate_counts.append(total_months - assigned)
+    return rates, rate_counts
+
+
+def extra_intervals(scenario: Scenario) -> List[Tuple[int, int, float]]:
+    """(first, stop, payment) 0-based month ranges of the extra repayment
+    rows, in row order; overlapping ranges add up."""
+    total_months = scenario.total_months
+    intervals = []
+    for seg in scenario.extra_segments:
+        # Adjust for 0-based indexing: if user enters month 1, start at index 0.
+        start = seg.start_month - 1
+        months_active = total_months - start if seg.duration_months == 0 else seg.duration_months
+        end = min(start + months_active, total_months)
+        if end <= start:
+            continue
+        if start >= 0:
+            intervals.append((start, end, seg.extra_payment))
+            continue
+        # Negative start months index from the end, as list indexing did.
+        if start < -total_months:
+            raise InputError(f"Extra repayment start month {seg.start_month} is before the repayment horizon")
+        intervals.append((total_months + start, total_months + min(end, 0), seg.extra_payment))
+        if end > 0:
+            intervals.append((0, end, seg.extra_payment))
+    return intervals
+
+
+def build_schedules(scenario: Scenario) -> Schedules:
+    total_months = scenario.total_months
+
+    bracket_details = salary_brackets(scenario)
+    bracket_salaries = np.array([sal for sal, _ in bracket_details], dtype=float)
+    bracket_months = np.maximum([months for _, months in bracket_details], 0)
+    salary = np.repeat(bracket_salaries, bracket_months)[:total_months]
+    bracket_indices = np.repeat(np.arange(len(bracket_details)), bracket_months)[:total_months]
+
+    rates, rate_counts = inflation_timeline(scenario)
+    inflation = np.repeat(np.array(rates, dtype=float), np.maximum(rate_counts, 0))[:total_months]
+
+    extra = np.zeros(total_months)
+    for first, stop, payment in extra_intervals(scenario):
+        extra[first:stop] += payment
+
+    threshold, uprating = plan_thresholds(scenario.plan, scenario.start_year, inflation)
+
+    return Schedules(
+        salary=salary,
+        inflation=inflation,
+        extra=extra,
+        threshold=threshold,
+        uprating=uprating,
+        interest=plan_interest(inflation, salary, scenario.plan, uprating),
+        bracket_indices=bracket_indices,
+        bracket_details=bracket_details,
+    )
+
+
+def plan_thresholds(plan: PlanConstants, start_year: int, inflation: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Annual repayment threshold in force in each month from January of
+    ``start_year``, and the factor by which uprating has raised the plan's
+    thresholds by then (1 without uprating).  ``inflation`` may be a
+    (months x points) array of several timelines; under an uprated plan,
+    both results then are too."""
+    total_months = len(inflation)
+    return plan_thresholds_at(plan, start_year, np.arange(total_months),
+                              inflation[3::12], inflation[0] if total_months else 0.0)
+
+
+def plan_thresholds_at(plan: PlanConstants, start_year: int, months: np.ndarray, april_inflation: np.ndarray,
+                       first_inflation: float) -> Tuple[np.ndarray, np.ndarray]:
+    """:func:`plan_thresholds` in the 0-based ``months`` only, from the
+    inflation rate in the first month and in each April of the horizon."""
+    # Tax years start in April: January to March belong to the previous one.
+    tax_year_index = (months + 9) // 12  # 0 for the tax year that started before start_year's April
+    threshold = np.full(len(months), float(plan.repayment_threshold))
+    for tax_year, value in plan.threshold_schedule:
+        threshold[start_year - 1 + tax_year_index >= tax_year] = value
+    uprating = np.ones(len(months))
+    if plan.uprate_with_rpi and len(months):
+        last_change = plan.threshold_schedule[-1][0] if plan.threshold_schedule else start_year - 1
+        # Aprils between the last change and the start of repayment are
+        # uprated at the first inflation rate, the later ones at their own.
+        before = np.asarray((1 + np.asarray(first_inflation) / 100) ** max(start_year - 1 - last_change, 0))
+        april_years = np.arange(len(april_inflation)).reshape(-1, *[1] * before.ndim)
+        growth = np.where(start_year + april_years > last_change, 1 + april_inflation / 100, 1.0)
+        uprating = np.concatenate([before[None], before * np.cumprod(growth, axis=0)])[tax_year_index]
+        threshold = threshold.reshape(-1, *[1] * before.ndim) * uprating
+    return threshold, uprating
+
+
+def plan_interest(inflation: np.ndarray, salary: np.ndarray, plan: PlanConstants, uprating=1.0) -> np.ndarray:
+    # Annual interest rate in percent: inflation plus the plan's income-dependent margin.
+    if not plan.interest_tiers:
+        return inflation
+    incomes, margins = zip(*plan.interest_tiers)
+    return inflation + np.interp(salary / uprating, incomes, margins)
+
+
+def regular_payments(salary: np.ndarray, plan: PlanConstants, threshold=None, periods: int = 12) -> np.ndarray:
+    # Regular payment per pay period (monthly by default) from salary (if
+    # above threshold); ``threshold`` defaults to the plan's first one.
+    if threshold is None:
+        threshold = plan.repayment_threshold
+    return np.where(salary > threshold, ((salary - threshold) * plan.repayment_rate) / periods, 0.0)
+
+
+def monthly_rates(inflation: np.ndarray) -> np.ndarray:
+    return (inflation / 100) / 12
+
+
+def month_start_dates(start_year: int, total_months: int) -> pd.DatetimeIndex:
+    # First of each month from January of the start year.  Month arithmetic on
+    # datetime64 is much cheaper than pd.date_range(freq="MS") or DateOffset.
+    months = np.datetime64(f"{start_year}-01", "M") + np.arange(total_months)
+    return pd.DatetimeIndex(months.astype("datetime64[ns]"))
+
+
+# -------------------------
+# Simulation
+# -------------------------
+def simulate_repayment(scenario: Scenario, dtype=np.float64) -> SimulationResult:
+    with timing.span("build_schedules"):
+        schedules = build_schedules(scenario)
+    with timing.span("monthly_loop"):
+        regular = regular_payments(schedules.salary, scenario.plan, schedules.threshold)
+        rate = monthly_rates(schedules.interest)
+        # Months after repayment keep zero payments and balance.
+        out = np.zeros((kernels.N_COLUMNS, scenario.total_months))
+        simulated, loan_repaid_month = kernels.recurrence(scenario.starting_loan, regular, schedules.extra, rate, out)
+    return result_from_columns(scenario, schedules, out, loan_repaid_month, dtype)
+
+
+def result_from_columns(scenario: Scenario, schedules: Schedules, out: np.ndarray,
+                        loan_repaid_month: Optional[int], dtype=np.float64) -> SimulationResult:
+    """Wrap the kernel's ``out`` columns in a result.  With float64 the
+    result holds views of ``out``, which must not be modified afterwards;
+    float32 (half the memory, about 7 significant digits) copies them."""
+    with timing.span("result_table"):
+        dtype = np.dtype(dtype)
+        if dtype == np.float64:
+            columns = {name: out[row] for name, row in KERNEL_COLUMNS.items()}
+        else:
+            columns = {name: out[row].astype(dtype) for name, row in KERNEL_COLUMNS.items()}
+        # Salary bracket indices fit the smallest integer type that holds them.
+        bracket = schedules.bracket_indices.astype(np.min_scalar_type(max(len(schedules.bracket_details) - 1, 0)))
+    return SimulationResult(
+        start_year=scenario.start_year,
+        n_months=scenario.total_months,
+        columns=columns,
+        bracket=bracket,
+        bracket_details=schedules.bracket_details,
+        loan_repaid_month=loan_repaid_month,
+        scenario=scenario,
+    )
+
+
+def summarize_scenarios(scenarios: Sequence[Scenario], balances: bool = False) -> Dict[str, np.ndarray]:
+    """Payoff month (-1 if not repaid), total repaid, interest paid and
+    written-off balance of each scenario, simulated together by the batched
+    kernel.  The scenarios' horizons may differ.  With ``balances``, also the
+    balance and the total paid so far at the end of every month (months x
+    scenarios; both stay flat after a scenario's horizon)."""
+    n = len(scenarios)
+    total_months = max((scenario.total_months for scenario in scenarios), default=0)
+    # Months past a shorter horizon have no payments and no interest, so they
+    # leave that scenario's results unchanged.
+    regular = np.zeros((n, total_months))
+    extra = np.zeros((n, total_months))
+    rate = np.zeros((n, total_months))
+    for j, scenario in enumerate(scenarios):
+        schedules = build_schedules(scenario)
+        months = scenario.total_months
+        regular[j, :months] = regular_payments(schedules.salary, scenario.plan, schedules.threshold)
+        extra[j, :months] = schedules.extra
+        rate[j, :months] = monthly_rates(schedules.interest)
+    # The batched kernel is month-major (months x scenarios).
+    state = kernels.BatchState.start([scenario.starting_loan for scenario in scenarios])
+    balances_out = np.empty((total_months, n)) if balances else None
+    paid_out = np.empty((total_months, n)) if balances else None
+    kernels.recurrence_batch(state, regular.T.copy(), extra.T.copy(), rate.T.copy(), balances_out, paid_out)
+    summaries = {
+        "payoff_month": state.payoff_month,
+        "total_repaid": state.total_paid,
+        "interest_paid": state.interest_paid,
+        "written_off": np.maximum(state.balance, 0.0),
+    }
+    if balances:
+        summaries["balances"] = balances_out
+        summaries["cumulative_paid"] = paid_out
+    return summaries
+
+
+# -------------------------
+# Summaries (Segmented Reductions over the Result Columns)
+# -------------------------
+def bracket_summary(result: SimulationResult) -> pd.DataFrame:
+    """Per salary bracket totals, computed in one pass over the Bracket column."""
+    bracket = result.column("Bracket")
+    n = len(result.bracket_details)
+
+    def total(column):
+        return np.bincount(bracket, weights=result.column(column), minlength=n)
+
+    months = np.bincount(bracket, minlength=n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg_min_salary = np.where(months > 0, total("Minimum Salary (to Offset Interest)") / months, 0.0)
+    return pd.DataFrame({
+        "Salary": [sal for sal, _ in result.bracket_details],
+        "Months": months,
+        "Total Payment": total("Total Payment"),
+        "Total Interest": total("Interest Accrued"),
+        "Avg Minimum Salary": avg_min_salary,
+    })
+
+
+def period_summary(result: SimulationResult, by: str = "year") -> pd.DataFrame:
+    """Calendar year (``by="year"``) or UK tax year (``by="tax_year"``) totals.
+
+    Tax years run from April to March and are labelled like ``2031/32``.
+    """
+    # Calendar month counts from January of the start year.
+    months_since = result.start_year * 12 + np.arange(result.n_months, dtype=np.int32)
+    year = months_since // 12
+    if by == "year":
+        period = year
+    elif by == "tax_year":
+        period = (months_since - 3) // 12
+    else:
+        raise ValueError(f"Unknown period {by!r}; expected 'year' or 'tax_year'")
+
+    # Periods are contiguous runs of months, so each is one reduceat segment.
+    starts = np.flatnonzero(np.r_[True, period[1:] != period[:-1]])
+    ends = np.r_[starts[1:], len(period)] - 1
+
+    def total(column):
+        return np.add.reduceat(result.column(column).astype(float, copy=False), starts)
+
+    months = ends - starts + 1
+    keys = period[starts]
+    if by == "tax_year":
+        keys = [f"{p}/{(p + 1) % 100:02d}" for p in keys]
+    return pd.DataFrame({
+        "Tax Year" if by == "tax_year" else "Year": keys,
+        "Months": months,
+        "Average Salary": total("Salary") / months,
+        "Regular Payment": total("Regular Payment"),
+        "Extra Payment": total("Extra Payment"),
+        "Total Payment": total("Total Payment"),
+        "Interest Accrued": total("Interest Accrued"),
+        "Cumulative Paid": result.column("Cumulative Paid")[ends],
+        "Closing Balance": result.column("Loan Balance")[ends].astype(float),
+    })
+
+
+def simulate_repayment_loop(scenario: Scenario) -> SimulationResult:
+    """Month-by-month reference implementation of :func:`simulate_repayment`.
+
+    Slow, but written exactly as the model is described; kept to validate
+    the vectorized engine against.
+    """
+    total_months = scenario.total_months
+    repayment_rate = scenario.plan.repayment_rate
+    start_date = pd.to_datetime(f"{scenario.start_year}-01-01")
+
+    schedules = build_schedules(scenario)
+    month_salary_schedule = schedules.salary.tolist()
+    month_inflation_schedule = schedules.interest.tolist()
+    month_threshold_schedule = schedules.threshold.tolist()
+    extra_repayment_schedule = schedules.extra.tolist()
+    bracket_indices = schedules.bracket_indices.tolist()
+
+    loan_repaid_month = None  # Month when loan is fully repaid
+    balance = scenario.starting_loan
+    cumulative_paid = 0.0
+
+    months_list = []
+    dates_list = []
+    salary_list = []
+    regular_payment_list = []
+    extra_payment_list = []
+    total_payment_list = []
+    balance_list = []
+    cumulative_paid_list = []
+    interest_list = []
+    bracket_list = []
+    min_salary_list = []  # Minimum salary required to cover interest
+
+    for month in range(total_months):
+        current_salary = month_salary_schedule[month]
+        current_inf = month_inflation_schedule[month]
+        current_monthly_inflation = (current_inf / 100) / 12
+        repayment_threshold = month_threshold_schedule[month]
+
+        # Regular monthly payment from salary (if above threshold)
+        if current_salary > repayment_threshold:
+            regular_payment = ((current_salary - repayment_threshold) * repayment_rate) / 12
+        else:
+            regular_payment = 0.0
+
+        # Extra payment from extra repayments schedule
+        extra_payment = extra_repayment_schedule[month]
+
+        # Total scheduled payment before capping by remaining balance
+        scheduled_payment = regular_payment + extra_payment
+
+        # Accrue interest first
+        interest = balance * current_monthly_inflation
+        balance += interest
+
+        # Cap payment if it exceeds remaining balance
+        if scheduled_payment > balance:
+            # Apply regular payment first, then extra repayment as possible.
+            if regular_payment >= balance:
+                regular_payment = balance
+                extra_payment = 0.0
+            else:
+                extra_payment = balance - regular_payment
+            scheduled_payment = balance
+
+        balance -= scheduled_payment
+        cumulative_paid += scheduled_payment
+
+        # Calculate the minimum salary required to cover a year's worth of interest at this balance.
+        min_salary = repayment_threshold + (balance * current_monthly_inflation * 12) / repayment_rate
+
+        months_list.append(month + 1)
+        current_date = start_date + pd.DateOffset(months=month)
+        dates_list.append(current_date)
+        salary_list.append(current_salary)
+        regular_payment_list.append(regular_payment)
+        extra_payment_list.append(extra_payment)
+        total_payment_list.append(scheduled_payment)
+        balance_list.append(balance)
+        cumulative_paid_list.append(cumulative_paid)
+        interest_list.append(interest)
+        bracket_list.append(bracket_indices[month])
+        min_salary_list.append(min_salary)
+
+        if balance <= 0:
+            loan_repaid_month = month + 1
+            # Fill in remaining months with zeros if loan is repaid early.
+            for extra_month in range(month+1, total_months):
+                months_list.append(extra_month+1)
+                current_date = start_date + pd.DateOffset(months=extra_month)
+                dates_list.append(current_date)
+                salary_list.append(month_salary_schedule[extra_month])
+                regular_payment_list.append(0.0)
+                extra_payment_list.append(0.0)
+                total_payment_list.append(0.0)
+                balance_list.append(0.0)
+                cumulative_paid_list.append(cumulative_paid)
+                interest_list.append(0.0)
+                bracket_list.append(bracket_indices[extra_month])
+                min_salary_list.append(month_threshold_schedule[extra_month])
+            break
+
+    # The reference stores every column as computed here rather than deriving any.
+    columns = dict(zip(RESULT_COLUMNS, (
+        months_list, dates_list, salary_list, regular_payment_list, extra_payment_list, total_payment_list,
+        interest_list, cumulative_paid_list, balance_list, bracket_list, min_salary_list,
+    )))
+    return SimulationResult(
+        start_year=scenario.start_year,
+        n_months=total_months,
+        columns={name: pd.DatetimeIndex(values).to_numpy() if name == "Date" else np.asarray(values)
+                 for name, values in columns.items()},
+        bracket=np.asarray(bracket_list),
+        bracket_details=schedules.bracket_details,
+        loan_repaid_month=loan_repaid_month,
+        scenario=scenario,
+    )
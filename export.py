@@ -0,0 +1,247 @@
+"""CSV, Parquet and XLSX downloads of results.
+
+Every table is exposed as a :class:`pyarrow.RecordBatchReader` that yields
+its rows a chunk at a time, built straight from the result's numpy
+columns (Arrow wraps float and integer arrays without copying them), and
+:func:`write` streams a reader to a file or buffer in any of
+:data:`FORMATS`.  Nothing is rounded or formatted on the way: the files
+hold the full-precision values the page rounds for display.
+
+:func:`sweep_reader` and :func:`monte_carlo_reader` are lazy: they produce
+each chunk only when the writer asks for it, so writing a sweep of millions
+of grid points holds one chunk of rows at a time, however large the grid.
+:func:`monthly_reader` derives its columns in full when it is made, since
+a month-by-month table has only a few hundred rows (one per month of the
+horizon) and its stored columns are views of the result anyway.
+
+An XLSX workbook is written in XlsxWriter's constant-memory mode (one row
+in memory at a time) and starts a new worksheet every
+:data:`XLSX_MAX_ROWS` rows; at about 20,000 rows a second it is much
+slower to write than CSV or Parquet.
+"""
+import importlib.util
+import io
+import os
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+from engine import RESULT_COLUMNS, SimulationResult, bracket_summary
+from montecarlo import MonteCarloResult
+from streaming import DEFAULT_PERCENTILES, MonthlyAggregate
+from sweep import SweepResult
+
+FORMATS = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+DEFAULT_CHUNK_ROWS = 65536
+XLSX_MAX_ROWS = 1_048_576  # per worksheet, including the header row
+
+MONTHLY_COLUMNS = tuple(name for name in RESULT_COLUMNS if name != "Bracket")
+
+
+def available_formats() -> Dict[str, str]:
+    """:data:`FORMATS` whose writer is installed (XLSX needs XlsxWriter)."""
+    return {fmt: mime for fmt, mime in FORMATS.items()
+            if fmt != "xlsx" or importlib.util.find_spec("xlsxwriter") is not None}
+
+
+def format_for(path: str) -> str:
+    """The format of ``path`` from its extension (one of :data:`FORMATS`)."""
+    fmt = os.path.splitext(path)[1].lstrip(".").lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r} for {path!r}; expected one of {tuple(FORMATS)}")
+    return fmt
+
+
+# -------------------------
+# Tables
+# -------------------------
+def _chunked(schema: pa.Schema, n_rows: int, chunk_rows: int, chunk) -> pa.RecordBatchReader:
+    # ``chunk(start, stop)`` returns the arrays of rows [start, stop).
+    def batches() -> Iterator[pa.RecordBatch]:
+        for start in range(0, n_rows, chunk_rows):
+            yield pa.RecordBatch.from_arrays(chunk(start, min(start + chunk_rows, n_rows)), schema=schema)
+    return pa.RecordBatchReader.from_batches(schema, batches())
+
+
+def monthly_reader(result: SimulationResult, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> pa.RecordBatchReader:
+    """The month-by-month table (every result column but the bracket
+    index), with its derived columns worked out up front."""
+    columns = {name: result.column(name) for name in MONTHLY_COLUMNS}
+    columns["Month"] = columns["Month"].astype(np.int32)
+    columns["Date"] = columns["Date"].astype("datetime64[D]")  # date32
+    schema = pa.schema([(name, pa.from_numpy_dtype(values.dtype)) for name, values in columns.items()])
+    return _chunked(schema, result.n_months, chunk_rows,
+                    lambda start, stop: [pa.array(values[start:stop]) for values in columns.values()])
+
+
+def frame_reader(frame: pd.DataFrame, index: bool = True, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> pa.RecordBatchReader:
+    """A (small) DataFrame, e.g. a plan comparison, with its index as the
+    first column(s) if ``index``.  NaN is written as a missing value."""
+    table = pa.Table.from_pandas(frame.reset_index() if index else frame, preserve_index=False)
+    return pa.RecordBatchReader.from_batches(table.schema, table.to_batches(max_chunksize=chunk_rows))
+
+
+def bracket_reader(result: SimulationResult) -> pa.RecordBatchReader:
+    """The per-bracket totals of :func:`engine.bracket_summary`."""
+    return frame_reader(bracket_summary(result), index=False)
+
+
+def sweep_reader(result: SweepResult, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> pa.RecordBatchReader:
+    """One row per grid point: the value of each axis, then the outcomes
+    (``payoff_month`` is missing where the loan is not repaid)."""
+    metrics = {name: getattr(result, name).reshape(-1)
+               for name in ("total_repaid", "interest_paid", "written_off", "payoff_month")}
+    axis_values = [np.asarray(axis.values) for axis in result.axes]
+    schema = pa.schema(
+        [(axis.parameter, pa.float64()) for axis in result.axes]
+        + [(name, pa.float64()) for name in ("total_repaid", "interest_paid", "written_off")]
+        + [("payoff_month", pa.int32())]
+    )
+
+    def chunk(start, stop):
+        points = np.unravel_index(np.arange(start, stop), result.shape)
+        payoff = metrics["payoff_month"][start:stop]
+        return (
+            [pa.array(values[index]) for values, index in zip(axis_values, points)]
+            + [pa.array(metrics[name][start:stop]) for name in ("total_repaid", "interest_paid", "written_off")]
+            + [pa.array(payoff.astype(np.int32), mask=payoff <= 0)]
+        )
+    return _chunked(schema, int(np.prod(result.shape)), chunk_rows, chunk)
+
+
+def monte_carlo_reader(result: MonteCarloResult, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> pa.RecordBatchReader:
+    """One row per simulated path (``payoff_month`` is missing where the
+    loan is not repaid)."""
+    schema = pa.schema([
+        ("path", pa.int32()),
+        ("payoff_month", pa.int32()),
+        ("total_repaid", pa.float64()),
+        ("interest_paid", pa.float64()),
+        ("written_off", pa.float64()),
+    ])
+
+    def chunk(start, stop):
+        payoff = result.payoff_month[start:stop]
+        return [
+            pa.array(np.arange(start, stop, dtype=np.int32)),
+            pa.array(payoff.astype(np.int32), mask=payoff <= 0),
+            pa.array(result.total_repaid[start:stop]),
+            pa.array(result.interest_paid[start:stop]),
+            pa.array(result.written_off[start:stop]),
+        ]
+    return _chunked(schema, result.n_paths, chunk_rows, chunk)
+
+
+def aggregate_reader(aggregate: MonthlyAggregate, percentiles=DEFAULT_PERCENTILES) -> pa.RecordBatchReader:
+    """One row per month of a streamed run's percentile bands and payoff
+    counts (see :meth:`streaming.MonthlyAggregate.table`)."""
+    return frame_reader(aggregate.table(percentiles))
+
+
+# -------------------------
+# Writers
+# -------------------------
+class XlsxWriter:
+    """Writes record batches to an XLSX workbook row by row, with the same
+    ``write_batch``, ``write_table`` and ``close`` methods as Arrow's CSV
+    and Parquet writers.
+    Needs the optional XlsxWriter package."""
+
+    def __init__(self, sink, schema: pa.Schema, sheet_name: str = "Data"):
+        try:
+            import xlsxwriter
+        except ImportError:
+            raise ImportError("XLSX export needs the XlsxWriter package (pip install XlsxWriter)") from None
+        self._workbook = xlsxwriter.Workbook(sink, {
+            "constant_memory": True,
+            "nan_inf_to_errors": True,
+        })
+        self._header = self._workbook.add_format({"bold": True})
+        self._date = self._workbook.add_format({"num_format": "yyyy-mm-dd"})
+        self._names = schema.names
+        self._types = schema.types
+        self._sheet_name = sheet_name
+        self._sheets = 0
+        self._row = 0
+
+    def _new_sheet(self):
+        self._sheets += 1
+        name = self._sheet_name if self._sheets == 1 else f"{self._sheet_name} ({self._sheets})"
+        self._sheet = self._workbook.add_worksheet(name)
+        self._sheet.write_row(0, 0, self._names, self._header)
+        self._row = 1
+        # One typed cell writer per column; XlsxWriter's generic write()
+        # would work out each cell's type again.
+        self._writers = [self._cell_writer(data_type) for data_type in self._types]
+
+    def _cell_writer(self, data_type: pa.DataType):
+        sheet = self._sheet
+        if pa.types.is_integer(data_type) or pa.types.is_floating(data_type):
+            return sheet.write_number
+        if pa.types.is_date(data_type) or pa.types.is_timestamp(data_type):
+            return lambda row, col, value: sheet.write_datetime(row, col, value, self._date)
+        if pa.types.is_string(data_type) or pa.types.is_large_string(data_type):
+            return sheet.write_string
+        return sheet.write
+
+    def write_batch(self, batch: pa.RecordBatch):
+        if self._sheets == 0:
+            self._new_sheet()
+        for values in zip(*(column.to_pylist() for column in batch.columns)):
+            if self._row >= XLSX_MAX_ROWS:
+                self._new_sheet()
+            row = self._row
+            for col, (cell, value) in enumerate(zip(self._writers, values)):
+                if value is not None:  # missing values are left blank
+                    cell(row, col, value)
+            self._row += 1
+
+    def write_table(self, table: pa.Table):
+        for batch in table.to_batches():
+            self.write_batch(batch)
+
+    def close(self):
+        if self._sheets == 0:
+            self._new_sheet()  # an empty table still gets its header row
+        self._workbook.close()
+
+
+def open_writer(sink, schema: pa.Schema, fmt: Optional[str] = None):
+    """A writer of ``schema`` batches to ``sink`` (a path or binary file
+    object) in ``fmt`` (default: from the path's extension)."""
+    fmt = fmt or format_for(sink)
+    if fmt == "csv":
+        return pacsv.CSVWriter(sink, schema)
+    if fmt == "parquet":
+        return pq.ParquetWriter(sink, schema)
+    if fmt == "xlsx":
+        return XlsxWriter(sink, schema)
+    raise ValueError(f"Unknown export format {fmt!r}; expected one of {tuple(FORMATS)}")
+
+
+def write(reader: pa.RecordBatchReader, sink, fmt: Optional[str] = None) -> int:
+    """Stream every batch of ``reader`` to ``sink``; returns the rows written."""
+    writer = open_writer(sink, reader.schema, fmt)
+    rows = 0
+    try:
+        for batch in reader:
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    finally:
+        writer.close()
+    return rows
+
+
+def export_bytes(reader: pa.RecordBatchReader, fmt: str) -> bytes:
+    """The whole file, for a download button."""
+    buffer = io.BytesIO()
+    write(reader, buffer, fmt)
+    return buffer.getvalue()
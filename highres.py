@@ -0,0 +1,158 @@
+"""High-resolution simulation: daily interest and payroll deductions.
+
+The monthly model takes one repayment a month, a twelfth of the annual
+repayment, and charges a twelfth of the annual interest rate.  Here the
+repayment is deducted from each pay instead (the share of the annual
+repayment for one pay period) and interest accrues every day, at the
+annual rate divided by the days in that year, on the balance.  Accrued
+interest is added to the balance at the end of each month.  Pay days are:
+
+``"weekly"``
+    Every Friday.
+``"four-weekly"``
+    Every fourth Friday, from the first Friday of January.
+``"monthly"``
+    The last day of each month.
+
+Extra repayments are taken on the first day of each month.  The interest
+rate changes once a year, as the plan's does: each April (September under
+Plan 1, see ``PlanConstants.rate_change_month``) the inflation rate of that
+month is fixed for the next twelve months, and the months before the first
+change use the first month's rate.  The plan's income-dependent margin
+still follows the month's salary.  Salaries, thresholds (with their April
+changes), inflation and extra repayments come from the engine's monthly
+schedules, so the two models differ only in the timing of interest, rate
+changes and payments; with a flat inflation rate and monthly pay they
+differ only in the daily accrual of interest.
+
+A 40-year horizon is about 14,600 days.  The day loop runs in
+:func:`kernels.daily_recurrence` (a few hundred microseconds with Numba) and
+its monthly totals fill the same :class:`~engine.SimulationResult` as the
+monthly engine, so every table, chart and summary works on the result.
+"""
+import datetime
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+import kernels
+import timing
+from engine import (
+    Scenario,
+    Schedules,
+    SimulationResult,
+    build_schedules,
+    plan_interest,
+    regular_payments,
+    result_from_columns,
+)
+
+PAY_FREQUENCIES = {"weekly": 52, "four-weekly": 13, "monthly": 12}  # pay periods per year
+FRIDAY = 4  # weekday, Monday = 0
+
+
+@dataclass
+class DaySchedules:
+    first_day: np.datetime64  # 1 January of the start year
+    month_days: np.ndarray  # days in each month
+    day_rate: np.ndarray  # daily interest rate (fraction) of each day
+    regular: np.ndarray  # payroll deduction taken each day (0 if not a pay day)
+    extra: np.ndarray  # extra repayment taken each day
+
+
+def pay_days(first_day: np.datetime64, month_days: np.ndarray, frequency: str) -> np.ndarray:
+    """0-based indices of the pay days, counted from ``first_day``, in months
+    of ``month_days`` days."""
+    if frequency == "monthly":
+        return np.cumsum(month_days) - 1
+    # 1970-01-01, day 0, was a Thursday.
+    first_friday = (FRIDAY - (first_day.astype(np.int64) + 3)) % 7
+    return np.arange(first_friday, month_days.sum(), 7 if frequency == "weekly" else 28)
+
+
+def annual_rates(scenario: Scenario, schedules: Schedules) -> np.ndarray:
+    """Annual interest rate (%) in each month, with the inflation part fixed
+    from each year's rate change month until the next."""
+    plan = scenario.plan
+    months = np.arange(scenario.total_months)
+    # 0-based index of the latest change month; the first month's rate before the first.
+    changed = np.maximum(months - (months - (plan.rate_change_month - 1)) % 12, 0)
+    return plan_interest(schedules.inflation[changed], schedules.salary, plan, schedules.uprating)
+
+
+def day_schedules(scenario: Scenario, schedules: Schedules, frequency: str = "weekly") -> DaySchedules:
+    """Spread the monthly ``schedules`` over the days of the horizon."""
+    if frequency not in PAY_FREQUENCIES:
+        raise ValueError(f"Unknown pay frequency {frequency!r}; expected one of {tuple(PAY_FREQUENCIES)}")
+    # The calendar is worked out per month and repeated for each day of it;
+    # date arithmetic on every day would cost more than the simulation.
+    months = np.datetime64(f"{scenario.start_year}-01", "M") + np.arange(scenario.total_months + 1)
+    first_days = months.astype("datetime64[D]").astype(np.int64)
+    month_days = np.diff(first_days)
+    years = months[:-1].astype("datetime64[Y]")
+    year_days = ((years + 1).astype("datetime64[D]") - years.astype("datetime64[D]")).astype(float)
+    day_rate = np.repeat(annual_rates(scenario, schedules) / 100 / year_days, month_days)
+
+    # Each pay is taken at the salary and threshold of the month it falls in.
+    per_pay = regular_payments(schedules.salary, scenario.plan, schedules.threshold,
+                               periods=PAY_FREQUENCIES[frequency])
+    first_day = months[0].astype("datetime64[D]")
+    paid_on = pay_days(first_day, month_days, frequency)
+    regular = np.zeros(len(day_rate))
+    regular[paid_on] = per_pay[np.searchsorted(first_days[1:] - first_days[0], paid_on, side="right")]
+    extra = np.zeros(len(day_rate))
+    extra[first_days[:-1] - first_days[0]] = schedules.extra
+    return DaySchedules(first_day, month_days, day_rate, regular, extra)
+
+
+def simulate_high_resolution(scenario: Scenario, frequency: str = "weekly",
+                             dtype=np.float64) -> Tuple[SimulationResult, Optional[datetime.date]]:
+    """Simulate ``scenario`` day by day with ``frequency`` pay days.  Returns
+    the monthly result (see :func:`engine.result_from_columns` for
+    ``dtype``) and the date the loan is repaid, or None."""
+    with timing.span("build_schedules"):
+        schedules = build_schedules(scenario)
+        days = day_schedules(scenario, schedules, frequency)
+    with timing.span("daily_loop"):
+        out = np.zeros((kernels.N_COLUMNS, scenario.total_months))
+        _, payoff_month, payoff_day = kernels.daily_recurrence(
+            scenario.starting_loan, days.month_days, days.day_rate, days.regular, days.extra, out,
+        )
+    payoff_date = (days.first_day + payoff_day - 1).astype(object) if payoff_day else None
+    return result_from_columns(scenario, schedules, out, payoff_month, dtype), payoff_date
+
+
+def summarize_high_resolution(scenarios: Sequence[Scenario], frequency: str = "weekly",
+                              balances: bool = False) -> Dict[str, np.ndarray]:
+    """Payoff month (-1 if not repaid), total repaid, interest paid and
+    written-off balance of each scenario (and, with ``balances``, the
+    monthly balances and total paid), as :func:`engine.summarize_scenarios`
+    returns them, simulated day by day."""
+    n = len(scenarios)
+    total_months = max((scenario.total_months for scenario in scenarios), default=0)
+    summaries = {
+        "payoff_month": np.full(n, -1, dtype=np.int32),
+        "total_repaid": np.zeros(n),
+        "interest_paid": np.zeros(n),
+        "written_off": np.zeros(n),
+    }
+    if balances:
+        summaries["balances"] = np.empty((total_months, n))
+        summaries["cumulative_paid"] = np.empty((total_months, n))
+    for j, scenario in enumerate(scenarios):
+        days = day_schedules(scenario, build_schedules(scenario), frequency)
+        out = np.empty((kernels.N_COLUMNS, scenario.total_months))
+        simulated, payoff_month, _ = kernels.daily_recurrence(
+            scenario.starting_loan, days.month_days, days.day_rate, days.regular, days.extra, out,
+        )
+        summaries["payoff_month"][j] = payoff_month or -1
+        summaries["total_repaid"][j] = out[kernels.CUMULATIVE, simulated - 1]
+        summaries["interest_paid"][j] = np.cumsum(out[kernels.INTEREST, :simulated])[-1]
+        summaries["written_off"][j] = max(out[kernels.BALANCE, simulated - 1], 0.0)
+        if balances:
+            # Flat after payoff, and after the scenario's horizon.
+            for name, row in (("balances", kernels.BALANCE), ("cumulative_paid", kernels.CUMULATIVE)):
+                summaries[name][:simulated, j] = out[row, :simulated]
+                summaries[name][simulated:, j] = out[row, simulated - 1]
+    return summaries
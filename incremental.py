@@ -0,0 +1,100 @@
+"""Incremental re-simulation of a scenario after a small edit.
+
+Editing a late salary or extra repayment row leaves every month before it
+unchanged, so there is no need to rerun the whole horizon.  A
+:class:`RunState` keeps the monthly inputs and kernel output of the last
+run; the kernel output already holds the balance and cumulative paid at the
+end of every month, so each month is a checkpoint.  The next run compares
+its inputs with the stored ones, copies every month before the first
+difference and resumes the balance recurrence from there.  The result is
+identical to a full :func:`engine.simulate_repayment`.
+"""
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+
+import kernels
+import timing
+from engine import (
+    Scenario,
+    SimulationResult,
+    build_schedules,
+    monthly_rates,
+    regular_payments,
+    result_from_columns,
+)
+
+
+@dataclass
+class RunState:
+    # Inputs and kernel output of one run, kept to resume the next one from.
+    starting_loan: float
+    regular: np.ndarray
+    extra: np.ndarray
+    rate: np.ndarray
+    out: np.ndarray  # (kernels.N_COLUMNS, months), as filled by kernels.recurrence
+    simulated: int  # months the kernel ran for
+    loan_repaid_month: Optional[int]
+    resumed_month: int  # months copied from the previous run rather than simulated
+
+
+def first_changed_month(previous: RunState, starting_loan: float, regular: np.ndarray,
+                        extra: np.ndarray, rate: np.ndarray) -> int:
+    """0-based index of the first month whose inputs differ from ``previous``
+    (the shorter horizon's length if none do)."""
+    if starting_loan != previous.starting_loan:
+        return 0
+    n = min(len(regular), len(previous.regular))
+    changed = (
+        (regular[:n] != previous.regular[:n])
+        | (extra[:n] != previous.extra[:n])
+        | (rate[:n] != previous.rate[:n])
+    )
+    return int(np.argmax(changed)) if changed.any() else n
+
+
+def simulate_incremental(scenario: Scenario, previous: Optional[RunState] = None,
+                         dtype=np.float64) -> Tuple[SimulationResult, RunState]:
+    """Simulate ``scenario``, reusing the months of ``previous`` that its
+    inputs do not affect.  Returns the result (see
+    :func:`engine.result_from_columns` for ``dtype``) and the state for the
+    next run."""
+    with timing.span("build_schedules"):
+        schedules = build_schedules(scenario)
+    regular = regular_payments(schedules.salary, scenario.plan, schedules.threshold)
+    extra = schedules.extra
+    rate = monthly_rates(schedules.interest)
+    out = np.zeros((kernels.N_COLUMNS, scenario.total_months))
+
+    start = 0
+    if previous is not None:
+        start = first_changed_month(previous, scenario.starting_loan, regular, extra, rate)
+        # A loan repaid before the first change is repaid the same way again.
+        if previous.loan_repaid_month is not None and start >= previous.simulated:
+            start = previous.simulated
+        out[:, :start] = previous.out[:, :start]
+
+    if previous is not None and previous.loan_repaid_month is not None and start == previous.simulated:
+        simulated, loan_repaid_month = start, previous.loan_repaid_month
+    else:
+        balance = out[kernels.BALANCE, start - 1] if start else scenario.starting_loan
+        cumulative_paid = out[kernels.CUMULATIVE, start - 1] if start else 0.0
+        with timing.span("monthly_loop"):
+            simulated, payoff = kernels.recurrence(
+                balance, regular[start:], extra[start:], rate[start:], out[:, start:], cumulative_paid,
+            )
+        simulated += start
+        loan_repaid_month = start + payoff if payoff else None
+
+    state = RunState(
+        starting_loan=scenario.starting_loan,
+        regular=regular,
+        extra=extra,
+        rate=rate,
+        out=out,  # shared with a float64 result; neither modifies it
+        simulated=simulated,
+        loan_repaid_month=loan_repaid_month,
+        resumed_month=start,
+    )
+    return result_from_columns(scenario, schedules, out, loan_repaid_month, dtype), state
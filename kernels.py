@@ -0,0 +1,375 @@
+"""Kernels for the monthly balance recurrence.
+
+Each month interest is accrued first and then the regular and extra
+payments are taken, capped by the outstanding balance.  Because every month
+depends on the previous balance this cannot be expressed as a plain array
+expression, so it lives here behind a small backend switch:
+
+``"numba"``
+    Compiled with Numba.  Used automatically when Numba is installed.
+``"python"``
+    Pure Python for a single path and NumPy-vectorized across paths for
+    batches.  Always available.
+
+The backend is chosen with :func:`set_backend` or the ``LOAN_KERNEL_BACKEND``
+environment variable (``auto``, ``numba`` or ``python``), and
+:func:`active_backend` reports the one in use.  Both backends perform the
+same floating-point operations in the same order, so their results are
+identical.
+
+:func:`daily_recurrence` is the high-resolution counterpart of
+:func:`recurrence`: interest accrues daily and is added to the balance at
+the end of each month, and payments are taken on their own days (see
+``highres.py``).
+"""
+import os
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+
+BACKENDS = ("numba", "python")
+
+# Rows of the ``out`` array filled by :func:`recurrence`.
+INTEREST, REGULAR, EXTRA, PAYMENT, BALANCE, CUMULATIVE = range(6)
+N_COLUMNS = 6
+
+
+# -------------------------
+# Loop Bodies
+# -------------------------
+# These are written for Numba (array indexing, no Python objects).  The
+# Python backend uses the faster list-based and vectorized versions below.
+def _single_loop(balance, cumulative_paid, regular, extra, rate, out):
+    n_months = regular.shape[0]
+    for month in range(n_months):
+        regular_payment = regular[month]
+        extra_payment = extra[month]
+        scheduled_payment = regular_payment + extra_payment
+
+        interest = balance * rate[month]
+        balance += interest
+
+        if scheduled_payment > balance:
+            if regular_payment >= balance:
+                regular_payment = balance
+                extra_payment = 0.0
+            else:
+                extra_payment = balance - regular_payment
+            scheduled_payment = balance
+
+        balance -= scheduled_payment
+        cumulative_paid += scheduled_payment
+
+        out[0, month] = interest
+        out[1, month] = regular_payment
+        out[2, month] = extra_payment
+        out[3, month] = scheduled_payment
+        out[4, month] = balance
+        out[5, month] = cumulative_paid
+        if balance <= 0:
+            return month + 1, month + 1
+    return n_months, 0
+
+
+def _batch_loop(balance, total_paid, interest_paid, payoff_month, first_month,
+                regular, extra, rate, balances_out, record, paid_out, record_paid):
+    n_months = regular.shape[0]
+    n_paths = balance.shape[0]
+    for month in range(n_months):
+        for path in range(n_paths):
+            if payoff_month[path] < 0:
+                scheduled_payment = regular[month, path] + extra[month, path]
+                interest = balance[path] * rate[month, path]
+                b = balance[path] + interest
+                if scheduled_payment > b:
+                    scheduled_payment = b
+                b -= scheduled_payment
+                balance[path] = b
+                total_paid[path] += scheduled_payment
+                interest_paid[path] += interest
+                if b <= 0:
+                    payoff_month[path] = first_month + month + 1
+            if record:
+                balances_out[month, path] = balance[path]
+            if record_paid:
+                paid_out[month, path] = total_paid[path]
+
+
+def _daily_loop(balance, cumulative_paid, month_days, day_rate, regular, extra, out):
+    day = 0
+    accrued = 0.0  # interest accrued since the end of the last month
+    for month in range(len(month_days)):
+        interest = 0.0
+        regular_paid = 0.0
+        extra_paid = 0.0
+        repaid = False
+        for _ in range(month_days[month]):
+            daily_interest = balance * day_rate[day]
+            accrued += daily_interest
+            interest += daily_interest
+
+            regular_payment = regular[day]
+            extra_payment = extra[day]
+            scheduled_payment = regular_payment + extra_payment
+            day += 1
+            if scheduled_payment > 0:
+                owed = balance + accrued
+                if scheduled_payment >= owed:
+                    if regular_payment >= owed:
+                        regular_payment = owed
+                        extra_payment = 0.0
+                    else:
+                        extra_payment = owed - regular_payment
+                    scheduled_payment = owed
+                    repaid = True
+                # Payments beyond the balance settle the accrued interest.
+                balance -= scheduled_payment
+                if balance < 0:
+                    accrued += balance
+                    balance = 0.0
+                regular_paid += regular_payment
+                extra_paid += extra_payment
+                cumulative_paid += scheduled_payment
+                if repaid:
+                    accrued = 0.0
+                    balance = 0.0
+                    break
+
+        balance += accrued
+        accrued = 0.0
+        out[0, month] = interest
+        out[1, month] = regular_paid
+        out[2, month] = extra_paid
+        out[3, month] = regular_paid + extra_paid
+        out[4, month] = balance
+        out[5, month] = cumulative_paid
+        if balance <= 0:
+            return month + 1, month + 1, day
+    return len(month_days), 0, 0
+
+
+# -------------------------
+# Python Backend
+# -------------------------
+def _single_python(balance, cumulative_paid, regular, extra, rate, out):
+    regular = regular.tolist()
+    extra = extra.tolist()
+    rate = rate.tolist()
+    columns = ([], [], [], [], [], [])
+    interest_out, regular_out, extra_out, payment_out, balance_out, cumulative_out = columns
+    payoff = 0
+    for month in range(len(regular)):
+        regular_payment = regular[month]
+        extra_payment = extra[month]
+        scheduled_payment = regular_payment + extra_payment
+
+        interest = balance * rate[month]
+        balance += interest
+
+        if scheduled_payment > balance:
+            if regular_payment >= balance:
+                regular_payment = balance
+                extra_payment = 0.0
+            else:
+                extra_payment = balance - regular_payment
+            scheduled_payment = balance
+
+        balance -= scheduled_payment
+        cumulative_paid += scheduled_payment
+
+        interest_out.append(interest)
+        regular_out.append(regular_payment)
+        extra_out.append(extra_payment)
+        payment_out.append(scheduled_payment)
+        balance_out.append(balance)
+        cumulative_out.append(cumulative_paid)
+        if balance <= 0:
+            payoff = month + 1
+            break
+    simulated = len(interest_out)
+    for row, values in enumerate(columns):
+        out[row, :simulated] = values
+    return simulated, payoff
+
+
+def _batch_numpy(balance, total_paid, interest_paid, payoff_month, first_month,
+                 regular, extra, rate, balances_out, record, paid_out, record_paid):
+    active = payoff_month < 0
+    interest = np.empty_like(balance)
+    payment = np.empty_like(balance)
+    for month in range(regular.shape[0]):
+        np.multiply(balance, rate[month], out=interest)
+        interest *= active
+        balance += interest
+        np.minimum(regular[month] + extra[month], balance, out=payment)
+        payment *= active
+        balance -= payment
+        total_paid += payment
+        interest_paid += interest
+        repaid = active & (balance <= 0)
+        if repaid.any():
+            payoff_month[repaid] = first_month + month + 1
+            active &= ~repaid
+        if record:
+            balances_out[month] = balance
+        if record_paid:
+            paid_out[month] = total_paid
+
+
+def _daily_python(balance, cumulative_paid, month_days, day_rate, regular, extra, out):
+    # The numba loop body runs as-is; list indexing is what makes it faster here.
+    return _daily_loop(balance, cumulative_paid, month_days.tolist(), day_rate.tolist(),
+                       regular.tolist(), extra.tolist(), out)
+
+
+# -------------------------
+# Backend Selection
+# -------------------------
+_IMPLEMENTATIONS = {"python": (_single_python, _batch_numpy, _daily_python)}
+_backend = None
+
+
+def _load_numba():
+    if "numba" not in _IMPLEMENTATIONS:
+        import numba
+
+        _IMPLEMENTATIONS["numba"] = (
+            numba.njit(cache=True, nogil=True)(_single_loop),
+            numba.njit(cache=True, nogil=True)(_batch_loop),
+            numba.njit(cache=True, nogil=True)(_daily_loop),
+        )
+    return _IMPLEMENTATIONS["numba"]
+
+
+def available_backends() -> Tuple[str, ...]:
+    names = []
+    for name in BACKENDS:
+        try:
+            if name == "numba":
+                _load_numba()
+            names.append(name)
+        except ImportError:
+            pass
+    return tuple(names)
+
+
+def set_backend(name: str = "auto") -> str:
+    """Select ``"numba"``, ``"python"`` or ``"auto"`` (numba when installed)."""
+    global _backend
+    if name == "auto":
+        name = "numba" if "numba" in available_backends() else "python"
+    elif name == "numba":
+        try:
+            _load_numba()
+        except ImportError:
+            raise ValueError("The numba kernel backend needs the numba package installed")
+    elif name != "python":
+        raise ValueError(f"Unknown kernel backend {name!r}; expected one of {('auto',) + BACKENDS}")
+    _backend = name
+    return name
+
+
+def active_backend() -> str:
+    if _backend is None:
+        set_backend(os.environ.get("LOAN_KERNEL_BACKEND", "auto"))
+    return _backend
+
+
+def _implementation():
+    return _IMPLEMENTATIONS[active_backend()]
+
+
+# -------------------------
+# Public Kernels
+# -------------------------
+def recurrence(balance: float, regular: np.ndarray, extra: np.ndarray, rate: np.ndarray,
+               out: np.ndarray, cumulative_paid: float = 0.0) -> Tuple[int, Optional[int]]:
+    """Simulate one path until it is repaid or the schedules run out.
+
+    ``regular``, ``extra`` and ``rate`` (monthly, as a fraction) are float
+    arrays of equal length.  ``out`` is a ``(6, months)`` float array whose
+    rows (``INTEREST``, ``REGULAR``, ``EXTRA``, ``PAYMENT``, ``BALANCE``,
+    ``CUMULATIVE``) are filled for every simulated month; the cumulative
+    total carries on from ``cumulative_paid``, so a path can be resumed
+    part-way through.  Returns the number of months simulated and the
+    1-based payoff month (counted from the first given month), or None.
+    """
+    simulated, payoff = _implementation()[0](float(balance), float(cumulative_paid), regular, extra, rate, out)
+    return simulated, payoff or None
+
+
+@dataclass
+class BatchState:
+    """Per-path state carried between :func:`recurrence_batch` calls."""
+    balance: np.ndarray
+    total_paid: np.ndarray
+    interest_paid: np.ndarray
+    payoff_month: np.ndarray  # 1-based, -1 while not repaid
+    month: int = 0  # months simulated so far
+
+    @classmethod
+    def start(cls, starting_balance, n_paths: Optional[int] = None) -> "BatchState":
+        balance = np.array(starting_balance, dtype=float, ndmin=1)
+        if n_paths is not None:
+            balance = np.broadcast_to(balance, (n_paths,)).copy()
+        return cls(
+            balance=balance,
+            total_paid=np.zeros(len(balance)),
+            interest_paid=np.zeros(len(balance)),
+            payoff_month=np.full(len(balance), -1, dtype=np.int32),
+        )
+
+    @property
+    def repaid(self) -> np.ndarray:
+        return self.payoff_month > 0
+
+
+def recurrence_batch(state: BatchState, regular: np.ndarray, extra: np.ndarray, rate: np.ndarray,
+                     balances_out: Optional[np.ndarray] = None,
+                     paid_out: Optional[np.ndarray] = None) -> BatchState:
+    """Advance every path in ``state`` by ``len(regular)`` months, in place.
+
+    Inputs are month-major: ``regular``, ``extra`` and ``rate`` broadcast to
+    ``(months, paths)``, so a schedule shared by all paths can be passed as a
+    ``(months, 1)`` column.  If given, ``balances_out`` (``(months, paths)``,
+    any float dtype) receives the balance at the end of each month, and
+    ``paid_out`` (likewise) the total paid so far.
+    """
+    n_paths = len(state.balance)
+    regular, extra, rate = (
+        np.broadcast_to(np.asarray(values, dtype=float), (len(regular), n_paths))
+        for values in (regular, extra, rate)
+    )
+    record = balances_out is not None
+    if not record:
+        balances_out = np.empty((0, 0))
+    record_paid = paid_out is not None
+    if not record_paid:
+        paid_out = np.empty((0, 0))
+    _implementation()[1](
+        state.balance, state.total_paid, state.interest_paid, state.payoff_month, state.month,
+        regular, extra, rate, balances_out, record, paid_out, record_paid,
+    )
+    state.month += len(regular)
+    return state
+
+
+def daily_recurrence(balance: float, month_days: np.ndarray, day_rate: np.ndarray, regular: np.ndarray,
+                     extra: np.ndarray, out: np.ndarray,
+                     cumulative_paid: float = 0.0) -> Tuple[int, Optional[int], Optional[int]]:
+    """Simulate one path day by day until it is repaid or the days run out.
+
+    ``month_days`` (integers) gives the length of each month; ``day_rate``
+    (the daily interest rate, as a fraction), ``regular`` and ``extra`` (the
+    payments taken that day, 0 on other days) are float arrays with one
+    value per day, ``month_days.sum()`` long.  Interest accrues daily on the
+    balance and is added to it at the end of each month.  ``out`` is filled
+    month by month as by :func:`recurrence`, with each month's totals.
+    Returns the number of months simulated, the 1-based payoff month and
+    the 1-based payoff day, or None for both if not repaid.
+    """
+    simulated, payoff_month, payoff_day = _implementation()[2](
+        float(balance), float(cumulative_paid), month_days, day_rate, regular, extra, out,
+    )
+    return simulated, payoff_month or None, payoff_day or None
@@ -0,0 +1,251 @@
+"""Monte Carlo repayment simulation over stochastic inflation and salary paths.
+
+The deterministic salary and inflation timelines of a :class:`Scenario` are
+used as the central path.  Each simulated path adds an AR(1) deviation to
+the annual inflation (RPI) rate and multiplies the salary timeline by a
+lognormal pay-growth factor.  Under plans whose thresholds rise with the
+RPI each April, each path raises them by its own RPI, so a path of high
+inflation also has higher thresholds: every path is simulated as the
+engine would simulate its own inflation and salary timeline.  The interest
+floor applies to the interest rate only, not to the RPI used for uprating.
+All paths are simulated together by the batched balance kernel (see
+:mod:`kernels`), a year of months at a time, so no Python-level loop over
+paths is needed.
+
+:func:`simulate_monte_carlo` keeps every path's monthly balance to work out
+exact percentile bands, which is fine for the page's path counts.  For runs
+of millions of paths, :func:`stream_monte_carlo` simulates the paths a chunk
+at a time, optionally in several processes, and keeps only the mergeable
+per-month sketches of :mod:`streaming`.
+"""
+import dataclasses
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+import kernels
+from engine import Scenario, Schedules, build_schedules, month_start_dates, plan_interest
+from streaming import DEFAULT_RELATIVE_ACCURACY, MonthlyAggregate
+
+DEFAULT_CHUNK_PATHS = 10_000
+
+
+@dataclass(frozen=True)
+class MonteCarloConfig:
+    n_paths: int = 10_000
+    seed: Optional[int] = None
+    inflation_persistence: float = 0.6  # AR(1) coefficient of the yearly deviation
+    inflation_volatility: float = 1.0  # yearly innovation, percentage points
+    inflation_floor: float = 0.0  # interest never goes below this annual rate (%)
+    salary_drift: float = 0.0  # yearly log pay growth on top of the timeline
+    salary_volatility: float = 0.05  # yearly log pay growth standard deviation
+    percentiles: Tuple[float, ...] = (5, 25, 50, 75, 95)
+
+
+@dataclass
+class MonteCarloResult:
+    n_paths: int
+    payoff_month: np.ndarray  # 1-based month each path was repaid in, -1 if not
+    total_repaid: np.ndarray
+    interest_paid: np.ndarray
+    written_off: np.ndarray  # balance left at the end of the horizon
+    balance_bands: pd.DataFrame  # Loan Balance percentiles by month, indexed by Date
+
+    @property
+    def payoff_probability(self) -> float:
+        return float(np.mean(self.payoff_month > 0))
+
+    def distribution(self, percentiles=(5, 25, 50, 75, 95)) -> pd.DataFrame:
+        columns = {
+            "Total Repaid": self.total_repaid,
+            "Interest Paid": self.interest_paid,
+            "Written Off": self.written_off,
+        }
+        rows = {f"P{q:g}": [np.percentile(v, q) for v in columns.values()] for q in percentiles}
+        rows["Mean"] = [v.mean() for v in columns.values()]
+        return pd.DataFrame(rows, index=list(columns)).T
+
+
+# -------------------------
+# Stochastic Paths
+# -------------------------
+# Both generators return year-major (years x paths) arrays so that one year of
+# every path is a contiguous row.
+def inflation_deviations(rng: np.random.Generator, config: MonteCarloConfig, n_years: int) -> np.ndarray:
+    # AR(1) deviation from the inflation timeline, one value per year and path.
+    deviations = rng.standard_normal((n_years, config.n_paths)) * config.inflation_volatility
+    for year in range(1, n_years):
+        deviations[year] += config.inflation_persistence * deviations[year - 1]
+    return deviations
+
+
+def salary_factors(rng: np.random.Generator, config: MonteCarloConfig, n_years: int) -> np.ndarray:
+    # Lognormal pay growth relative to the salary timeline; the first year is
+    # taken as known.  The -sigma^2/2 term keeps the mean factor at exp(drift * t).
+    growth = rng.standard_normal((n_years, config.n_paths)) * config.salary_volatility
+    growth += config.salary_drift - 0.5 * config.salary_volatility ** 2
+    growth[0] = 0.0
+    return np.exp(np.cumsum(growth, axis=0))
+
+
+def uprating_factors(scenario: Scenario, schedules: Schedules, deviations: np.ndarray) -> np.ndarray:
+    # Under plans that raise their thresholds with the RPI each April, each
+    # path's uprating relative to the central one, by tax year index (row k
+    # for the tax year starting in April of year k - 1).  As in
+    # engine.plan_thresholds, the Aprils before the horizon are uprated at
+    # the path's first-year rate and the later ones at the rate of their year.
+    n_years, n_paths = deviations.shape
+    factors = np.ones((n_years + 1, n_paths))
+    plan = scenario.plan
+    if not plan.uprate_with_rpi or not scenario.total_months:
+        return factors
+    last_change = plan.threshold_schedule[-1][0] if plan.threshold_schedule else scenario.start_year - 1
+    first = schedules.inflation[0]
+    factors[0] = ((1 + (first + deviations[0]) / 100) / (1 + first / 100)) ** max(scenario.start_year - 1 - last_change, 0)
+    central = schedules.inflation[3::12, None]
+    ratio = (1 + (central + deviations[:len(central)]) / 100) / (1 + central / 100)
+    ratio[scenario.start_year + np.arange(len(central)) <= last_change] = 1.0
+    factors[1:len(central) + 1] = factors[0] * np.cumprod(ratio, axis=0)
+    return factors
+
+
+def sorted_percentiles(rows: np.ndarray, percentiles) -> np.ndarray:
+    # Linearly interpolated percentiles (numpy's default method) of rows that
+    # are already sorted along the last axis.
+    positions = np.asarray(percentiles, dtype=float) / 100 * (rows.shape[-1] - 1)
+    lower = np.floor(positions).astype(int)
+    upper = np.minimum(lower + 1, rows.shape[-1] - 1)
+    weight = positions - lower
+    low = rows[..., lower].astype(float)
+    high = rows[..., upper].astype(float)
+    return np.moveaxis(low + (high - low) * weight, -1, 0)
+
+
+# -------------------------
+# Batched Simulation
+# -------------------------
+def _simulate_paths(scenario: Scenario, schedules: Schedules, config: MonteCarloConfig, rng: np.random.Generator,
+                    balances: Optional[np.ndarray] = None,
+                    aggregate: Optional[MonthlyAggregate] = None) -> kernels.BatchState:
+    # Simulates config.n_paths paths, recording each month's balances into
+    # the (months x paths) ``balances`` and adding each year of them to
+    # ``aggregate``, if given.
+    total_months = scenario.total_months
+    n_years = -(-total_months // 12)
+    plan = scenario.plan
+    deviations = inflation_deviations(rng, config, n_years)
+    factors = salary_factors(rng, config, n_years)
+    uprating = uprating_factors(scenario, schedules, deviations)
+    state = kernels.BatchState.start(scenario.starting_loan, config.n_paths)
+    if aggregate is not None:
+        year_balances = np.empty((12, config.n_paths))
+        year_paid = np.empty((12, config.n_paths))
+
+    for year in range(n_years):
+        months = slice(year * 12, min((year + 1) * 12, total_months))
+        # Everything that does not depend on the balance is computed for the
+        # whole year at once as a (12 x paths) block.
+        salary = schedules.salary[months, None] * factors[year]
+        threshold = schedules.threshold[months, None]
+        path_uprating = schedules.uprating[months, None]
+        if plan.uprate_with_rpi:
+            # January to March are still in the tax year before this April's uprating.
+            tax_year = year + (np.arange(months.start, months.stop) % 12 >= 3)
+            threshold = threshold * uprating[tax_year]
+            path_uprating = path_uprating * uprating[tax_year]
+        # Regular monthly payment: the plan's share of salary above the threshold.
+        regular = np.maximum(salary - threshold, 0.0)
+        regular *= plan.repayment_rate / 12
+        rate = schedules.inflation[months, None] + deviations[year]
+        np.maximum(rate, config.inflation_floor, out=rate)
+        rate = plan_interest(rate, salary, plan, path_uprating)
+        rate /= 1200
+        if aggregate is None:
+            kernels.recurrence_batch(state, regular, schedules.extra[months, None], rate,
+                                     None if balances is None else balances[months])
+        else:
+            n_months = months.stop - months.start
+            paid_before = state.total_paid.copy()
+            kernels.recurrence_batch(state, regular, schedules.extra[months, None], rate,
+                                     year_balances[:n_months], year_paid[:n_months])
+            aggregate.update(year_balances[:n_months], year_paid[:n_months], months.start, paid_before)
+    if aggregate is not None:
+        aggregate.add_payoffs(state.payoff_month)
+    return state
+
+
+def simulate_monte_carlo(scenario: Scenario, config: MonteCarloConfig) -> MonteCarloResult:
+    total_months = scenario.total_months
+    rng = np.random.default_rng(config.seed)
+    # Month-major so each month's balances are one contiguous row.
+    balances = np.empty((total_months, config.n_paths), dtype=np.float32)
+    state = _simulate_paths(scenario, build_schedules(scenario), config, rng, balances)
+
+    # Sorting every month in place is several times faster than np.percentile's
+    # partition for this shape (float32 sorts are SIMD-accelerated).
+    balances.sort(axis=1)
+    bands = sorted_percentiles(balances, config.percentiles)
+    balance_bands = pd.DataFrame(
+        {f"P{q:g}": band for q, band in zip(config.percentiles, bands)},
+        index=month_start_dates(scenario.start_year, total_months),
+    )
+    balance_bands.index.name = "Date"
+
+    return MonteCarloResult(
+        n_paths=config.n_paths,
+        payoff_month=state.payoff_month,
+        total_repaid=state.total_paid,
+        interest_paid=state.interest_paid,
+        written_off=np.maximum(state.balance, 0.0),
+        balance_bands=balance_bands,
+    )
+
+
+# -------------------------
+# Streaming Aggregation
+# -------------------------
+def aggregate_monte_carlo_chunks(scenario: Scenario, chunks: Sequence[Tuple[MonteCarloConfig, np.random.SeedSequence]],
+                                 relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY) -> MonthlyAggregate:
+    """Simulate each chunk of ``config.n_paths`` paths drawn from its
+    ``seed`` in turn, adding them to one aggregate a year at a time."""
+    aggregate = MonthlyAggregate.empty(scenario.total_months, relative_accuracy)
+    schedules = build_schedules(scenario)
+    for config, seed in chunks:
+        _simulate_paths(scenario, schedules, config, np.random.default_rng(seed), aggregate=aggregate)
+    return aggregate
+
+
+def stream_monte_carlo(scenario: Scenario, config: MonteCarloConfig, chunk_paths: int = DEFAULT_CHUNK_PATHS,
+                       workers: int = 1,
+                       relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY) -> MonthlyAggregate:
+    """Per-month percentile sketches and payoff counts of ``config.n_paths``
+    paths, simulated ``chunk_paths`` at a time (see :mod:`streaming`).
+
+    Memory does not grow with ``config.n_paths``: each year of a chunk is
+    aggregated and dropped.  With several ``workers``, each process takes
+    every ``workers``-th chunk into a single aggregate of its own, and the
+    parent merges one aggregate per worker.  Chunk ``k`` draws from the
+    ``k``-th stream spawned from ``config.seed``, so the result does not
+    depend on ``workers``, though its paths are not those of
+    :func:`simulate_monte_carlo` with the same seed.
+    """
+    if chunk_paths < 1:
+        raise ValueError("Each chunk needs at least one path")
+    sizes = [min(chunk_paths, config.n_paths - start) for start in range(0, config.n_paths, chunk_paths)]
+    seeds = np.random.SeedSequence(config.seed).spawn(len(sizes))
+    chunks = [(dataclasses.replace(config, n_paths=size), seed) for size, seed in zip(sizes, seeds)]
+    workers = min(workers, len(chunks))
+    if workers <= 1:
+        return aggregate_monte_carlo_chunks(scenario, chunks, relative_accuracy)
+    aggregate = MonthlyAggregate.empty(scenario.total_months, relative_accuracy)
+    with ProcessPoolExecutor(max_workers=workers, initializer=kernels.set_backend,
+                             initargs=(kernels.active_backend(),)) as pool:
+        pending = {pool.submit(aggregate_monte_carlo_chunks, scenario, chunks[worker::workers], relative_accuracy)
+                   for worker in range(workers)}
+        # Merging is addition, so the order the workers finish in does not matter.
+        for future in as_completed(pending):
+            aggregate.merge(future.result())
+    return aggregate
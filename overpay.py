@@ -0,0 +1,149 @@
+"""Overpay or invest: the overpayment schedule with the lowest present cost.
+
+Money that is not overpaid is invested at ``annual_return``, so a repayment
+made in month ``t`` costs its present value at that return, and the best
+schedule is the one whose repayments (regular and extra) have the lowest
+total present value.  Whatever is left at the write-off costs nothing.
+Each month's overpayment is between 0 and ``budget``, in ``action_steps``
+equal steps.
+
+The optimum is found by dynamic programming backwards from the write-off,
+over a grid of ``grid_points`` balances from 0 to the largest balance the
+loan can reach::
+
+    V_t(b) = min over e of  paid_t(b, e) + V_t+1(b') / (1 + i)
+
+where ``b'`` is the balance after month ``t``'s interest and payments and
+``i`` the monthly return.  Each month is one array expression over every
+(balance, overpayment) pair, with ``V_t+1`` interpolated linearly between
+grid points.  The schedule is then read off forwards from the actual
+starting balance, choosing each month's overpayment against the exact
+balance rather than the nearest grid point, and its cost is worked out
+again by the balance kernel.
+
+The scenario's own extra repayment rows are ignored: the schedule found
+replaces them.
+"""
+import dataclasses
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+import kernels
+from engine import Scenario, build_schedules, monthly_rates, regular_payments
+
+DEFAULT_GRID_POINTS = 4001
+DEFAULT_ACTION_STEPS = 41
+# Costs closer than this (in pounds) are a tie, settled by overpaying less.
+TIE_TOLERANCE = 0.005
+
+
+@dataclass(frozen=True)
+class OverpayResult:
+    extra: np.ndarray  # overpayment each month; 0 after the loan is repaid
+    present_cost: float  # present value of every repayment, with ``extra``
+    no_overpayment_cost: float  # ... never overpaying
+    full_budget_cost: float  # ... overpaying the whole budget every month
+    payoff_month: Optional[int]  # 1-based, with ``extra``; None if written off
+
+    def rows(self) -> List[dict]:
+        """``extra`` as extra repayment rows: one per run of equal overpayments."""
+        return schedule_rows(self.extra)
+
+
+def schedule_rows(extra: np.ndarray) -> List[dict]:
+    """Extra repayment rows (the page's keys) giving the monthly ``extra``."""
+    starts = np.flatnonzero(np.r_[True, extra[1:] != extra[:-1]])
+    ends = np.r_[starts[1:], len(extra)]
+    return [
+        {"extra_payment": float(extra[start]), "start_month": int(start) + 1, "duration_months": int(end - start)}
+        for start, end in zip(starts.tolist(), ends.tolist()) if extra[start] > 0
+    ]
+
+
+def _interpolate(balance: np.ndarray, step: float, value: np.ndarray) -> np.ndarray:
+    # ``value`` at ``balance`` on the uniform grid 0, step, 2 step, ...;
+    # linear, and extrapolated from the last two points above the grid.
+    position = balance / step
+    index = np.minimum(position.astype(np.int64), len(value) - 2)
+    weight = position - index
+    return value[index] + weight * (value[index + 1] - value[index])
+
+
+def _present_cost(starting_loan: float, regular: np.ndarray, extra: np.ndarray, rate: np.ndarray,
+                  discount: float):
+    out = np.zeros((kernels.N_COLUMNS, len(regular)))
+    simulated, payoff = kernels.recurrence(starting_loan, regular, extra, rate, out)
+    payments = out[kernels.PAYMENT, :simulated]
+    return float(payments @ discount ** np.arange(simulated)), payoff
+
+
+def optimize_overpayments(scenario: Scenario, budget: float, annual_return: float,
+                          grid_points: int = DEFAULT_GRID_POINTS,
+                          action_steps: int = DEFAULT_ACTION_STEPS) -> OverpayResult:
+    """The monthly overpayments, each up to ``budget``, that minimize the
+    present value of the repayments when money is otherwise invested at
+    ``annual_return`` percent a year."""
+    if budget < 0:
+        raise ValueError("The overpayment budget cannot be negative")
+    if grid_points < 2 or action_steps < 1:
+        raise ValueError("The optimizer needs at least 2 grid points and 1 action step")
+    schedules = build_schedules(dataclasses.replace(scenario, extra_segments=()))
+    regular = regular_payments(schedules.salary, scenario.plan, schedules.threshold)
+    rate = monthly_rates(schedules.interest)
+    discount = 1 / (1 + annual_return / 100 / 12)
+    n_months = scenario.total_months
+    actions = np.round(np.linspace(0.0, budget, action_steps if budget > 0 else 1), 2)
+
+    # No payment can raise the balance, so the balance with nothing repaid
+    # bounds the balances reachable by each month.
+    reachable = scenario.starting_loan * np.r_[1.0, np.cumprod(1 + np.maximum(rate, 0.0))]
+    grid = np.linspace(0.0, max(reachable.max(), 1.0), grid_points)
+    step = grid[1]
+    rows = np.minimum(np.ceil(reachable / step).astype(np.int64) + 2, grid_points)
+
+    # Backward pass: values[t] is V_t on the grid; V at the write-off is 0.
+    # With b' = grown - paid, the cost is grown + (V_t+1(b') / (1 + i) - b'),
+    # and the bracket is linear interpolation of its values at the grid
+    # points, so each month needs one interpolation over (balance, action).
+    # Only the balances reachable by each month are evaluated; the rest of
+    # ``values`` is never looked up.
+    values = np.zeros((n_months + 1, grid_points))
+    points = np.arange(grid_points, dtype=float)
+    action_points = actions / step
+    buffer = np.empty((grid_points, len(actions)))
+    for month in range(n_months - 1, -1, -1):
+        n = rows[month]
+        grown = grid[:n] * (1 + rate[month])
+        position = buffer[:n]  # b' in grid steps
+        np.subtract(((grown - regular[month]) / step)[:, None], action_points, out=position)
+        np.maximum(position, 0.0, out=position)
+        net = np.interp(position, points[:rows[month + 1]],
+                        discount * values[month + 1, :rows[month + 1]] - step * points[:rows[month + 1]])
+        values[month, :n] = grown + net.min(axis=1)
+
+    # Forward pass from the actual balance.
+    extra = np.zeros(n_months)
+    balance = float(scenario.starting_loan)
+    for month in range(n_months):
+        grown = balance * (1 + rate[month])
+        paid_now = np.minimum(regular[month] + actions, grown)
+        cost = paid_now + discount * _interpolate(grown - paid_now, step, values[month + 1])
+        choice = int(np.flatnonzero(cost <= cost.min() + TIE_TOLERANCE)[0])
+        extra[month] = actions[choice]
+        balance = grown - paid_now[choice]
+        if balance <= 0:
+            break
+
+    present_cost, payoff = _present_cost(scenario.starting_loan, regular, extra, rate, discount)
+    no_overpayment_cost, _ = _present_cost(scenario.starting_loan, regular, np.zeros(n_months), rate, discount)
+    full_budget_cost, _ = _present_cost(scenario.starting_loan, regular, np.full(n_months, float(budget)), rate,
+                                        discount)
+    return OverpayResult(
+        extra=extra,
+        present_cost=present_cost,
+        no_overpayment_cost=no_overpayment_cost,
+        full_budget_cost=full_budget_cost,
+        payoff_month=payoff,
+    )
@@ -0,0 +1,123 @@
+"""UK repayment plans, and a side-by-side comparison of them.
+
+Each :class:`Plan` in :data:`PLANS` gives the engine's
+:class:`~engine.PlanConstants` (threshold schedule, repayment rate and
+income-dependent interest margin) and the term after which the balance is
+written off.  With a plan, the inflation timeline is read as RPI and the
+plan adds its own margin on top.  Thresholds are listed up to the 2025/26
+tax year and raised with the RPI every April after that (the Postgraduate
+threshold is frozen).
+
+Simplifications: interest while studying is not modelled (the starting
+loan is taken as given), and Plan 1 and Plan 4 interest, the lower of RPI
+and the Bank of England base rate plus 1%, is taken as RPI.
+
+:func:`compare_plans` simulates one scenario under every plan in a single
+pass of the batched kernel.
+"""
+from dataclasses import dataclass, replace
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+import timing
+from engine import PlanConstants, Scenario, month_start_dates, summarize_scenarios
+
+
+@dataclass(frozen=True)
+class Plan:
+    name: str
+    constants: PlanConstants
+    write_off_years: int  # after the first repayment year starts
+    description: str
+
+
+PLANS: Dict[str, Plan] = {
+    "plan_1": Plan(
+        name="Plan 1",
+        constants=PlanConstants(
+            repayment_threshold=19895,
+            threshold_schedule=((2022, 20195), (2023, 22015), (2024, 24990), (2025, 26065)),
+            uprate_with_rpi=True,
+            rate_change_month=9,  # pre-2012 loans change rate each September
+        ),
+        write_off_years=25,
+        description="England and Wales before September 2012, Northern Ireland. Interest at RPI.",
+    ),
+    "plan_2": Plan(
+        name="Plan 2",
+        constants=PlanConstants(
+            repayment_threshold=27295,
+            threshold_schedule=((2025, 28470),),
+            uprate_with_rpi=True,
+            # RPI up to the threshold, sliding to RPI + 3% at the upper income threshold.
+            interest_tiers=((28470, 0.0), (52885, 3.0)),
+        ),
+        write_off_years=30,
+        description="England and Wales, September 2012 to July 2023. Interest from RPI to RPI + 3% with income.",
+    ),
+    "plan_4": Plan(
+        name="Plan 4",
+        constants=PlanConstants(
+            repayment_threshold=25375,
+            threshold_schedule=((2023, 27660), (2024, 31395), (2025, 32745)),
+            uprate_with_rpi=True,
+        ),
+        write_off_years=30,
+        description="Scotland. Interest at RPI.",
+    ),
+    "plan_5": Plan(
+        name="Plan 5",
+        constants=PlanConstants(repayment_threshold=25000, threshold_schedule=((2026, 25000),), uprate_with_rpi=True),
+        write_off_years=40,
+        description="England, courses starting from August 2023. Interest at RPI.",
+    ),
+    "postgraduate": Plan(
+        name="Postgraduate",
+        constants=PlanConstants(repayment_threshold=21000, repayment_rate=0.06, interest_tiers=((0, 3.0),)),
+        write_off_years=30,
+        description="Master's and doctoral loans. 6% above the threshold; interest at RPI + 3%.",
+    ),
+}
+
+
+def plan_scenario(scenario: Scenario, plan: Plan) -> Scenario:
+    """``scenario`` repaid under ``plan``, over the plan's write-off term."""
+    return replace(scenario, plan=plan.constants, total_years=plan.write_off_years)
+
+
+# -------------------------
+# Side-by-Side Comparison
+# -------------------------
+@dataclass
+class PlanComparison:
+    summary: pd.DataFrame  # one row per plan, indexed by plan name
+    balances: pd.DataFrame  # month-end balance per plan (0 once repaid or written off), indexed by Date
+
+
+def compare_plans(scenario: Scenario, plans: Optional[Sequence[Plan]] = None) -> PlanComparison:
+    """Simulate ``scenario`` under each of ``plans`` (default: all of
+    :data:`PLANS`) together, in one batched kernel pass."""
+    plans = list(PLANS.values()) if plans is None else list(plans)
+    scenarios = [plan_scenario(scenario, plan) for plan in plans]
+    with timing.span("compare_plans"):
+        summaries = summarize_scenarios(scenarios, balances=True)
+
+    balances = summaries["balances"]
+    for j, planned in enumerate(scenarios):
+        balances[planned.total_months:, j] = 0.0  # written off
+    names = [plan.name for plan in plans]
+    balance_frame = pd.DataFrame(balances, columns=names, index=month_start_dates(scenario.start_year, len(balances)))
+    balance_frame.index.name = "Date"
+
+    payoff = summaries["payoff_month"]
+    summary = pd.DataFrame({
+        "Repayment Rate": [plan.constants.repayment_rate for plan in plans],
+        "Write-Off (Years)": [plan.write_off_years for plan in plans],
+        "Years to Repay": np.where(payoff > 0, payoff / 12, np.nan),
+        "Total Repaid": summaries["total_repaid"],
+        "Interest Paid": summaries["interest_paid"],
+        "Written Off": summaries["written_off"],
+    }, index=pd.Index(names, name="Plan"))
+    return PlanComparison(summary=summary, balances=balance_frame)
@@ -0,0 +1,123 @@
+"""Scenarios in the JSON request format shared by the API and the store.
+
+A request object uses the page's row structure::
+
+    {
+        "tuition": 9535, "maintenance": 6647, "study_years": 4,
+        "salary_rows": [{"salary": 30000, "years": 5}, {"salary": 50000, "years": 0}],
+        "inflation_rows": [{"inflation": 4.3, "years": 0}],
+        "extra_repayment_rows": [{"extra_payment": 100, "start_month": 1, "duration_months": 12}]
+    }
+
+``starting_loan`` may be given instead of ``tuition`` and ``maintenance``;
+``study_years`` is then optional and only sets the default ``start_year``
+(0 years if absent, i.e. repayment from next January).  ``start_year``
+(default: as on the page), ``plan`` (a key of :data:`plans.PLANS`; default:
+the page's custom plan) and ``total_years`` (default: the plan's write-off
+term, or 40) are optional.  Every number must be finite: NaN and infinite
+values (which Python's JSON parser accepts) are rejected.
+
+Nothing here serves HTTP, so the scenario store (``store.py``) can read
+and summarize requests without importing ``api.py``.
+"""
+from dataclasses import replace
+from typing import List
+
+import numpy as np
+
+from engine import (
+    TOTAL_YEARS,
+    InputError,
+    Scenario,
+    default_start_year,
+    extra_segments_from_rows,
+    inflation_segments_from_rows,
+    salary_segments_from_rows,
+    summarize_scenarios,
+)
+from plans import PLANS, plan_scenario
+
+
+def _number(data: dict, key: str, default=None) -> float:
+    if key not in data and default is None:
+        raise InputError(f"Missing {key}")
+    value = data.get(key, default)
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise InputError(f"Invalid {key} value")
+    if not np.isfinite(value):
+        raise InputError(f"Invalid {key} value")
+    return value
+
+
+def _rows(data: dict, key: str, required: bool = True) -> list:
+    if key not in data and not required:
+        return []
+    rows = data.get(key)
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise InputError(f"{key} must be a list of objects")
+    return rows
+
+
+def scenario_from_request(data) -> Scenario:
+    """The :class:`Scenario` of one request object (raises InputError)."""
+    if not isinstance(data, dict):
+        raise InputError("Each scenario must be a JSON object")
+    if "starting_loan" in data:
+        starting_loan = _number(data, "starting_loan")
+        study_years = int(_number(data, "study_years", 0))
+    else:
+        study_years = int(_number(data, "study_years"))
+        starting_loan = (_number(data, "tuition") + _number(data, "maintenance")) * study_years
+        if not np.isfinite(starting_loan):
+            raise InputError("Invalid starting loan: tuition and maintenance are too large")
+    plan = data.get("plan")
+    if plan is not None and (not isinstance(plan, str) or plan not in PLANS):
+        raise InputError(f"Unknown plan {plan!r}; expected one of {sorted(PLANS)}")
+    default_years = PLANS[plan].write_off_years if plan is not None else TOTAL_YEARS
+    total_years = int(_number(data, "total_years", default_years))
+    if not 1 <= total_years <= 100:
+        raise InputError("total_years must be between 1 and 100")
+    try:
+        scenario = Scenario(
+            starting_loan=starting_loan,
+            salary_segments=salary_segments_from_rows(_rows(data, "salary_rows")),
+            inflation_segments=inflation_segments_from_rows(_rows(data, "inflation_rows")),
+            start_year=int(_number(data, "start_year", default_start_year(study_years))),
+            extra_segments=extra_segments_from_rows(_rows(data, "extra_repayment_rows", required=False)),
+        )
+    except InputError:
+        raise
+    except KeyError as exc:
+        raise InputError(f"Missing field {exc} in a timeline row")
+    except (TypeError, ValueError) as exc:
+        raise InputError(f"Invalid timeline row: {exc}")
+    for key, segments, field in (("salary_rows", scenario.salary_segments, "salary"),
+                                 ("inflation_rows", scenario.inflation_segments, "inflation"),
+                                 ("extra_repayment_rows", scenario.extra_segments, "extra_payment")):
+        for idx, segment in enumerate(segments):
+            if not np.isfinite(getattr(segment, field)):
+                raise InputError(f"Invalid {field} value in {key} row {idx+1}")
+    for idx, segment in enumerate(scenario.extra_segments):
+        if segment.start_month < 1 or segment.duration_months < 0:
+            raise InputError(f"Extra repayment row {idx+1} needs start_month >= 1 and duration_months >= 0")
+    if plan is not None:
+        scenario = plan_scenario(scenario, PLANS[plan])
+    return replace(scenario, total_years=total_years)
+
+
+def scenario_summaries(scenarios: List[Scenario]) -> List[dict]:
+    """The response summary of each scenario, simulated together by the batched kernel."""
+    summaries = summarize_scenarios(scenarios)
+    results = []
+    for j, scenario in enumerate(scenarios):
+        payoff = int(summaries["payoff_month"][j])
+        results.append({
+            "starting_loan": scenario.starting_loan,
+            "payoff_month": payoff if payoff > 0 else None,
+            "total_repaid": float(summaries["total_repaid"][j]),
+            "interest_paid": float(summaries["interest_paid"][j]),
+            "written_off": float(summaries["written_off"][j]),
+        })
+    return results
@@ -0,0 +1,118 @@
+"""Goal seeking: the smallest input that repays the loan by a target month.
+
+Each trial runs the balance kernel only over the first ``target_month``
+months and stops at payoff, so it ends as soon as the outcome is known.
+Months to payoff only ever fall as the extra payment or salary rises, so
+the answer is found by bisection to the nearest penny.
+"""
+import math
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+import kernels
+from engine import Scenario, build_schedules, monthly_rates, plan_interest, regular_payments
+
+MAX_TRIALS = 200
+
+
+class SolverError(ValueError):
+    """No value of the input repays the loan by the target month."""
+
+
+@dataclass(frozen=True)
+class SolverResult:
+    value: float  # the smallest value, in whole pennies
+    payoff_month: int  # 1-based month the loan is repaid in at that value
+    trials: int  # trial simulations run
+
+
+class _Trials:
+    # Runs early-stopping trial simulations over the first ``target`` months.
+    def __init__(self, scenario: Scenario, target_month: int):
+        if not 1 <= target_month <= scenario.total_months:
+            raise ValueError(f"Target month must be between 1 and {scenario.total_months}")
+        self.scenario = scenario
+        self.target = target_month
+        self.schedules = build_schedules(scenario)
+        self.rate = monthly_rates(self.schedules.interest[:target_month])
+        self.out = np.empty((kernels.N_COLUMNS, target_month))
+        self.count = 0
+
+    def payoff(self, regular: np.ndarray, extra: np.ndarray, rate: Optional[np.ndarray] = None) -> Optional[int]:
+        self.count += 1
+        rate = self.rate if rate is None else rate
+        _, payoff = kernels.recurrence(self.scenario.starting_loan, regular, extra, rate, self.out)
+        return payoff
+
+
+def _bisect(trial, lo: float, hi: float, trials: _Trials) -> SolverResult:
+    # ``trial(lo)`` does not repay by the target; find the smallest repaying value.
+    payoff = trial(hi)
+    while payoff is None:
+        if trials.count > MAX_TRIALS:
+            raise SolverError("No value repays the loan by the target month")
+        lo, hi = hi, hi * 2
+        payoff = trial(hi)
+    # Bisect over whole pennies so the answer is the exact smallest one.
+    lo_pennies, hi_pennies = math.floor(lo * 100), math.ceil(hi * 100)
+    while hi_pennies - lo_pennies > 1:
+        mid = (lo_pennies + hi_pennies) // 2
+        mid_payoff = trial(mid / 100)
+        if mid_payoff is None:
+            lo_pennies = mid
+        else:
+            hi_pennies, payoff = mid, mid_payoff
+    return SolverResult(value=hi_pennies / 100, payoff_month=payoff, trials=trials.count)
+
+
+def minimum_extra_payment(scenario: Scenario, target_month: int) -> SolverResult:
+    """Smallest constant monthly extra payment, from month 1 and on top of the
+    scenario's own extra payments, that repays the loan by ``target_month``."""
+    trials = _Trials(scenario, target_month)
+    schedules = trials.schedules
+    regular = regular_payments(schedules.salary[:target_month], scenario.plan, schedules.threshold[:target_month])
+    base_extra = schedules.extra[:target_month]
+
+    def trial(amount):
+        return trials.payoff(regular, base_extra + amount)
+
+    payoff = trial(0.0)
+    if payoff is not None:
+        return SolverResult(value=0.0, payoff_month=payoff, trials=trials.count)
+    first_guess = max(scenario.starting_loan / target_month, 0.01)
+    return _bisect(trial, 0.0, first_guess, trials)
+
+
+def break_even_salary(scenario: Scenario, target_month: int) -> SolverResult:
+    """Smallest constant annual salary, replacing the salary timeline, that
+    repays the loan by ``target_month``.  0 means any salary will do (the
+    extra payments alone repay it).
+
+    Under a plan whose interest margin rises with income, a higher salary
+    also raises the interest, so over a narrow range the payoff month need
+    not fall; the answer is then a repaying salary at the edge of that range.
+    """
+    trials = _Trials(scenario, target_month)
+    plan = scenario.plan
+    schedules = trials.schedules
+    extra = schedules.extra[:target_month]
+    threshold = schedules.threshold[:target_month]
+    inflation = schedules.inflation[:target_month]
+    uprating = schedules.uprating[:target_month]
+    ones = np.ones(target_month)
+
+    def trial(salary):
+        salaries = ones * salary
+        rate = monthly_rates(plan_interest(inflation, salaries, plan, uprating)) if plan.interest_tiers else None
+        return trials.payoff(regular_payments(salaries, plan, threshold), extra, rate)
+
+    payoff = trial(0.0)
+    if payoff is not None:
+        return SolverResult(value=0.0, payoff_month=payoff, trials=trials.count)
+    if plan.repayment_rate <= 0:
+        raise SolverError("No salary repays the loan by the target month under this plan")
+    # Below the threshold nothing is repaid, so search upwards from it.
+    first_guess = threshold.max() + (scenario.starting_loan / target_month) * 12 / plan.repayment_rate
+    return _bisect(trial, float(threshold.min()), float(first_guess), trials)
@@ -0,0 +1,188 @@
+"""Saved scenarios in a local SQLite database, shared by short tokens.
+
+A scenario is saved as its normalized inputs, in the API's request format
+(see ``scenarios.py``), together with its summary, which is simulated once when
+the scenario is first saved.  Rows are keyed by the SHA-256 content hash of
+those inputs as canonical JSON (:func:`normalized_inputs`), so saving
+inputs that are already stored, by anyone, returns the stored row without
+simulating it again.  The hash covers everything a link restores, such as
+the split between tuition and maintenance: inputs that only simulate the
+same (the same :func:`cache.scenario_key`) are saved separately, so each
+link opens the inputs that were saved under it.  Each saved row also gets a
+short URL-safe token, a prefix of its hash, for links such as ``?s=<token>``.
+
+Each user's saved scenarios are a separate table keyed by user, with an
+index on ``(user_id, saved_at)``, so listing a user's latest scenarios and
+loading one by token are index lookups however many rows are stored.
+
+The database path is ``LOAN_STORE_PATH`` (default ``scenarios.sqlite3`` in
+the working directory).  It is opened in WAL mode, so page sessions can
+read while another one saves; each thread gets its own connection.
+"""
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from cache import normalize_scenario
+from engine import Scenario
+from scenarios import scenario_from_request, scenario_summaries
+
+DEFAULT_PATH = "scenarios.sqlite3"
+TOKEN_LENGTHS = (10, 16, 43)  # base64url characters; longer only on a prefix collision
+DEFAULT_LIST_LIMIT = 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scenarios (
+    id INTEGER PRIMARY KEY,
+    content_hash BLOB NOT NULL UNIQUE,  -- SHA-256 of the inputs as canonical JSON
+    token TEXT NOT NULL UNIQUE,
+    inputs TEXT NOT NULL,  -- normalized request JSON
+    summary TEXT NOT NULL,  -- summary JSON, as returned by the API
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS saved (
+    user_id TEXT NOT NULL,
+    scenario_id INTEGER NOT NULL REFERENCES scenarios (id),
+    name TEXT NOT NULL,
+    saved_at REAL NOT NULL,
+    PRIMARY KEY (user_id, scenario_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS saved_by_user ON saved (user_id, saved_at);
+"""
+
+
+@dataclass(frozen=True)
+class SavedScenario:
+    token: str
+    inputs: dict  # normalized request (see normalized_inputs)
+    summary: dict
+    name: Optional[str] = None  # the user's name for it; None when loaded by token
+    saved_at: Optional[float] = None
+
+
+def normalized_inputs(data: dict, scenario: Scenario) -> dict:
+    """The request ``data`` with its timelines replaced by the rows of the
+    normalized ``scenario`` and every default filled in."""
+    if "starting_loan" in data:
+        loan = {"starting_loan": scenario.starting_loan}
+    else:
+        loan = {"tuition": round(float(data["tuition"]), 2), "maintenance": round(float(data["maintenance"]), 2)}
+    return {
+        **loan,
+        "study_years": int(float(data.get("study_years", 0))),
+        "start_year": scenario.start_year,
+        "plan": data.get("plan"),
+        "total_years": scenario.total_years,
+        "salary_rows": [{"salary": seg.salary, "years": seg.years} for seg in scenario.salary_segments],
+        "inflation_rows": [{"inflation": seg.inflation, "years": seg.years} for seg in scenario.inflation_segments],
+        "extra_repayment_rows": [
+            {"extra_payment": seg.extra_payment, "start_month": seg.start_month, "duration_months": seg.duration_months}
+            for seg in scenario.extra_segments
+        ],
+    }
+
+
+def inputs_hash(inputs: dict) -> bytes:
+    """SHA-256 of ``inputs`` as canonical JSON (sorted keys, no spaces)."""
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, separators=(",", ":")).encode()).digest()
+
+
+class ScenarioStore:
+    """Thread-safe store of scenarios and of each user's saved list."""
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._connect().executescript(SCHEMA)
+
+    @classmethod
+    def from_env(cls) -> "ScenarioStore":
+        return cls(os.environ.get("LOAN_STORE_PATH", DEFAULT_PATH))
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.execute("PRAGMA foreign_keys = ON")
+            self._local.connection = connection
+        return connection
+
+    def save(self, data: dict, user_id: str, name: str) -> SavedScenario:
+        """Save the request ``data`` to ``user_id``'s list as ``name``
+        (raises InputError).  Simulates it only if it is not stored yet;
+        saving it again renames it and moves it to the top of the list."""
+        scenario = normalize_scenario(scenario_from_request(data))
+        inputs = normalized_inputs(data, scenario)
+        content_hash = inputs_hash(inputs)
+        connection = self._connect()
+        row = connection.execute(
+            "SELECT id, token, inputs, summary FROM scenarios WHERE content_hash = ?", (content_hash,),
+        ).fetchone()
+        if row is None:
+            summary = scenario_summaries([scenario])[0]
+            row = self._insert(connection, content_hash, inputs, summary)
+        scenario_id, token, inputs, summary = row
+        saved_at = time.time()
+        connection.execute(
+            "INSERT INTO saved (user_id, scenario_id, name, saved_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (user_id, scenario_id) DO UPDATE SET name = excluded.name, saved_at = excluded.saved_at",
+            (user_id, scenario_id, name, saved_at),
+        )
+        return SavedScenario(token, _json(inputs), _json(summary), name, saved_at)
+
+    def _insert(self, connection: sqlite3.Connection, content_hash: bytes, inputs: dict, summary: dict) -> tuple:
+        encoded = base64.urlsafe_b64encode(content_hash).decode().rstrip("=")
+        inputs_json, summary_json = json.dumps(inputs), json.dumps(summary)
+        for length in TOKEN_LENGTHS:
+            try:
+                cursor = connection.execute(
+                    "INSERT INTO scenarios (content_hash, token, inputs, summary, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (content_hash, encoded[:length], inputs_json, summary_json, time.time()),
+                )
+                return cursor.lastrowid, encoded[:length], inputs_json, summary_json
+            except sqlite3.IntegrityError:
+                # Saved meanwhile by another session, or a token prefix collision.
+                row = connection.execute(
+                    "SELECT id, token, inputs, summary FROM scenarios WHERE content_hash = ?", (content_hash,),
+                ).fetchone()
+                if row is not None:
+                    return row
+        raise RuntimeError("No free token for the scenario")
+
+    def load(self, token: str) -> Optional[SavedScenario]:
+        """The scenario with ``token``, or None."""
+        row = self._connect().execute("SELECT inputs, summary FROM scenarios WHERE token = ?", (token,)).fetchone()
+        return SavedScenario(token, _json(row[0]), _json(row[1])) if row else None
+
+    def list_saved(self, user_id: str, limit: int = DEFAULT_LIST_LIMIT,
+                   before: Optional[float] = None) -> List[SavedScenario]:
+        """``user_id``'s saved scenarios, most recently saved first.  Pass
+        the last one's ``saved_at`` as ``before`` for the next page."""
+        rows = self._connect().execute(
+            "SELECT s.token, s.inputs, s.summary, v.name, v.saved_at FROM saved v "
+            "JOIN scenarios s ON s.id = v.scenario_id "
+            "WHERE v.user_id = ? AND v.saved_at < ? ORDER BY v.saved_at DESC LIMIT ?",
+            (user_id, float("inf") if before is None else before, limit),
+        ).fetchall()
+        return [SavedScenario(token, _json(inputs), _json(summary), name, saved_at)
+                for token, inputs, summary, name, saved_at in rows]
+
+    def forget(self, user_id: str, token: str) -> None:
+        """Remove a scenario from ``user_id``'s list (the scenario itself
+        stays, for anyone holding its token)."""
+        self._connect().execute(
+            "DELETE FROM saved WHERE user_id = ? AND scenario_id = (SELECT id FROM scenarios WHERE token = ?)",
+            (user_id, token),
+        )
+
+
+def _json(value):
+    return json.loads(value) if isinstance(value, str) else value
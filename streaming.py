@@ -0,0 +1,220 @@
+"""Per-month percentiles of many simulated paths, in constant memory.
+
+Percentile bands over a large run (Monte Carlo paths, or a cohort of
+borrowers) would otherwise need every path's balance for every month:
+a million paths over 480 months is about 2 GB of float32 balances, and
+more again for the payments.  :class:`MonthlyAggregate` instead takes the
+paths a chunk at a time and keeps, for each month, a fixed histogram of
+``Loan Balance``, ``Total Payment`` and ``Cumulative Paid``, together with
+a count of the paths repaid in each month.  Its size depends on the
+horizon and the accuracy, not on the number of paths (about 13 MB for 480
+months at the default 1%).
+
+The histograms (:class:`QuantileSketch`) have logarithmic buckets, as in
+DDSketch: bucket ``i`` holds the values in ``(s g^(i-1), s g^i]``, with
+``g = (1 + a) / (1 - a)`` for a relative accuracy ``a``, so every
+percentile read back is within ``a`` of the exact one (relative to its
+value, and up to float32 rounding).  Values up to ``s`` (a penny) count as
+zero, which is exactly what a repaid balance is, and values above the
+largest bucket as the largest value seen in that month.
+
+Every bucket layout is fixed up front, so two aggregates of the same
+horizon and accuracy merge by adding their counts.  Chunks of paths can be
+aggregated by separate worker processes and merged in any order; the
+result is the same as aggregating every path in one process.  A sketch is
+pickled as its non-zero buckets only, so sending a worker's aggregate to
+the parent costs a fraction of its size (about 1.5 MB, not 13 MB, for a
+chunk of 1,000 borrowers).
+"""
+import math
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+METRICS = ("Loan Balance", "Total Payment", "Cumulative Paid")
+DEFAULT_RELATIVE_ACCURACY = 0.01
+SMALLEST_VALUE = 0.01  # values up to this count as zero
+LARGEST_VALUE = 1e8  # values above this share an overflow bucket
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+@dataclass
+class QuantileSketch:
+    """Fixed logarithmic histograms of a value, one per month."""
+    counts: np.ndarray  # (months, buckets): zero bucket, log buckets, overflow bucket
+    maximum: np.ndarray  # largest value seen in each month
+    relative_accuracy: float
+    smallest: float
+    largest: float
+
+    @classmethod
+    def empty(cls, n_months: int, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+              smallest: float = SMALLEST_VALUE, largest: float = LARGEST_VALUE) -> "QuantileSketch":
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("The relative accuracy must be between 0 and 1")
+        if not 0 < smallest < largest:
+            raise ValueError("The sketch needs 0 < smallest < largest")
+        gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        log_buckets = math.ceil(math.log(largest / smallest) / math.log(gamma))
+        counts = np.zeros((n_months, log_buckets + 2), dtype=np.int64)
+        return cls(counts, np.zeros(n_months), relative_accuracy, smallest, largest)
+
+    @property
+    def gamma(self) -> float:
+        return (1 + self.relative_accuracy) / (1 - self.relative_accuracy)
+
+    @property
+    def log_buckets(self) -> int:
+        return math.ceil(math.log(self.largest / self.smallest) / math.log(self.gamma))
+
+    def _layout(self) -> tuple:
+        return self.counts.shape, self.relative_accuracy, self.smallest, self.largest
+
+    def add(self, values: np.ndarray, first_month: int = 0) -> None:
+        """Add ``values`` (months x paths), the months from ``first_month`` on."""
+        n_months, buckets = len(values), self.counts.shape[1]
+        if not n_months:
+            return
+        # The bucket is log_g(v / s) + 1, truncated: 0 for values up to s,
+        # then 1, 2, ...  Working it out in float32 takes a third less time
+        # than float64 and moves a bucket edge by at most about 1e-5 of its value.
+        log_gamma = math.log(self.gamma)
+        position = np.maximum(values, self.smallest / self.gamma, dtype=np.float32)
+        np.log(position, out=position)
+        position *= 1 / log_gamma
+        position += 1 - math.log(self.smallest) / log_gamma
+        np.minimum(position, buckets - 1, out=position)
+        index = position.astype(np.intp)
+        # Offset each month's buckets, so one bincount counts every month.
+        index += (np.arange(n_months) * buckets)[:, None]
+        months = slice(first_month, first_month + n_months)
+        counts = np.bincount(index.ravel(), minlength=n_months * buckets)
+        self.counts[months] += counts.reshape(n_months, buckets)
+        np.maximum(self.maximum[months], values.max(axis=1), out=self.maximum[months])
+
+    # Pickled (to send a worker's sketch to the parent process) as its
+    # non-zero buckets only: a chunk of paths fills a small share of them.
+    def __getstate__(self) -> dict:
+        state = dict(self.__dict__)
+        counts = state.pop("counts")
+        flat = counts.reshape(-1)
+        index = np.flatnonzero(flat)
+        state.update(shape=counts.shape, index=index.astype(np.min_scalar_type(flat.size)), nonzero=flat[index])
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        state = dict(state)
+        counts = np.zeros(state.pop("shape"), dtype=np.int64)
+        counts.reshape(-1)[state.pop("index")] = state.pop("nonzero")
+        self.__dict__.update(state, counts=counts)
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Add ``other``'s counts to this sketch, in place."""
+        if other._layout() != self._layout():
+            raise ValueError("Only sketches with the same months and buckets can be merged")
+        self.counts += other.counts
+        np.maximum(self.maximum, other.maximum, out=self.maximum)
+        return self
+
+    def percentiles(self, percentiles: Sequence[float] = DEFAULT_PERCENTILES) -> np.ndarray:
+        """(percentiles x months) array, interpolated between order
+        statistics like numpy's default method; NaN for months with no values."""
+        # Each bucket's value: 0, then the point within a of both its edges,
+        # then the month's largest value for the overflow bucket.
+        values = np.empty(self.counts.shape)
+        values[:, 0] = 0.0
+        values[:, 1:-1] = self.smallest * 2 * self.gamma ** np.arange(1, self.log_buckets + 1) / (self.gamma + 1)
+        values[:, -1] = self.maximum
+        cumulative = np.cumsum(self.counts, axis=1)
+        n = cumulative[:, -1]
+
+        def order_statistic(rank):
+            # The value of the (0-based) rank-th smallest value of each month.
+            bucket = np.minimum((cumulative[None] <= rank[..., None]).sum(axis=2), self.counts.shape[1] - 1)
+            return np.take_along_axis(values, bucket.T, axis=1).T
+
+        positions = np.asarray(percentiles, dtype=float)[:, None] / 100 * np.maximum(n - 1, 0)
+        lower = np.floor(positions)
+        weight = positions - lower
+        low = order_statistic(lower)
+        high = order_statistic(np.minimum(lower + 1, np.maximum(n - 1, 0)))
+        return np.where(n > 0, low + (high - low) * weight, np.nan)
+
+
+@dataclass
+class MonthlyAggregate:
+    """Percentile sketches of :data:`METRICS` and payoff counts over paths."""
+    sketches: dict  # metric -> QuantileSketch
+    payoff_counts: np.ndarray  # [0]: paths not repaid; [m]: paths repaid in month m
+
+    @classmethod
+    def empty(cls, n_months: int, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY) -> "MonthlyAggregate":
+        return cls(
+            sketches={metric: QuantileSketch.empty(n_months, relative_accuracy) for metric in METRICS},
+            payoff_counts=np.zeros(n_months + 1, dtype=np.int64),
+        )
+
+    @property
+    def n_months(self) -> int:
+        return len(self.payoff_counts) - 1
+
+    @property
+    def n_paths(self) -> int:
+        return int(self.payoff_counts.sum())
+
+    @property
+    def payoff_probability(self) -> float:
+        return float(1 - self.payoff_counts[0] / self.n_paths) if self.n_paths else float("nan")
+
+    def update(self, balances: np.ndarray, cumulative_paid: np.ndarray, first_month: int = 0,
+               paid_before=0.0) -> None:
+        """Add a block of months of a chunk of paths: their balances and
+        total paid at the end of each month (months x paths, as recorded by
+        :func:`kernels.recurrence_batch`), from ``first_month`` on.
+        ``paid_before`` is each path's total paid before the block."""
+        if first_month + len(balances) > self.n_months:
+            raise ValueError(f"Months {first_month + 1}-{first_month + len(balances)} are past the "
+                             f"{self.n_months}-month horizon")
+        previous = np.broadcast_to(paid_before, cumulative_paid.shape[1:])[None]
+        payments = np.diff(cumulative_paid, axis=0, prepend=previous)
+        for metric, values in zip(METRICS, (balances, payments, cumulative_paid)):
+            self.sketches[metric].add(values, first_month)
+
+    def add_payoffs(self, payoff_month: np.ndarray) -> None:
+        """Count a chunk of paths by their 1-based payoff month (-1 if not
+        repaid), once all of their months have been added."""
+        self.payoff_counts += np.bincount(np.maximum(payoff_month, 0), minlength=self.n_months + 1)
+
+    def merge(self, other: "MonthlyAggregate") -> "MonthlyAggregate":
+        """Add ``other``'s paths to this aggregate, in place."""
+        if other.n_months != self.n_months:
+            raise ValueError("Only aggregates over the same months can be merged")
+        for metric, sketch in self.sketches.items():
+            sketch.merge(other.sketches[metric])
+        self.payoff_counts += other.payoff_counts
+        return self
+
+    def bands(self, metric: str = "Loan Balance", percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+              index: Optional[pd.Index] = None) -> pd.DataFrame:
+        """``metric``'s percentiles by month, as columns ``P5``, ``P25``, ...,
+        indexed by ``index`` (default: the 1-based ``Month``)."""
+        if index is None:
+            index = pd.RangeIndex(1, self.n_months + 1, name="Month")
+        bands = self.sketches[metric].percentiles(percentiles)
+        return pd.DataFrame({f"P{q:g}": band for q, band in zip(percentiles, bands)}, index=index)
+
+    def table(self, percentiles: Sequence[float] = DEFAULT_PERCENTILES) -> pd.DataFrame:
+        """One row per month: every metric's percentiles (``Loan Balance P5``,
+        ...) and the payoff distribution."""
+        bands = [self.bands(metric, percentiles).add_prefix(f"{metric} ") for metric in METRICS]
+        return pd.concat(bands + [self.payoff_distribution()], axis=1)
+
+    def payoff_distribution(self) -> pd.DataFrame:
+        """Paths repaid in each month, and the share repaid by the end of it."""
+        repaid = self.payoff_counts[1:]
+        return pd.DataFrame(
+            {"Paths Repaid": repaid, "Share Repaid": np.cumsum(repaid) / max(self.n_paths, 1)},
+            index=pd.RangeIndex(1, self.n_months + 1, name="Month"),
+        )
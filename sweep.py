@@ -0,0 +1,277 @@
+"""Parameter sweeps: simulate every point of a grid of scenario inputs.
+
+A sweep varies one or more inputs of a base :class:`Scenario` over a grid
+(see :data:`PARAMETERS`).  Grid points are not turned into scenarios one by
+one; the base schedules are adjusted as arrays and whole chunks of points
+are simulated by the batched kernel.  Large grids are split into chunks
+across a process pool whose workers write straight into shared-memory
+result arrays.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait
+from dataclasses import dataclass, replace
+from multiprocessing import shared_memory
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+import kernels
+from engine import PlanConstants, Scenario, build_schedules, monthly_rates, plan_interest, plan_thresholds
+
+# Parameter name -> description.  Each one overrides or adjusts one input.
+PARAMETERS = {
+    "starting_loan": "Starting loan (£)",
+    "starting_salary": "Salary in the first salary row (£ per year)",
+    "salary_scale": "Multiplier applied to every salary row",
+    "inflation": "Flat inflation rate for the whole term (%), replacing the inflation timeline",
+    "inflation_shift": "Percentage points added to every inflation row",
+    "extra_payment": "Extra monthly payment from month 1 (£), on top of any extra repayment rows",
+    "repayment_threshold": "Annual repayment threshold (£), replacing the plan's threshold schedule",
+    "repayment_rate": "Share of income above the threshold repaid (e.g. 0.09)",
+}
+
+# Result arrays written by the workers, and their dtypes.
+OUTPUTS = {
+    "total_repaid": np.float64,
+    "interest_paid": np.float64,
+    "written_off": np.float64,
+    "payoff_month": np.int32,  # -1 if not repaid
+}
+
+DEFAULT_CHUNK_SIZE = 4096
+# Grids smaller than this are simulated in-process; a pool costs more to start.
+MIN_POOL_POINTS = 20_000
+
+
+@dataclass(frozen=True)
+class SweepAxis:
+    parameter: str
+    values: Tuple[float, ...]
+
+    def __post_init__(self):
+        if self.parameter not in PARAMETERS:
+            raise ValueError(f"Unknown sweep parameter {self.parameter!r}; expected one of {sorted(PARAMETERS)}")
+        object.__setattr__(self, "values", tuple(float(v) for v in self.values))
+
+    @classmethod
+    def linspace(cls, parameter: str, start: float, stop: float, num: int) -> "SweepAxis":
+        return cls(parameter, tuple(np.linspace(start, stop, num)))
+
+
+@dataclass
+class SweepResult:
+    axes: Tuple[SweepAxis, ...]
+    total_repaid: np.ndarray  # one dimension per axis, in axis order
+    interest_paid: np.ndarray
+    written_off: np.ndarray
+    payoff_month: np.ndarray
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.total_repaid.shape
+
+
+# -------------------------
+# Evaluating a Chunk of Grid Points
+# -------------------------
+@dataclass
+class _Base:
+    # Everything a worker needs about the base scenario, as plain arrays and the plan.
+    starting_loan: float
+    salary: np.ndarray
+    first_row: np.ndarray  # months paid at the first salary row's salary
+    inflation: np.ndarray
+    extra: np.ndarray
+    threshold: np.ndarray  # annual, per month
+    uprating: np.ndarray
+    plan: PlanConstants
+    start_year: int
+    axes: Tuple[SweepAxis, ...]
+
+
+def _first_row_months(scenario: Scenario) -> np.ndarray:
+    # Months paid at the first row's salary, including any padding of a
+    # timeline that stops short: mark the row with NaN and see where it lands.
+    if not scenario.salary_segments:
+        return np.zeros(scenario.total_months, dtype=bool)
+    first, *rest = scenario.salary_segments
+    probe = replace(scenario, salary_segments=(replace(first, salary=float("nan")), *rest))
+    return np.isnan(build_schedules(probe).salary)
+
+
+def _base_from_scenario(scenario: Scenario, axes: Sequence[SweepAxis]) -> _Base:
+    schedules = build_schedules(scenario)
+    return _Base(
+        starting_loan=scenario.starting_loan,
+        salary=schedules.salary,
+        first_row=_first_row_months(scenario),
+        inflation=schedules.inflation,
+        extra=schedules.extra,
+        threshold=schedules.threshold,
+        uprating=schedules.uprating,
+        plan=scenario.plan,
+        start_year=scenario.start_year,
+        axes=tuple(axes),
+    )
+
+
+def _simulate_points(base: _Base, start: int, stop: int) -> Dict[str, np.ndarray]:
+    shape = tuple(len(axis.values) for axis in base.axes)
+    grid_index = np.unravel_index(np.arange(start, stop), shape)
+    values = {axis.parameter: np.asarray(axis.values)[idx] for axis, idx in zip(base.axes, grid_index)}
+    n = stop - start
+
+    # Month-major (months x points) inputs; untouched inputs stay (months x 1).
+    salary = base.salary[:, None]
+    if "starting_salary" in values:
+        salary = np.where(base.first_row[:, None], values["starting_salary"], salary)
+    if "salary_scale" in values:
+        salary = salary * values["salary_scale"]
+    inflation = base.inflation[:, None]
+    if "inflation" in values:
+        inflation = np.broadcast_to(values["inflation"], (len(base.inflation), n))
+    if "inflation_shift" in values:
+        inflation = inflation + values["inflation_shift"]
+    extra = base.extra[:, None]
+    if "extra_payment" in values:
+        extra = extra + values["extra_payment"]
+    threshold, uprating = base.threshold[:, None], base.uprating[:, None]
+    if base.plan.uprate_with_rpi and ("inflation" in values or "inflation_shift" in values):
+        # Each point's thresholds rise with its own inflation, as in build_schedules.
+        threshold, uprating = plan_thresholds(base.plan, base.start_year, inflation)
+    threshold = values.get("repayment_threshold", threshold)
+    repayment_rate = values.get("repayment_rate", base.plan.repayment_rate)
+
+    # Same expression as engine.regular_payments, broadcast over the points.
+    regular = np.where(salary > threshold, ((salary - threshold) * repayment_rate) / 12, 0.0)
+    interest = plan_interest(inflation, salary, base.plan, uprating)
+    state = kernels.BatchState.start(values.get("starting_loan", base.starting_loan), n)
+    kernels.recurrence_batch(state, regular, extra, monthly_rates(interest))
+    return {
+        "total_repaid": state.total_paid,
+        "interest_paid": state.interest_paid,
+        "written_off": np.maximum(state.balance, 0.0),
+        "payoff_month": state.payoff_month,
+    }
+
+
+# -------------------------
+# Process Pool Workers
+# -------------------------
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()  # page sessions run sweeps from several threads
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13 has no track argument
+        return shared_memory.SharedMemory(name=name)
+
+
+def _run_chunk(base: _Base, names: Dict[str, str], n_points: int, backend: str, start: int, stop: int) -> int:
+    kernels.set_backend(backend)
+    results = _simulate_points(base, start, stop)
+    for key, name in names.items():
+        shm = _attach(name)
+        try:
+            np.ndarray(n_points, dtype=OUTPUTS[key], buffer=shm.buf)[start:stop] = results[key]
+        finally:
+            shm.close()
+    return stop - start
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    # The pool is kept between sweeps so only the first one pays for starting
+    # the workers.  Forking a multi-threaded server (such as Streamlit) is
+    # unsafe, so workers come from a forkserver that has already imported the
+    # simulation modules, or are spawned where forkserver is unavailable.
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers or getattr(_pool, "_broken", False):
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload([__name__, "numba"])
+            else:
+                context = multiprocessing.get_context("spawn")
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+# -------------------------
+# Running a Sweep
+# -------------------------
+def run_sweep(scenario: Scenario, axes: Sequence[SweepAxis], workers: Optional[int] = None,
+              chunk_size: int = DEFAULT_CHUNK_SIZE,
+              progress: Optional[Callable[[int, int], None]] = None) -> SweepResult:
+    """Simulate every combination of the axis values.
+
+    ``workers`` defaults to the number of CPUs; 0 or 1 (and grids smaller
+    than :data:`MIN_POOL_POINTS`) run in-process.  ``progress`` is called
+    with ``(points_done, total_points)`` as chunks finish.
+    """
+    axes = tuple(axes)
+    parameters = [axis.parameter for axis in axes]
+    if len(set(parameters)) != len(parameters):
+        raise ValueError("Each parameter can only be swept along one axis")
+    shape = tuple(len(axis.values) for axis in axes)
+    n_points = int(np.prod(shape))
+    base = _base_from_scenario(scenario, axes)
+    chunks = [(start, min(start + chunk_size, n_points)) for start in range(0, n_points, chunk_size)]
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    outputs = {}
+    done = 0
+    if workers <= 1 or n_points < MIN_POOL_POINTS:
+        outputs = {key: np.empty(n_points, dtype=dtype) for key, dtype in OUTPUTS.items()}
+        for start, stop in chunks:
+            for key, values in _simulate_points(base, start, stop).items():
+                outputs[key][start:stop] = values
+            done += stop - start
+            if progress:
+                progress(done, n_points)
+    else:
+        blocks = {
+            key: shared_memory.SharedMemory(create=True, size=max(n_points * np.dtype(dtype).itemsize, 1))
+            for key, dtype in OUTPUTS.items()
+        }
+        futures = []
+        try:
+            names = {key: shm.name for key, shm in blocks.items()}
+            pool = _get_pool(workers)
+            backend = kernels.active_backend()
+            for start, stop in chunks:
+                futures.append(pool.submit(_run_chunk, base, names, n_points, backend, start, stop))
+            for future in as_completed(futures):
+                done += future.result()
+                if progress:
+                    progress(done, n_points)
+            for key, shm in blocks.items():
+                outputs[key] = np.ndarray(n_points, dtype=OUTPUTS[key], buffer=shm.buf).copy()
+        finally:
+            # If a chunk failed, the others may still be writing into the
+            # blocks: cancel those not started and wait for the rest before
+            # the blocks are unlinked.
+            for future in futures:
+                future.cancel()
+            wait(futures)
+            for shm in blocks.values():
+                shm.close()
+                shm.unlink()
+
+    return SweepResult(axes=axes, **{key: values.reshape(shape) for key, values in outputs.items()})
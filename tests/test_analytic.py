@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from analytic import DEFAULT_TOLERANCE, random_scenario, summarize_analytic, validate
+from engine import InflationSegment, SalarySegment, Scenario, summarize_scenarios
+from plans import PLANS, plan_scenario
+
+# The CLI's random scenarios, under every plan.
+SCENARIOS = [random_scenario(np.random.default_rng(seed)) for seed in range(300)]
+
+
+def assert_matches_engine(scenarios):
+    expected = summarize_scenarios(scenarios)
+    for j, scenario in enumerate(scenarios):
+        closed = summarize_analytic(scenario)
+        assert (closed.payoff_month or -1) == expected["payoff_month"][j], scenario
+        scale = max(scenario.starting_loan, expected["total_repaid"][j], 1.0)
+        for field in ("total_repaid", "interest_paid", "written_off"):
+            error = abs(getattr(closed, field) - expected[field][j]) / scale
+            assert error <= DEFAULT_TOLERANCE, (field, scenario)
+
+
+def test_closed_form_matches_the_engine_on_random_scenarios():
+    assert_matches_engine(SCENARIOS)
+
+
+@pytest.mark.parametrize("plan", [None, *PLANS])
+def test_closed_form_matches_the_engine_under_each_plan(plan):
+    grid = [
+        Scenario(loan, (SalarySegment(salary, 3), SalarySegment(salary * growth, 0)),
+                 (InflationSegment(inflation, 0),), start_year)
+        for loan in (0.0, 15000.0, 64728.0)
+        for salary in (18000.0, 35000.0, 90000.0)
+        for growth in (1.0, 1.6)
+        for inflation in (0.0, 3.2, 8.0)
+        for start_year in (2024, 2031)
+    ]
+    assert_matches_engine(grid if plan is None else [plan_scenario(s, PLANS[plan]) for s in grid])
+
+
+def test_validate_reports_agreement():
+    report = validate(n=50, seed=1)
+    assert report["ok"] and report["payoff_mismatches"] == 0
@@ -0,0 +1,87 @@
+import http.client
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import api
+from cache import ResultCache
+from engine import RESULT_COLUMNS, simulate_repayment
+from scenarios import scenario_from_request
+
+REQUEST = {
+    "tuition": 9535, "maintenance": 6647, "study_years": 4, "start_year": 2030,
+    "salary_rows": [{"salary": 30000, "years": 5}, {"salary": 50000, "years": 0}],
+    "inflation_rows": [{"inflation": 4.3, "years": 0}],
+}
+
+
+def test_batch_keeps_errors_in_place_and_caches_summaries():
+    cache = ResultCache()
+    items = [REQUEST, {"tuition": "lots"}, {**REQUEST, "plan": "plan_2"},
+             # The same inputs as the first, with a row past the indefinite one.
+             {**REQUEST, "salary_rows": REQUEST["salary_rows"] + [{"salary": 1, "years": 1}]}]
+    results = api.simulate_batch(items, cache)
+    assert "error" in results[1] and "error" not in results[0] and "error" not in results[2]
+    assert results[3] == results[0]
+    assert cache.stats().entries == 2
+    assert api.simulate_batch(items, cache) == results
+    assert cache.stats().hits == 3
+
+
+def test_simulate_one_returns_the_monthly_table():
+    response = api.simulate_one({**REQUEST, "monthly": True}, ResultCache())
+    result = simulate_repayment(scenario_from_request(REQUEST))
+    assert response["total_repaid"] == result.column("Cumulative Paid")[-1]
+    assert list(response["monthly"]) == [name for name in RESULT_COLUMNS if name != "Date"] + ["Date"]
+    assert response["monthly"]["Loan Balance"] == result.column("Loan Balance").tolist()
+    assert response["monthly"]["Date"][0] == "2030-01-01"
+    with pytest.raises(api.RequestError) as error:
+        api.simulate_one({**REQUEST, "inflation_rows": [{"inflation": float("nan"), "years": 0}]}, ResultCache())
+    assert error.value.status == 400
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), api._Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd.server_address
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def request(address, method, path, body=None):
+    connection = http.client.HTTPConnection(*address, timeout=30)
+    try:
+        connection.request(method, path, body=body, headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def test_http_endpoints(server):
+    expected = api.simulate_batch([REQUEST], ResultCache())[0]
+    status, body = request(server, "POST", "/simulate/batch", json.dumps({"scenarios": [REQUEST, {}]}))
+    assert status == 200
+    assert body["results"][0] == expected
+    assert "error" in body["results"][1]
+
+    status, body = request(server, "POST", "/simulate", json.dumps(REQUEST))
+    assert (status, body) == (200, expected)
+
+    status, body = request(server, "GET", "/health")
+    assert status == 200 and body["status"] == "ok"
+
+
+@pytest.mark.parametrize("path, body, status", [
+    ("/simulate", "{not json", 400),
+    ("/simulate", json.dumps({**REQUEST, "tuition": None}), 400),
+    ("/simulate", '{"tuition": NaN, "maintenance": 0, "study_years": 4, "salary_rows": [], "inflation_rows": []}', 400),
+    ("/simulate/batch", json.dumps(REQUEST), 400),
+    ("/elsewhere", "{}", 404),
+], ids=["invalid JSON", "invalid field", "NaN", "batch without scenarios", "unknown path"])
+def test_http_errors(server, path, body, status):
+    assert request(server, "POST", path, body)[0] == status
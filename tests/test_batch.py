@@ -0,0 +1,65 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from batch import profile_scenario, run_batch, simulate_profiles
+from engine import summarize_scenarios
+from streaming import MonthlyAggregate
+
+GOOD = {
+    "tuition": 9535, "maintenance": 6647, "study_years": 4,
+    "salary_segments": json.dumps([{"salary": 30000, "years": 5}, {"salary": 50000, "years": 0}]),
+    "inflation_segments": json.dumps([{"inflation": 4.3, "years": 0}]),
+    "extra_payments": json.dumps([{"extra_payment": 100, "start_month": 1, "duration_months": 12}]),
+}
+BAD = {
+    "extra payment before the horizon": {
+        **GOOD, "extra_payments": json.dumps([{"extra_payment": 100, "start_month": -1000, "duration_months": 12}]),
+    },
+    "invalid salary": {**GOOD, "salary_segments": json.dumps([{"salary": "lots", "years": 0}])},
+    "missing tuition": {**GOOD, "tuition": None},
+    "malformed JSON": {**GOOD, "inflation_segments": "[{"},
+}
+
+
+def mixed_chunk() -> pd.DataFrame:
+    rows = [GOOD, *BAD.values(), {**GOOD, "study_years": 3}]
+    return pd.DataFrame(rows).assign(borrower_id=["good", *BAD, "three years"])
+
+
+@pytest.mark.parametrize("payroll", [None, "weekly"])
+@pytest.mark.parametrize("detail", [False, True])
+def test_bad_profiles_do_not_stop_the_chunk(detail, payroll):
+    profiles = mixed_chunk()
+    aggregate = MonthlyAggregate.empty(40 * 12)
+    summary, months = simulate_profiles(profiles, detail=detail, payroll=payroll, aggregate=aggregate)
+    summary = summary.to_pandas()
+    failed = summary["error"].notna()
+    assert failed.tolist() == [False, *[True] * len(BAD), False]
+    assert summary.loc[failed, "total_repaid"].isna().all()
+    assert summary.loc[~failed, "total_repaid"].notna().all()
+    assert aggregate.n_paths == 2
+    if detail:
+        assert set(months.column("borrower_id").to_pylist()) == {"good", "three years"}
+
+
+def test_summaries_match_the_engine_in_both_modes():
+    profiles = mixed_chunk()
+    expected = summarize_scenarios([profile_scenario(profiles.iloc[k].to_dict()) for k in (0, len(profiles) - 1)])
+    for detail in (False, True):
+        summary = simulate_profiles(profiles, detail=detail)[0].to_pandas().dropna(subset=["total_repaid"])
+        np.testing.assert_allclose(summary["total_repaid"], expected["total_repaid"], rtol=1e-12)
+        np.testing.assert_allclose(summary["interest_paid"], expected["interest_paid"], rtol=1e-12)
+
+
+def test_run_batch_writes_every_profile(tmp_path):
+    source = tmp_path / "borrowers.csv"
+    mixed_chunk().to_csv(source, index=False)
+    stats = run_batch(str(source), str(tmp_path / "summary.parquet"), str(tmp_path / "months.parquet"),
+                      workers=1, chunk_size=2)
+    assert (stats.profiles, stats.failed) == (len(BAD) + 2, len(BAD))
+    summary = pq.read_table(tmp_path / "summary.parquet").to_pandas()
+    assert summary["borrower_id"].tolist() == mixed_chunk()["borrower_id"].tolist()
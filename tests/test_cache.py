@@ -0,0 +1,147 @@
+import dataclasses
+import random
+
+import numpy as np
+
+from cache import ResultCache, normalize_scenario, scenario_key
+from engine import RESULT_COLUMNS, ExtraPaymentSegment, InflationSegment, SalarySegment, Scenario, simulate_repayment
+from plans import PLANS, plan_scenario
+
+BASE = Scenario(
+    starting_loan=64728.0,
+    salary_segments=(SalarySegment(30000.0, 5), SalarySegment(50000.0, 10), SalarySegment(70000.0, 0)),
+    inflation_segments=(InflationSegment(4.3, 0),),
+    start_year=2030,
+    extra_segments=(ExtraPaymentSegment(100.0, 1, 12),),
+)
+
+
+def key(scenario: Scenario) -> str:
+    return scenario_key(normalize_scenario(scenario))
+
+
+def test_equivalent_inputs_share_a_key():
+    variants = [
+        # Float noise in money amounts.
+        dataclasses.replace(BASE, starting_loan=64728.000000001),
+        # Rows after an indefinite row are never used.
+        dataclasses.replace(BASE, salary_segments=BASE.salary_segments + (SalarySegment(90000.0, 3),)),
+        # A last row that runs past the horizon is an indefinite one.
+        dataclasses.replace(BASE, salary_segments=BASE.salary_segments[:2] + (SalarySegment(70000.0, 60),)),
+        dataclasses.replace(BASE, inflation_segments=(InflationSegment(4.3, 50),)),
+        # Zero extra payments, and the order of overlapping extra rows.
+        dataclasses.replace(BASE, extra_segments=BASE.extra_segments + (ExtraPaymentSegment(0.0, 5, 3),)),
+    ]
+    for variant in variants:
+        assert key(variant) == key(BASE), variant
+
+    both = (ExtraPaymentSegment(100.0, 1, 12), ExtraPaymentSegment(50.0, 6, 0))
+    assert key(dataclasses.replace(BASE, extra_segments=both)) == \
+        key(dataclasses.replace(BASE, extra_segments=both[::-1]))
+
+
+def test_different_inputs_get_different_keys():
+    variants = [
+        dataclasses.replace(BASE, starting_loan=64728.01),
+        dataclasses.replace(BASE, start_year=2031),
+        dataclasses.replace(BASE, total_years=30),
+        dataclasses.replace(BASE, inflation_segments=(InflationSegment(4.3, 5), InflationSegment(3.0, 0))),
+        dataclasses.replace(BASE, extra_segments=(ExtraPaymentSegment(100.0, 2, 12),)),
+        plan_scenario(BASE, PLANS["plan_2"]),
+    ]
+    keys = {key(variant) for variant in variants}
+    assert len(keys) == len(variants) and key(BASE) not in keys
+
+
+def test_normalized_scenarios_simulate_identically():
+    rng = random.Random(0)
+    for _ in range(100):
+        scenario = Scenario(
+            starting_loan=rng.uniform(0, 100000),
+            salary_segments=tuple(SalarySegment(rng.uniform(0, 120000), rng.choice([0, 1, 5, 20, 50]))
+                                  for _ in range(rng.randint(1, 4))),
+            inflation_segments=tuple(InflationSegment(rng.uniform(0, 8), rng.choice([0, 3, 45]))
+                                     for _ in range(rng.randint(1, 3))),
+            start_year=2030,
+            extra_segments=tuple(ExtraPaymentSegment(rng.choice([0.0, 25.0, 100.0]), rng.randint(1, 480),
+                                                     rng.choice([0, 12, 600]))
+                                 for _ in range(rng.randint(0, 3))),
+        )
+        # Rounding to the penny is the one change normalization makes to the
+        # inputs, so compare against the rounded raw scenario.
+        rounded = dataclasses.replace(
+            scenario,
+            starting_loan=round(scenario.starting_loan, 2),
+            salary_segments=tuple(dataclasses.replace(seg, salary=round(seg.salary, 2))
+                                  for seg in scenario.salary_segments),
+            inflation_segments=tuple(dataclasses.replace(seg, inflation=round(seg.inflation, 6))
+                                     for seg in scenario.inflation_segments),
+        )
+        expected = simulate_repayment(rounded)
+        result = simulate_repayment(normalize_scenario(scenario))
+        assert result.loan_repaid_month == expected.loan_repaid_month
+        np.testing.assert_allclose(result.column("Loan Balance"), expected.column("Loan Balance"), rtol=1e-12)
+
+
+def random_timeline_scenario(rng: random.Random) -> Scenario:
+    # Page-precision amounts, so rounding leaves them alone, and timelines
+    # with fractional rows, rows that cover no months, and rows that stop
+    # short of the horizon or run past it.
+    years = [0, 0.04, 0.5, 1, 1.5, 3, 10, 45]
+    return Scenario(
+        starting_loan=rng.choice([0.0, 20000.0, 64728.0]),
+        salary_segments=tuple(SalarySegment(rng.choice([0.0, 28000.0, 52000.5]), rng.choice(years))
+                              for _ in range(rng.randint(0, 4))),
+        inflation_segments=tuple(InflationSegment(rng.choice([0.0, 1.5, 4.3, 7.25]), rng.choice(years))
+                                 for _ in range(rng.randint(0, 4))),
+        start_year=2030,
+        extra_segments=tuple(ExtraPaymentSegment(rng.choice([0.0, 25.0, 100.0]), rng.choice([-5, 1, 100, 480]),
+                                                 rng.choice([0, 12, 600]))
+                             for _ in range(rng.randint(0, 3))),
+    )
+
+
+def test_normalized_timelines_simulate_exactly_like_the_originals():
+    for seed in range(300):
+        scenario = random_timeline_scenario(random.Random(seed))
+        expected = simulate_repayment(scenario)
+        result = simulate_repayment(normalize_scenario(scenario))
+        assert result.loan_repaid_month == expected.loan_repaid_month, scenario
+        assert result.bracket_details == expected.bracket_details, scenario
+        for name in RESULT_COLUMNS:
+            np.testing.assert_array_equal(result.column(name), expected.column(name), err_msg=f"{name}: {scenario}")
+
+
+def test_rows_that_cover_no_months_do_not_change_the_padding():
+    # The engine pads with the last rate that covered any months (5%), so the
+    # 0.04-year row must not become the indefinite one.
+    short = dataclasses.replace(BASE, inflation_segments=(InflationSegment(5.0, 2), InflationSegment(1.0, 0.04)))
+    indefinite = dataclasses.replace(BASE, inflation_segments=(InflationSegment(5.0, 2), InflationSegment(1.0, 0)))
+    assert key(short) != key(indefinite)
+    assert key(short) == key(dataclasses.replace(BASE, inflation_segments=(InflationSegment(5.0, 0),)))
+
+
+def test_normalization_is_idempotent():
+    normalized = normalize_scenario(BASE)
+    assert normalize_scenario(normalized) == normalized
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache(max_bytes=3, ttl_seconds=None, sizeof=lambda value: 1)
+    for name in "abc":
+        cache.put(name, name)
+    cache.get("a")
+    cache.put("d", "d")
+    assert cache.get("b") is None and cache.get("a") == "a"
+    assert cache.stats().evictions == 1
+
+
+def test_entries_expire_after_their_ttl():
+    now = [0.0]
+    cache = ResultCache(ttl_seconds=10, clock=lambda: now[0])
+    cache.put("a", 1)
+    now[0] = 9.0
+    assert cache.get("a") == 1
+    now[0] = 10.5
+    assert cache.get("a") is None
+    assert cache.get_or_compute("a", lambda: 2) == 2
@@ -0,0 +1,79 @@
+import random
+
+import numpy as np
+import pytest
+
+import kernels
+from engine import (
+    RESULT_COLUMNS,
+    ExtraPaymentSegment,
+    InflationSegment,
+    SalarySegment,
+    Scenario,
+    simulate_repayment,
+    simulate_repayment_loop,
+    summarize_scenarios,
+)
+from plans import PLANS, plan_scenario
+
+
+def random_scenario(rng: random.Random) -> Scenario:
+    # Page-like timelines, with rows that stop short of the horizon or run
+    # past it, extra payments from before the horizon's end, and every plan.
+    salaries = tuple(SalarySegment(rng.choice([0.0, 20000.0, 28000.0, 52000.5, 90000.0, 150000.0]),
+                                   rng.choice([0, 1, 3, 10, 45]))
+                     for _ in range(rng.randint(1, 5)))
+    inflation = tuple(InflationSegment(rng.choice([0.0, 1.5, 4.3, 7.25]), rng.choice([0, 2, 10, 50]))
+                      for _ in range(rng.randint(1, 3)))
+    extras = tuple(ExtraPaymentSegment(rng.choice([0.0, 50.0, 333.33, 2000.0]), rng.choice([1, 5, 100, 470]),
+                                       rng.choice([0, 1, 12, 600]))
+                   for _ in range(rng.randint(0, 2)))
+    scenario = Scenario(rng.choice([0.0, 1000.0, 20000.0, 64728.0, 150000.0]), salaries, inflation,
+                        rng.randint(2024, 2034), extras)
+    plan = rng.choice([None, *PLANS.values()])
+    return scenario if plan is None else plan_scenario(scenario, plan)
+
+
+SCENARIOS = [random_scenario(random.Random(seed)) for seed in range(150)]
+
+
+@pytest.fixture(params=kernels.available_backends())
+def backend(request):
+    previous = kernels.active_backend()
+    kernels.set_backend(request.param)
+    yield request.param
+    kernels.set_backend(previous)
+
+
+def test_engine_matches_reference_loop(backend):
+    for scenario in SCENARIOS:
+        expected = simulate_repayment_loop(scenario)
+        result = simulate_repayment(scenario)
+        assert result.loan_repaid_month == expected.loan_repaid_month
+        assert result.bracket_details == expected.bracket_details
+        for name in RESULT_COLUMNS:
+            np.testing.assert_array_equal(result.column(name), expected.column(name), err_msg=name)
+
+
+def test_float32_results_round_the_float64_ones():
+    for scenario in SCENARIOS[:20]:
+        exact = simulate_repayment(scenario)
+        compact = simulate_repayment(scenario, dtype=np.float32)
+        assert compact.column("Loan Balance").dtype == np.float32
+        np.testing.assert_array_equal(compact.column("Loan Balance"), exact.column("Loan Balance").astype(np.float32))
+
+
+def test_batched_summaries_match_single_simulations(backend):
+    scenarios = SCENARIOS[:40]
+    summaries = summarize_scenarios(scenarios, balances=True)
+    for j, scenario in enumerate(scenarios):
+        result = simulate_repayment(scenario)
+        months = scenario.total_months
+        assert summaries["payoff_month"][j] == (result.loan_repaid_month or -1)
+        assert summaries["total_repaid"][j] == result.column("Cumulative Paid")[-1]
+        np.testing.assert_array_equal(summaries["balances"][:months, j], result.column("Loan Balance"))
+
+
+def test_empty_batch():
+    summaries = summarize_scenarios([])
+    assert all(len(values) == 0 for values in summaries.values())
@@ -0,0 +1,116 @@
+import io
+import re
+import xml.etree.ElementTree as ET
+import zipfile
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+import pytest
+
+import export
+from engine import ExtraPaymentSegment, InflationSegment, SalarySegment, Scenario, simulate_repayment
+from export import export_bytes, monte_carlo_reader, monthly_reader, sweep_reader
+from montecarlo import MonteCarloConfig, simulate_monte_carlo
+from sweep import SweepAxis, run_sweep
+
+SCENARIO = Scenario(
+    starting_loan=45000.0,
+    salary_segments=(SalarySegment(30000.0, 5), SalarySegment(52000.5, 0)),
+    inflation_segments=(InflationSegment(4.3, 0),),
+    start_year=2030,
+    extra_segments=(ExtraPaymentSegment(333.33, 13, 24),),
+)
+SHEET = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+
+def read_xlsx(data: bytes) -> list:
+    # Each worksheet's rows of cell values, read straight from the XML
+    # (strings are written inline; numbers and dates as numbers).
+    sheets = []
+    with zipfile.ZipFile(io.BytesIO(data)) as workbook:
+        names = sorted((name for name in workbook.namelist() if re.fullmatch(r"xl/worksheets/sheet\d+\.xml", name)),
+                       key=lambda name: int(re.search(r"\d+", name).group()))
+        for name in names:
+            rows = []
+            for row in ET.fromstring(workbook.read(name)).iter(f"{SHEET}row"):
+                values = [None] * 26  # blank cells stay None; the tables have under 26 columns
+                for cell in row.iter(f"{SHEET}c"):
+                    column = ord(cell.get("r")[0]) - ord("A")
+                    text = cell.find(f"{SHEET}is/{SHEET}t")
+                    values[column] = text.text if text is not None else float(cell.find(f"{SHEET}v").text)
+                rows.append(values)
+            sheets.append(rows)
+    return sheets
+
+
+def table_of(reader_factory, fmt: str) -> pa.Table:
+    data = export_bytes(reader_factory(), fmt)
+    if fmt == "parquet":
+        return pq.read_table(io.BytesIO(data))
+    return pacsv.read_csv(io.BytesIO(data), convert_options=pacsv.ConvertOptions(
+        column_types=reader_factory().schema))
+
+
+def readers():
+    result = simulate_repayment(SCENARIO)
+    sweep_result = run_sweep(SCENARIO, [SweepAxis("starting_loan", (0.0, 45000.0, 90000.0)),
+                                        SweepAxis("salary_scale", (0.5, 1.0))], workers=1)
+    mc_result = simulate_monte_carlo(SCENARIO, MonteCarloConfig(n_paths=200, seed=1))
+    return {
+        "monthly": lambda: monthly_reader(result, chunk_rows=100),
+        "sweep": lambda: sweep_reader(sweep_result, chunk_rows=4),
+        "monte_carlo": lambda: monte_carlo_reader(mc_result, chunk_rows=64),
+    }
+
+
+READERS = readers()
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "csv"])
+@pytest.mark.parametrize("name", READERS)
+def test_arrow_formats_round_trip(name, fmt):
+    expected = READERS[name]().read_all()
+    assert table_of(READERS[name], fmt).equals(expected)
+
+
+@pytest.mark.parametrize("name", READERS)
+def test_xlsx_round_trip(name):
+    expected = READERS[name]().read_all()
+    (rows,) = read_xlsx(export_bytes(READERS[name](), "xlsx"))
+    assert rows[0][:expected.num_columns] == expected.column_names
+    assert len(rows) == expected.num_rows + 1
+    assert all(value is None for row in rows for value in row[expected.num_columns:])
+    for k, field in enumerate(expected.schema):
+        values = [row[k] for row in rows[1:]]
+        column = expected.column(k)
+        if pa.types.is_date(field.type):
+            # Excel serial days from 1899-12-30.
+            days = column.cast(pa.int32()).to_numpy() + (np.datetime64("1970-01-01") - np.datetime64("1899-12-30"))
+            assert values == [float(day) for day in days.astype(int)]
+        else:
+            # Missing values are left blank; numbers keep Excel's 16 digits.
+            expected_values = column.to_pylist()
+            assert [value is None for value in values] == [value is None for value in expected_values], field.name
+            np.testing.assert_allclose([value for value in values if value is not None],
+                                       [value for value in expected_values if value is not None],
+                                       rtol=1e-15, err_msg=field.name)
+
+
+def test_monthly_table_matches_the_result():
+    result = simulate_repayment(SCENARIO)
+    table = monthly_reader(result, chunk_rows=7).read_all()
+    assert table.column_names == list(export.MONTHLY_COLUMNS)
+    for name in export.MONTHLY_COLUMNS:
+        if name not in ("Month", "Date"):
+            np.testing.assert_array_equal(table.column(name).to_numpy(), result.column(name), err_msg=name)
+
+
+def test_xlsx_starts_a_new_sheet_when_one_is_full(monkeypatch):
+    monkeypatch.setattr(export, "XLSX_MAX_ROWS", 101)
+    expected = READERS["monte_carlo"]().read_all()
+    sheets = read_xlsx(export_bytes(READERS["monte_carlo"](), "xlsx"))
+    assert [len(rows) for rows in sheets] == [101, 101]
+    assert [rows[1][0] for rows in sheets] == [0.0, 100.0]
+    assert sum(len(rows) - 1 for rows in sheets) == expected.num_rows
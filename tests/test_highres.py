@@ -0,0 +1,85 @@
+import dataclasses
+
+import numpy as np
+import pytest
+
+from engine import ExtraPaymentSegment, InflationSegment, SalarySegment, Scenario, build_schedules, simulate_repayment
+from highres import annual_rates, day_schedules, pay_days, simulate_high_resolution, summarize_high_resolution
+from plans import PLANS, plan_scenario
+
+BASE = Scenario(
+    starting_loan=20000.0,
+    salary_segments=(SalarySegment(30000.0, 5), SalarySegment(60000.0, 0)),
+    inflation_segments=(InflationSegment(3.0, 0),),
+    start_year=2030,
+    extra_segments=(ExtraPaymentSegment(100.0, 13, 24),),
+)
+
+
+def flat(scenario: Scenario, inflation: float) -> Scenario:
+    return dataclasses.replace(scenario, inflation_segments=(InflationSegment(inflation, 0),))
+
+
+@pytest.mark.parametrize("plan", [None, "plan_1", "plan_5"])
+def test_monthly_pay_without_interest_is_the_monthly_model(plan):
+    scenario = flat(BASE if plan is None else plan_scenario(BASE, PLANS[plan]), 0.0)
+    expected = simulate_repayment(scenario)
+    result, _ = simulate_high_resolution(scenario, "monthly")
+    assert result.loan_repaid_month == expected.loan_repaid_month
+    for name in ("Regular Payment", "Extra Payment", "Cumulative Paid", "Loan Balance"):
+        np.testing.assert_allclose(result.column(name), expected.column(name), rtol=1e-12, atol=1e-9, err_msg=name)
+
+
+@pytest.mark.parametrize("inflation", [1.0, 3.0, 7.0])
+@pytest.mark.parametrize("loan", [20000.0, 64728.0])
+def test_monthly_pay_at_a_flat_rate_is_close_to_the_monthly_model(inflation, loan):
+    # Only the daily accrual differs: a month of d days charges d / 365 of
+    # the annual rate rather than 1 / 12, which evens out over each year.
+    scenario = dataclasses.replace(flat(BASE, inflation), starting_loan=loan)
+    expected = simulate_repayment(scenario)
+    result, _ = simulate_high_resolution(scenario, "monthly")
+    assert result.loan_repaid_month == expected.loan_repaid_month
+    for name in ("Cumulative Paid", "Loan Balance"):
+        scale = np.abs(expected.column(name)).max()
+        np.testing.assert_allclose(result.column(name), expected.column(name), atol=5e-3 * scale, err_msg=name)
+
+
+@pytest.mark.parametrize("plan, change_month", [(None, 4), ("plan_2", 4), ("plan_1", 9)])
+def test_interest_rate_changes_once_a_year(plan, change_month):
+    scenario = dataclasses.replace(BASE, inflation_segments=(InflationSegment(2.0, 1), InflationSegment(8.0, 0)))
+    if plan is not None:
+        scenario = plan_scenario(scenario, PLANS[plan])
+    schedules = build_schedules(scenario)
+    margin = schedules.interest - schedules.inflation
+    rpi = annual_rates(scenario, schedules) - margin
+    # 2% from January until the second year's change month, 8% from then.
+    switch = 12 + change_month - 1
+    np.testing.assert_allclose(rpi[:switch], 2.0)
+    np.testing.assert_allclose(rpi[switch:], 8.0)
+    # The daily rate of each day follows its month's annual rate.
+    days = day_schedules(scenario, schedules, "monthly")
+    first_days = np.r_[0, np.cumsum(days.month_days)[:-1]]
+    assert days.day_rate[first_days[switch - 1]] < days.day_rate[first_days[switch]]
+
+
+@pytest.mark.parametrize("frequency, step", [("weekly", 7), ("four-weekly", 28)])
+def test_pay_days_are_fridays(frequency, step):
+    first_day = np.datetime64("2030-01-01")
+    month_days = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+    days = first_day + pay_days(first_day, month_days, frequency)
+    assert (days.astype(object)[0].weekday(), np.diff(days).astype(int).tolist()) == \
+        (4, [step] * (len(days) - 1))
+    assert days[0] == np.datetime64("2030-01-04")
+
+
+@pytest.mark.parametrize("frequency", ["weekly", "four-weekly", "monthly"])
+def test_summaries_match_single_simulations(frequency):
+    scenarios = [BASE, plan_scenario(BASE, PLANS["plan_2"]), dataclasses.replace(BASE, starting_loan=3000.0)]
+    summaries = summarize_high_resolution(scenarios, frequency, balances=True)
+    for j, scenario in enumerate(scenarios):
+        result, payoff_date = simulate_high_resolution(scenario, frequency)
+        assert summaries["payoff_month"][j] == (result.loan_repaid_month or -1)
+        assert (payoff_date is None) == (result.loan_repaid_month is None)
+        np.testing.assert_allclose(summaries["total_repaid"][j], result.column("Cumulative Paid")[-1], rtol=1e-12)
+        months = scenario.total_months
+        np.testing.assert_array_equal(summaries["balances"][:months, j], result.column("Loan Balance"))
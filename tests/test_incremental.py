@@ -0,0 +1,102 @@
+import dataclasses
+
+import numpy as np
+import pytest
+
+from engine import RESULT_COLUMNS, ExtraPaymentSegment, InflationSegment, SalarySegment, Scenario, simulate_repayment
+from incremental import first_changed_month, simulate_incremental
+from plans import PLANS, plan_scenario
+
+BASE = Scenario(
+    starting_loan=45000.0,
+    salary_segments=(SalarySegment(30000.0, 5), SalarySegment(50000.0, 10), SalarySegment(70000.0, 0)),
+    inflation_segments=(InflationSegment(4.3, 3), InflationSegment(3.0, 0)),
+    start_year=2030,
+    extra_segments=(ExtraPaymentSegment(100.0, 1, 12),),
+)
+
+
+def edit_salary(scenario, row, salary):
+    rows = list(scenario.salary_segments)
+    rows[row] = dataclasses.replace(rows[row], salary=salary)
+    return dataclasses.replace(scenario, salary_segments=tuple(rows))
+
+
+def edit_inflation(scenario, row, inflation):
+    rows = list(scenario.inflation_segments)
+    rows[row] = dataclasses.replace(rows[row], inflation=inflation)
+    return dataclasses.replace(scenario, inflation_segments=tuple(rows))
+
+
+def add_extra(scenario, amount, start_month, duration=0):
+    return dataclasses.replace(
+        scenario, extra_segments=scenario.extra_segments + (ExtraPaymentSegment(amount, start_month, duration),))
+
+
+# Each edit, and the first month it changes (None: nothing after the payoff changes).
+EDITS = {
+    "late salary": (lambda s: edit_salary(s, 2, 80000.0), 180),
+    "early salary": (lambda s: edit_salary(s, 0, 32000.0), 0),
+    "late inflation": (lambda s: edit_inflation(s, 1, 5.0), 36),
+    "early inflation": (lambda s: edit_inflation(s, 0, 2.0), 0),
+    "late extra payment": (lambda s: add_extra(s, 500.0, 121, 24), 120),
+    "extra payment from month 1": (lambda s: add_extra(s, 50.0, 1), 0),
+    "extra payment after payoff": (lambda s: add_extra(s, 500.0, 470), None),
+    "starting loan": (lambda s: dataclasses.replace(s, starting_loan=46000.0), 0),
+    "shorter horizon": (lambda s: dataclasses.replace(s, total_years=30), None),
+}
+
+
+def assert_same_result(result, expected):
+    assert result.loan_repaid_month == expected.loan_repaid_month
+    assert result.bracket_details == expected.bracket_details
+    for name in RESULT_COLUMNS:
+        np.testing.assert_array_equal(result.column(name), expected.column(name), err_msg=name)
+
+
+@pytest.mark.parametrize("plan", [None, "plan_2", "plan_5"])
+@pytest.mark.parametrize("edit", EDITS)
+def test_incremental_rerun_matches_a_full_run(edit, plan):
+    scenario = BASE if plan is None else plan_scenario(BASE, PLANS[plan])
+    change, first_month = EDITS[edit]
+    first, state = simulate_incremental(scenario)
+    assert_same_result(first, simulate_repayment(scenario))
+
+    edited = change(scenario)
+    result, state_after = simulate_incremental(edited, state)
+    assert_same_result(result, simulate_repayment(edited))
+    if plan is not None:
+        # Under a plan, an edit can leave the monthly inputs unchanged (a
+        # salary that stays under the threshold), so months resumed vary.
+        return
+    if first_month is not None:
+        assert state_after.resumed_month == first_month
+    elif state.loan_repaid_month is not None:
+        # Nothing before the payoff changed, so the run is reused whole.
+        assert state_after.resumed_month == state.simulated
+
+
+def test_edit_before_the_cached_prefix():
+    # A late edit resumes late; an earlier edit after it must not reuse the
+    # months the late run copied.
+    _, state = simulate_incremental(BASE)
+    late = edit_salary(BASE, 2, 80000.0)
+    _, state = simulate_incremental(late, state)
+    assert state.resumed_month == 180
+    earlier = edit_salary(late, 1, 40000.0)
+    result, state = simulate_incremental(earlier, state)
+    assert state.resumed_month == 60
+    assert_same_result(result, simulate_repayment(earlier))
+    # Undoing every edit goes back to the original results.
+    result, state = simulate_incremental(BASE, state)
+    assert_same_result(result, simulate_repayment(BASE))
+
+
+def test_first_changed_month():
+    _, state = simulate_incremental(BASE)
+    regular, extra, rate = state.regular.copy(), state.extra.copy(), state.rate.copy()
+    assert first_changed_month(state, BASE.starting_loan, regular, extra, rate) == len(regular)
+    assert first_changed_month(state, BASE.starting_loan + 1, regular, extra, rate) == 0
+    rate[200] += 1e-12
+    assert first_changed_month(state, BASE.starting_loan, regular, extra, rate) == 200
+    assert first_changed_month(state, BASE.starting_loan, regular[:100], extra[:100], rate[:100]) == 100
@@ -0,0 +1,70 @@
+import dataclasses
+
+import numpy as np
+import pytest
+
+import montecarlo
+from engine import InflationSegment, SalarySegment, Scenario, build_schedules, simulate_repayment
+from montecarlo import MonteCarloConfig, simulate_monte_carlo
+from plans import PLANS, plan_scenario
+
+# Whole-year timeline rows, so each path's salary and inflation change only
+# in January, as the simulated deviations do.
+BASE = Scenario(
+    starting_loan=64728.0,
+    salary_segments=(SalarySegment(30000.0, 5), SalarySegment(50000.0, 10), SalarySegment(70000.0, 0)),
+    inflation_segments=(InflationSegment(4.3, 10), InflationSegment(3.0, 0)),
+    start_year=2030,
+)
+# Repayment starting both before and after the plans' last scheduled
+# threshold changes, so some Aprils before the horizon are uprated.
+SCENARIOS = {
+    f"{plan}-{start_year}": plan_scenario(dataclasses.replace(BASE, start_year=start_year), PLANS[plan])
+    for plan in PLANS for start_year in (2021, 2030)
+}
+
+
+def path_scenario(scenario: Scenario, schedules, deviations: np.ndarray, factors: np.ndarray, path: int) -> Scenario:
+    # The deterministic scenario of one simulated path: a row a year.
+    n_years = len(deviations)
+    return dataclasses.replace(
+        scenario,
+        salary_segments=tuple(SalarySegment(float(schedules.salary[12 * y] * factors[y, path]), 1)
+                              for y in range(n_years)),
+        inflation_segments=tuple(InflationSegment(float(schedules.inflation[12 * y] + deviations[y, path]), 1)
+                                 for y in range(n_years)),
+    )
+
+
+@pytest.mark.parametrize("name", SCENARIOS)
+def test_each_path_is_simulated_as_the_engine_would_simulate_it(name):
+    scenario = SCENARIOS[name]
+    # No interest floor, so the engine sees the same rates as the paths.
+    config = MonteCarloConfig(n_paths=8, seed=3, inflation_volatility=1.5, inflation_floor=-100.0)
+    rng = np.random.default_rng(config.seed)
+    n_years = -(-scenario.total_months // 12)
+    deviations = montecarlo.inflation_deviations(rng, config, n_years)
+    factors = montecarlo.salary_factors(rng, config, n_years)
+    result = simulate_monte_carlo(scenario, config)
+    schedules = build_schedules(scenario)
+    for path in range(config.n_paths):
+        expected = simulate_repayment(path_scenario(scenario, schedules, deviations, factors, path))
+        assert (expected.loan_repaid_month or -1) == result.payoff_month[path]
+        np.testing.assert_allclose(result.total_repaid[path], expected.column("Cumulative Paid")[-1], rtol=1e-9)
+        np.testing.assert_allclose(result.written_off[path], max(expected.column("Loan Balance")[-1], 0.0),
+                                   rtol=1e-9, atol=1e-6)
+
+
+@pytest.mark.parametrize("name", SCENARIOS)
+def test_paths_without_volatility_are_the_deterministic_run(name):
+    scenario = SCENARIOS[name]
+    config = MonteCarloConfig(n_paths=3, seed=1, inflation_volatility=0.0, salary_volatility=0.0)
+    result = simulate_monte_carlo(scenario, config)
+    expected = simulate_repayment(scenario)
+    assert (result.payoff_month == (expected.loan_repaid_month or -1)).all()
+    np.testing.assert_allclose(result.total_repaid, expected.column("Cumulative Paid")[-1], rtol=1e-12)
+    balance = expected.column("Loan Balance")
+    for band in result.balance_bands:
+        # The bands are kept in float32.
+        np.testing.assert_allclose(result.balance_bands[band], balance, rtol=1e-6, atol=1e-2)
+
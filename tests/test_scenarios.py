@@ -0,0 +1,104 @@
+import dataclasses
+import json
+
+import numpy as np
+import pytest
+
+from engine import (
+    ExtraPaymentSegment,
+    InflationSegment,
+    InputError,
+    SalarySegment,
+    Scenario,
+    default_start_year,
+    summarize_scenarios,
+)
+from plans import PLANS, plan_scenario
+from scenarios import scenario_from_request, scenario_summaries
+
+REQUEST = {
+    "tuition": 9535, "maintenance": 6647, "study_years": 4,
+    "salary_rows": [{"salary": 30000, "years": 5}, {"salary": 50000, "years": 0}],
+    "inflation_rows": [{"inflation": 4.3, "years": 0}],
+    "extra_repayment_rows": [{"extra_payment": 100, "start_month": 1, "duration_months": 12}],
+}
+SCENARIO = Scenario(
+    starting_loan=(9535 + 6647) * 4,
+    salary_segments=(SalarySegment(30000.0, 5), SalarySegment(50000.0, 0)),
+    inflation_segments=(InflationSegment(4.3, 0),),
+    start_year=default_start_year(4),
+    extra_segments=(ExtraPaymentSegment(100.0, 1, 12),),
+)
+
+
+def test_request_gives_the_page_scenario():
+    assert scenario_from_request(REQUEST) == SCENARIO
+    assert scenario_from_request({**REQUEST, "start_year": 2031, "total_years": 25}) == \
+        dataclasses.replace(SCENARIO, start_year=2031, total_years=25)
+
+
+def test_plan_sets_the_constants_and_horizon():
+    scenario = scenario_from_request({**REQUEST, "plan": "plan_2"})
+    assert scenario == plan_scenario(SCENARIO, PLANS["plan_2"])
+    assert scenario.total_years == PLANS["plan_2"].write_off_years
+
+
+def test_starting_loan_replaces_the_loan_fields():
+    request = {key: value for key, value in REQUEST.items() if key not in ("tuition", "maintenance", "study_years")}
+    scenario = scenario_from_request({**request, "starting_loan": 50000})
+    assert scenario.starting_loan == 50000
+    # Without study_years, repayment starts next January.
+    assert scenario.start_year == default_start_year(0)
+
+
+def test_loan_fields_need_study_years():
+    request = {key: value for key, value in REQUEST.items() if key != "study_years"}
+    with pytest.raises(InputError, match="study_years"):
+        scenario_from_request(request)
+
+
+@pytest.mark.parametrize("value", ["NaN", "Infinity", "-Infinity"])
+@pytest.mark.parametrize("path", [
+    ("starting_loan",), ("tuition",), ("maintenance",), ("study_years",), ("start_year",), ("total_years",),
+    ("salary_rows", 1, "salary"), ("inflation_rows", 0, "inflation"), ("extra_repayment_rows", 0, "extra_payment"),
+])
+def test_non_finite_numbers_are_rejected(path, value):
+    request = json.loads(json.dumps(REQUEST))
+    target = request
+    for key in path[:-1]:
+        target = target[key]
+    target[path[-1]] = float(value)
+    # As Python's JSON parser reads them from a request body.
+    request = json.loads(json.dumps(request))
+    with pytest.raises(InputError):
+        scenario_from_request(request)
+
+
+def test_overflowing_loan_is_rejected():
+    with pytest.raises(InputError):
+        scenario_from_request({**REQUEST, "tuition": 1e308, "maintenance": 1e308})
+
+
+@pytest.mark.parametrize("request_data", [
+    "not an object",
+    {**REQUEST, "plan": "plan_9"},
+    {**REQUEST, "total_years": 0},
+    {**REQUEST, "salary_rows": {"salary": 30000}},
+    {**REQUEST, "salary_rows": [{"salary": 30000}]},
+    {**REQUEST, "inflation_rows": [{"inflation": "high", "years": 0}]},
+    {**REQUEST, "extra_repayment_rows": [{"extra_payment": 100, "start_month": 0, "duration_months": 12}]},
+    {key: value for key, value in REQUEST.items() if key != "salary_rows"},
+])
+def test_invalid_requests_raise_input_error(request_data):
+    with pytest.raises(InputError):
+        scenario_from_request(request_data)
+
+
+def test_summaries_match_the_engine():
+    scenarios = [SCENARIO, plan_scenario(SCENARIO, PLANS["plan_5"]), dataclasses.replace(SCENARIO, starting_loan=0.0)]
+    expected = summarize_scenarios(scenarios)
+    summaries = scenario_summaries(scenarios)
+    assert [s["payoff_month"] for s in summaries] == [int(m) if m > 0 else None for m in expected["payoff_month"]]
+    np.testing.assert_array_equal([s["total_repaid"] for s in summaries], expected["total_repaid"])
+    # Plain Python values, ready for json.dumps.
+    json.dumps(summaries, allow_nan=False)
@@ -0,0 +1,86 @@
+import dataclasses
+import os
+
+import pytest
+
+import solver
+from engine import ExtraPaymentSegment, InflationSegment, SalarySegment, Scenario, simulate_repayment
+from plans import PLANS, plan_scenario
+from solver import SolverError, break_even_salary, minimum_extra_payment
+
+BASE = Scenario(
+    starting_loan=64728.0,
+    salary_segments=(SalarySegment(30000.0, 5), SalarySegment(50000.0, 0)),
+    inflation_segments=(InflationSegment(4.3, 0),),
+    start_year=2030,
+    extra_segments=(ExtraPaymentSegment(50.0, 13, 24),),
+)
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = [BASE] + [plan_scenario(BASE, plan) for plan in PLANS.values()]
+TARGETS = (60, 120, 240)
+
+
+def repaid_by(scenario: Scenario, target_month: int) -> bool:
+    month = simulate_repayment(scenario).loan_repaid_month
+    return month is not None and month <= target_month
+
+
+def with_extra(scenario: Scenario, amount: float) -> Scenario:
+    return dataclasses.replace(scenario, extra_segments=scenario.extra_segments + (ExtraPaymentSegment(amount, 1, 0),))
+
+
+def with_salary(scenario: Scenario, salary: float) -> Scenario:
+    return dataclasses.replace(scenario, salary_segments=(SalarySegment(salary, 0),))
+
+
+@pytest.mark.parametrize("target", TARGETS)
+@pytest.mark.parametrize("scenario", SCENARIOS, ids=["default", *PLANS])
+def test_minimum_extra_payment_is_the_smallest_that_repays(scenario, target):
+    result = minimum_extra_payment(scenario, target)
+    assert result.value > 0
+    assert repaid_by(with_extra(scenario, result.value), target)
+    assert simulate_repayment(with_extra(scenario, result.value)).loan_repaid_month == result.payoff_month
+    assert not repaid_by(with_extra(scenario, round(result.value - 0.01, 2)), target)
+
+
+@pytest.mark.parametrize("target", TARGETS)
+@pytest.mark.parametrize("scenario", SCENARIOS, ids=["default", *PLANS])
+def test_break_even_salary_is_the_smallest_that_repays(scenario, target):
+    result = break_even_salary(scenario, target)
+    assert result.value > 0
+    assert repaid_by(with_salary(scenario, result.value), target)
+    assert simulate_repayment(with_salary(scenario, result.value)).loan_repaid_month == result.payoff_month
+    assert not repaid_by(with_salary(scenario, round(result.value - 0.01, 2)), target)
+
+
+def test_nothing_to_solve_when_already_repaid():
+    scenario = dataclasses.replace(BASE, starting_loan=1000.0)
+    assert minimum_extra_payment(scenario, 120).value == 0.0
+    assert break_even_salary(with_extra(scenario, 100.0), 120).value == 0.0
+
+
+def test_target_must_be_within_the_horizon():
+    with pytest.raises(ValueError):
+        minimum_extra_payment(BASE, 0)
+    with pytest.raises(ValueError):
+        break_even_salary(BASE, BASE.total_months + 1)
+
+
+def test_unreachable_targets_raise_solver_error(monkeypatch):
+    no_repayment = dataclasses.replace(BASE, plan=dataclasses.replace(BASE.plan, repayment_rate=0.0))
+    with pytest.raises(SolverError):
+        break_even_salary(no_repayment, 120)
+    monkeypatch.setattr(solver, "MAX_TRIALS", 0)
+    with pytest.raises(SolverError):
+        minimum_extra_payment(BASE, 12)
+
+
+def test_page_reports_an_unreachable_target(monkeypatch):
+    from streamlit.testing.v1 import AppTest
+
+    monkeypatch.setattr(solver, "MAX_TRIALS", 0)
+    page = AppTest.from_file(os.path.join(REPO, "a.py"), default_timeout=120)
+    page.run()
+    next(button for button in page.button if button.label == "Solve").click().run()
+    assert not page.exception
+    assert [error.value for error in page.error] == ["No value repays the loan by the target month"]
@@ -0,0 +1,120 @@
+import datetime
+import itertools
+import os
+import types
+
+import pytest
+
+import store
+from engine import InputError, default_start_year
+from store import ScenarioStore
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+REQUEST = {
+    "tuition": 9535, "maintenance": 6647, "study_years": 4,
+    "salary_rows": [{"salary": 30000, "years": 5}, {"salary": 50000, "years": 0}],
+    "inflation_rows": [{"inflation": 4.3, "years": 0}],
+    "extra_repayment_rows": [{"extra_payment": 100, "start_month": 1, "duration_months": 12}],
+}
+
+
+@pytest.fixture
+def scenario_store(tmp_path, monkeypatch):
+    # A clock that always moves on, so the order of saves is well defined.
+    ticks = itertools.count(1_700_000_000)
+    monkeypatch.setattr(store, "time", types.SimpleNamespace(time=lambda: float(next(ticks))))
+    return ScenarioStore(str(tmp_path / "scenarios.sqlite3"))
+
+
+def test_save_and_load_round_trip(scenario_store):
+    saved = scenario_store.save(REQUEST, "alice", "Baseline")
+    loaded = scenario_store.load(saved.token)
+    assert loaded.inputs == saved.inputs
+    assert loaded.summary == saved.summary
+    assert loaded.inputs["tuition"] == 9535 and loaded.inputs["maintenance"] == 6647
+    # A fresh connection to the same file sees the same row.
+    assert ScenarioStore(scenario_store.path).load(saved.token) == loaded
+    assert scenario_store.load("no-such-token") is None
+
+
+def test_identical_inputs_share_a_token(scenario_store):
+    first = scenario_store.save(REQUEST, "alice", "Baseline")
+    # The same inputs, with float noise and a row past an indefinite one.
+    noisy = {**REQUEST, "tuition": 9535.000000001,
+             "salary_rows": REQUEST["salary_rows"] + [{"salary": 90000, "years": 3}]}
+    assert scenario_store.save(noisy, "bob", "Copy").token == first.token
+
+
+def test_a_different_loan_split_gets_its_own_token(scenario_store):
+    first = scenario_store.save(REQUEST, "alice", "Baseline")
+    split = scenario_store.save({**REQUEST, "tuition": 9635, "maintenance": 6547}, "alice", "Split")
+    assert split.token != first.token
+    assert scenario_store.load(split.token).inputs["tuition"] == 9635
+
+
+def test_list_saved_and_forget(scenario_store):
+    first = scenario_store.save(REQUEST, "alice", "Baseline")
+    second = scenario_store.save({**REQUEST, "study_years": 3}, "alice", "Three years")
+    scenario_store.save(REQUEST, "bob", "Bob's")
+    assert [s.name for s in scenario_store.list_saved("alice")] == ["Three years", "Baseline"]
+
+    # Saving again renames it and moves it to the top.
+    scenario_store.save(REQUEST, "alice", "Renamed")
+    listed = scenario_store.list_saved("alice")
+    assert [(s.token, s.name) for s in listed] == [(first.token, "Renamed"), (second.token, "Three years")]
+    assert [s.name for s in scenario_store.list_saved("alice", limit=1, before=listed[0].saved_at)] == ["Three years"]
+
+    scenario_store.forget("alice", first.token)
+    assert [s.token for s in scenario_store.list_saved("alice")] == [second.token]
+    # Still there for Bob, and for anyone holding the token.
+    assert [s.token for s in scenario_store.list_saved("bob")] == [first.token]
+    assert scenario_store.load(first.token) is not None
+
+
+def test_invalid_inputs_are_not_saved(scenario_store):
+    with pytest.raises(InputError):
+        scenario_store.save({**REQUEST, "salary_rows": "30000"}, "alice", "Broken")
+    assert scenario_store.list_saved("alice") == []
+
+
+def open_page(monkeypatch, path, token):
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    # The page keeps one store per process; point it at this test's database.
+    monkeypatch.setenv("LOAN_STORE_PATH", path)
+    st.cache_resource.clear()
+    page = AppTest.from_file(os.path.join(REPO, "a.py"), default_timeout=120)
+    page.query_params["s"] = token
+    page.run()
+    assert not page.exception
+    return page
+
+
+def first_month(page) -> datetime.date:
+    next(button for button in page.button if button.label == "Run Simulation").click().run()
+    assert not page.exception
+    monthly = next(table.value for table in page.dataframe if "Date" in table.value.columns)
+    return monthly["Date"].iloc[0]
+
+
+def test_shared_link_restores_the_saved_start_year(tmp_path, monkeypatch):
+    path = str(tmp_path / "scenarios.sqlite3")
+    # Saved by someone whose default start year was not this year's.
+    start_year = default_start_year(3) + 1
+    saved = ScenarioStore(path).save({**REQUEST, "study_years": 3, "start_year": start_year, "plan": "plan_5"},
+                                     "alice", "Baseline")
+    page = open_page(monkeypatch, path, saved.token)
+    assert page.number_input(key="study_years").value == 3
+    assert page.selectbox(key="repayment_plan").value == "plan_5"
+    assert first_month(page) == datetime.date(start_year, 1, 1)
+
+    # Saving the loaded inputs again from the page gives the same link.
+    next(button for button in page.button if button.label == "Save Scenario").click().run()
+    assert not page.exception
+    assert [code.value for code in page.code] == [f"?s={saved.token}"]
+
+    # Changing the years of study moves the start year with them, as usual.
+    page.number_input(key="study_years").set_value(2).run()
+    assert first_month(page) == datetime.date(default_start_year(2), 1, 1)
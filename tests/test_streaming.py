@@ -0,0 +1,85 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from engine import InflationSegment, SalarySegment, Scenario
+from montecarlo import MonteCarloConfig, stream_monte_carlo
+from streaming import METRICS, MonthlyAggregate, QuantileSketch
+
+PERCENTILES = (0, 1, 5, 25, 50, 75, 95, 99, 100)
+
+
+def sample(seed: int, n_months: int = 24, n_paths: int = 2000) -> np.ndarray:
+    # Balances over several orders of magnitude, some of them repaid.
+    rng = np.random.default_rng(seed)
+    values = rng.lognormal(9, 2, (n_months, n_paths))
+    values[rng.random(values.shape) < 0.1] = 0.0
+    return np.minimum(values, 5e7)
+
+
+@pytest.mark.parametrize("accuracy", [0.01, 0.05])
+def test_percentiles_are_within_the_relative_accuracy(accuracy):
+    values = sample(0)
+    sketch = QuantileSketch.empty(len(values), accuracy)
+    sketch.add(values)
+    exact = np.percentile(values, PERCENTILES, axis=1)
+    # Values up to a penny are read back as zero; float32 rounding moves a
+    # bucket edge by about 1e-5 of its value.
+    np.testing.assert_allclose(sketch.percentiles(PERCENTILES), exact, rtol=accuracy * (1 + 1e-4), atol=0.01)
+
+
+def test_merged_chunks_match_one_sketch_of_every_path():
+    values = sample(1)
+    whole = QuantileSketch.empty(len(values))
+    whole.add(values)
+    merged = QuantileSketch.empty(len(values))
+    for chunk in np.array_split(values, 5, axis=1):
+        part = QuantileSketch.empty(len(values))
+        # A year at a time, as the Monte Carlo simulation adds them.
+        part.add(chunk[:12])
+        part.add(chunk[12:], first_month=12)
+        merged.merge(part)
+    np.testing.assert_array_equal(merged.counts, whole.counts)
+    np.testing.assert_array_equal(merged.maximum, whole.maximum)
+    np.testing.assert_array_equal(merged.percentiles(), whole.percentiles())
+
+
+def test_only_matching_layouts_merge():
+    with pytest.raises(ValueError):
+        QuantileSketch.empty(12).merge(QuantileSketch.empty(24))
+    with pytest.raises(ValueError):
+        QuantileSketch.empty(12, 0.01).merge(QuantileSketch.empty(12, 0.02))
+
+
+def test_pickle_round_trip_is_exact():
+    aggregate = MonthlyAggregate.empty(24)
+    values = sample(2)
+    aggregate.update(values, np.cumsum(values, axis=0))
+    aggregate.add_payoffs(np.where(values[-1] > 0, -1, 24))
+    restored = pickle.loads(pickle.dumps(aggregate))
+    for metric in METRICS:
+        np.testing.assert_array_equal(restored.sketches[metric].counts, aggregate.sketches[metric].counts)
+        np.testing.assert_array_equal(restored.sketches[metric].maximum, aggregate.sketches[metric].maximum)
+    np.testing.assert_array_equal(restored.payoff_counts, aggregate.payoff_counts)
+
+
+def test_empty_months_read_back_as_nan():
+    assert np.isnan(QuantileSketch.empty(3).percentiles()).all()
+
+
+def test_streamed_monte_carlo_does_not_depend_on_the_workers():
+    scenario = Scenario(
+        starting_loan=45000.0,
+        salary_segments=(SalarySegment(28000.0, 5), SalarySegment(45000.0, 0)),
+        inflation_segments=(InflationSegment(3.0, 0),),
+        start_year=2030,
+        total_years=10,
+    )
+    config = MonteCarloConfig(n_paths=1000, seed=7)
+    single = stream_monte_carlo(scenario, config, chunk_paths=300)
+    parallel = stream_monte_carlo(scenario, config, chunk_paths=300, workers=2)
+    assert single.n_paths == parallel.n_paths == 1000
+    np.testing.assert_array_equal(single.payoff_counts, parallel.payoff_counts)
+    for metric in METRICS:
+        np.testing.assert_array_equal(single.sketches[metric].counts, parallel.sketches[metric].counts)
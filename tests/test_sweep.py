@@ -0,0 +1,94 @@
+import dataclasses
+
+import numpy as np
+import pytest
+
+import sweep
+from engine import ExtraPaymentSegment, InflationSegment, SalarySegment, Scenario, summarize_scenarios
+from plans import PLANS, plan_scenario
+from sweep import SweepAxis, run_sweep
+
+BASE = Scenario(
+    starting_loan=64728.0,
+    salary_segments=(SalarySegment(30000.0, 5), SalarySegment(50000.0, 10), SalarySegment(70000.0, 0)),
+    inflation_segments=(InflationSegment(4.3, 3), InflationSegment(3.0, 0)),
+    start_year=2030,
+    extra_segments=(ExtraPaymentSegment(100.0, 1, 12),),
+)
+AXES = {
+    "starting_loan": (20000.0, 90000.0),
+    "starting_salary": (25000.0, 45000.0),
+    "salary_scale": (0.8, 1.5),
+    "inflation": (0.0, 2.0, 6.5),
+    "inflation_shift": (-1.0, 0.0, 2.5),
+    "extra_payment": (0.0, 250.0),
+}
+
+
+def point_scenario(scenario: Scenario, parameter: str, value: float) -> Scenario:
+    # The scenario a sweep point stands for, built as the page would build it.
+    if parameter == "starting_loan":
+        return dataclasses.replace(scenario, starting_loan=value)
+    if parameter == "starting_salary":
+        first, *rest = scenario.salary_segments
+        return dataclasses.replace(scenario, salary_segments=(dataclasses.replace(first, salary=value), *rest))
+    if parameter == "salary_scale":
+        return dataclasses.replace(scenario, salary_segments=tuple(
+            dataclasses.replace(seg, salary=seg.salary * value) for seg in scenario.salary_segments))
+    if parameter == "inflation":
+        return dataclasses.replace(scenario, inflation_segments=(InflationSegment(value, 0),))
+    if parameter == "inflation_shift":
+        return dataclasses.replace(scenario, inflation_segments=tuple(
+            dataclasses.replace(seg, inflation=seg.inflation + value) for seg in scenario.inflation_segments))
+    return dataclasses.replace(scenario, extra_segments=scenario.extra_segments + (ExtraPaymentSegment(value, 1, 0),))
+
+
+def assert_matches_engine(scenario, axes, result):
+    for index in np.ndindex(result.shape):
+        point = scenario
+        for axis, i in zip(axes, index):
+            point = point_scenario(point, axis.parameter, axis.values[i])
+        expected = summarize_scenarios([point])
+        assert result.payoff_month[index] == expected["payoff_month"][0], (index, point)
+        for key in ("total_repaid", "interest_paid", "written_off"):
+            np.testing.assert_allclose(getattr(result, key)[index], expected[key][0], rtol=1e-9, atol=1e-6,
+                                       err_msg=f"{key} at {index}")
+
+
+@pytest.mark.parametrize("plan", [None, *PLANS])
+@pytest.mark.parametrize("parameter", AXES)
+def test_sweep_matches_the_engine(plan, parameter):
+    scenario = BASE if plan is None else plan_scenario(BASE, PLANS[plan])
+    axes = [SweepAxis(parameter, AXES[parameter])]
+    assert_matches_engine(scenario, axes, run_sweep(scenario, axes, workers=1))
+
+
+@pytest.mark.parametrize("plan", ["plan_2", "plan_5"])
+def test_swept_inflation_uprates_each_point(plan):
+    # Under a plan whose thresholds rise with the RPI, each point's
+    # thresholds and interest tiers follow its own inflation.
+    scenario = plan_scenario(BASE, PLANS[plan])
+    axes = [SweepAxis("inflation", (2.0, 6.0)), SweepAxis("salary_scale", (1.0, 1.3))]
+    result = run_sweep(scenario, axes, workers=1)
+    assert_matches_engine(scenario, axes, result)
+    assert result.total_repaid[0, 0] != result.total_repaid[1, 0]
+
+
+def test_pool_matches_in_process(monkeypatch):
+    scenario = plan_scenario(BASE, PLANS["plan_2"])
+    axes = [SweepAxis.linspace("inflation_shift", -1, 3, 9), SweepAxis.linspace("starting_loan", 10000, 90000, 9)]
+    expected = run_sweep(scenario, axes, workers=1)
+    monkeypatch.setattr(sweep, "MIN_POOL_POINTS", 0)
+    try:
+        result = run_sweep(scenario, axes, workers=2, chunk_size=10)
+    finally:
+        sweep.shutdown_pool()
+    for key in sweep.OUTPUTS:
+        np.testing.assert_array_equal(getattr(result, key), getattr(expected, key), err_msg=key)
+
+
+def test_each_parameter_is_swept_once():
+    with pytest.raises(ValueError):
+        run_sweep(BASE, [SweepAxis("inflation", (1.0,)), SweepAxis("inflation", (2.0,))])
+    with pytest.raises(ValueError):
+        SweepAxis("interest", (1.0,))
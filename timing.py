@@ -0,0 +1,221 @@
+"""Lightweight timing spans for the simulation and the page.
+
+    with timing.trace("run_simulation") as run:
+        with timing.span("build_schedules"):
+            ...
+    run.stages()  # {"build_schedules": seconds, ...}
+
+A trace collects the spans that finish while it is active in the current
+thread (each Streamlit script run has its own).  Every span, and every
+trace as a whole, is also added to a process-wide registry that keeps a
+count, a total and the most recent durations of each stage, from which
+:func:`stage_stats` reports p50/p95.  The registry can be exported in the
+Prometheus text format (:func:`prometheus_text`, served by
+:func:`start_metrics_server`), and each finished trace is logged as one JSON
+line on the ``loan.timing`` logger at INFO level (set
+``LOAN_TIMING_LOG=1`` to print these to stderr without configuring logging).
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("loan.timing")
+if os.environ.get("LOAN_TIMING_LOG"):
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+WINDOW = 1024  # most recent durations kept per stage for the percentiles
+
+
+# -------------------------
+# Process-Wide Registry
+# -------------------------
+@dataclass(frozen=True)
+class StageStats:
+    count: int
+    total: float  # seconds
+    p50: float  # over the most recent WINDOW durations
+    p95: float
+
+
+class _Registry:
+    def __init__(self, window: int = WINDOW):
+        self.window = window
+        self._stages = {}  # name -> [count, total, deque of recent durations]
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                stage = self._stages[name] = [0, 0.0, deque(maxlen=self.window)]
+            stage[0] += 1
+            stage[1] += seconds
+            stage[2].append(seconds)
+
+    def stats(self) -> Dict[str, StageStats]:
+        with self._lock:
+            stages = {name: (count, total, list(recent)) for name, (count, total, recent) in self._stages.items()}
+        result = {}
+        for name, (count, total, recent) in stages.items():
+            p50, p95 = np.percentile(recent, [50, 95])
+            result[name] = StageStats(count=count, total=total, p50=float(p50), p95=float(p95))
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stages.clear()
+
+
+_registry = _Registry()
+
+
+def stage_stats() -> Dict[str, StageStats]:
+    """Per-stage statistics of every span recorded in this process."""
+    return _registry.stats()
+
+
+def reset() -> None:
+    _registry.clear()
+
+
+# -------------------------
+# Traces and Spans
+# -------------------------
+@dataclass
+class Trace:
+    name: str
+    spans: List[Tuple[str, float]] = field(default_factory=list)  # in the order they finished
+    seconds: Optional[float] = None  # set when the trace is finished
+    _start: float = field(default_factory=time.perf_counter, repr=False)
+    _token: Optional[contextvars.Token] = field(default=None, repr=False)
+
+    def stages(self) -> Dict[str, float]:
+        # Seconds per stage; a stage that ran more than once is added up.
+        totals = {}
+        for name, seconds in self.spans:
+            totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar("loan_timing_trace", default=None)
+
+
+def record(name: str, seconds: float) -> None:
+    """Record a stage that took ``seconds`` (what :func:`span` does on exit)."""
+    _registry.record(name, seconds)
+    trace = _current.get()
+    if trace is not None:
+        trace.spans.append((name, seconds))
+
+
+@contextmanager
+def span(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+class Stopwatch:
+    """Records consecutive stages of straight-line code without nesting it:
+    each :meth:`lap` records the time since the previous one."""
+
+    def __init__(self):
+        self._last = time.perf_counter()
+
+    def lap(self, name: str) -> float:
+        now = time.perf_counter()
+        seconds = now - self._last
+        self._last = now
+        record(name, seconds)
+        return seconds
+
+
+def start_trace(name: str) -> Trace:
+    trace = Trace(name)
+    trace._token = _current.set(trace)
+    return trace
+
+
+def finish_trace(trace: Trace) -> Trace:
+    trace.seconds = time.perf_counter() - trace._start
+    if trace._token is not None:
+        try:
+            _current.reset(trace._token)
+        except ValueError:  # finished in a different context than it started in
+            _current.set(None)
+        trace._token = None
+    _registry.record(trace.name, trace.seconds)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({
+            "event": "timings",
+            "trace": trace.name,
+            "seconds": round(trace.seconds, 6),
+            "stages": {name: round(seconds, 6) for name, seconds in trace.stages().items()},
+        }))
+    return trace
+
+
+@contextmanager
+def trace(name: str):
+    current = start_trace(name)
+    try:
+        yield current
+    finally:
+        finish_trace(current)
+
+
+# -------------------------
+# Prometheus Export
+# -------------------------
+def prometheus_text(prefix: str = "loan_stage_seconds") -> str:
+    """The registry as a Prometheus summary, in the text exposition format."""
+    lines = [
+        f"# HELP {prefix} Seconds spent in each stage of the simulation and page.",
+        f"# TYPE {prefix} summary",
+    ]
+    for name, stats in sorted(stage_stats().items()):
+        label = name.replace("\\", "\\\\").replace('"', '\\"')
+        lines.append(f'{prefix}{{stage="{label}",quantile="0.5"}} {stats.p50:.9g}')
+        lines.append(f'{prefix}{{stage="{label}",quantile="0.95"}} {stats.p95:.9g}')
+        lines.append(f'{prefix}_sum{{stage="{label}"}} {stats.total:.9g}')
+        lines.append(f'{prefix}_count{{stage="{label}"}} {stats.count}')
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve ``/metrics`` from a background thread of this process."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="loan-metrics", daemon=True).start()
+    return server
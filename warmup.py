@@ -0,0 +1,128 @@
+"""Warming up a server process before it takes traffic.
+
+    python warmup.py                  # time each warm-up stage in this process
+    python warmup.py --imports        # cold import time of each module the page loads
+    python warmup.py serve [options]  # warm up, then run the page (``streamlit run a.py [options]``)
+
+A fresh process pays for its imports and for loading (or compiling) the
+numba kernels on first use, i.e. in the first visitor's page run.
+:func:`warm_up` does all of that up front.  ``serve`` runs it in the
+Streamlit server's own process before the server starts listening, so the
+first page run finds everything loaded; ``api.py`` calls it before forking
+its workers.  The page also starts it in a background thread once per
+process, after its first run (a no-op if it was already warmed).
+
+Measured with ``--imports`` and ``python warmup.py`` on a 1-CPU container
+(Python 3.11, pandas 3.0, numba kernel cache on disk), cold, in the order
+the page needs them::
+
+    streamlit         522 ms   server start
+    numpy              68 ms   first page run
+    pandas            375 ms   first page run
+    engine modules     20 ms   first page run
+    numba + kernels   450 ms   first simulation
+    feature modules    27 ms   first use of each page section (Monte Carlo, sweep, downloads, ...)
+    altair            243 ms   first line chart
+    plotly.express     81 ms   first pie chart, histogram or heatmap
+
+Before this, plotly.express and every feature module were imported by
+every first page run.  The kernel time is importing numba and loading both
+compiled kernels from its cache; the first run after installing compiles
+them instead, which takes several seconds.
+"""
+import importlib
+import os
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Imported in this order by every page run; the engine modules are imported together.
+PAGE_IMPORTS = ("numpy", "pandas")
+ENGINE_MODULES = ("kernels", "timing", "engine", "cache", "charts", "plans", "analytic")
+# Imported by the page section that needs them, on its first use.
+FEATURE_MODULES = ("incremental", "highres", "streaming", "montecarlo", "sweep", "export", "solver", "overpay",
+                   "scenarios", "store")
+CHART_IMPORTS = ("altair", "plotly.express")
+
+
+def _warm_kernels() -> None:
+    # One tiny simulation per kernel: loads (or compiles) the active backend.
+    import kernels
+    from engine import Scenario, simulate_repayment, summarize_scenarios
+    from highres import simulate_high_resolution
+
+    kernels.active_backend()
+    scenario = Scenario(1000.0, (), (), 2030, total_years=1)
+    simulate_repayment(scenario)
+    summarize_scenarios([scenario])
+    simulate_high_resolution(scenario)
+
+
+def warm_up(page: bool = True, progress: Optional[Callable[[str, float], None]] = None) -> Dict[str, float]:
+    """Import the engine (and, with ``page``, the feature modules and the
+    chart libraries) and warm up the kernels.  Returns the seconds spent in each stage."""
+    stages: List[Tuple[str, Callable[[], object]]] = [
+        *((f"import {name}", lambda name=name: importlib.import_module(name)) for name in PAGE_IMPORTS),
+        ("import engine modules", lambda: [importlib.import_module(name) for name in ENGINE_MODULES]),
+        ("kernels", _warm_kernels),
+    ]
+    if page:
+        stages.append(("import feature modules", lambda: [importlib.import_module(name) for name in FEATURE_MODULES]))
+        stages += [(f"import {name}", lambda name=name: importlib.import_module(name)) for name in CHART_IMPORTS]
+    timings = {}
+    for name, stage in stages:
+        start = time.perf_counter()
+        stage()
+        timings[name] = time.perf_counter() - start
+        if progress:
+            progress(name, timings[name])
+    return timings
+
+
+def import_breakdown(modules=("streamlit", *PAGE_IMPORTS, *ENGINE_MODULES, *FEATURE_MODULES,
+                              *CHART_IMPORTS)) -> Dict[str, float]:
+    """Cold import seconds of each of ``modules``, imported in order in a
+    fresh interpreter (each one's time excludes what earlier ones loaded)."""
+    code = "; ".join(f"import {name}" for name in modules)
+    here = os.path.dirname(os.path.abspath(__file__))
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=here, capture_output=True, text=True, check=True,
+    )
+    # Lines are "import time: self [us] | cumulative | name"; nested imports
+    # are indented, so the unindented names are the top-level ones.
+    cumulative = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, total, name = line.split("|")
+        if name.startswith("  ") or not total.strip().isdigit():
+            continue
+        cumulative[name.strip()] = int(total) / 1e6
+    return {name: cumulative.get(name, 0.0) for name in modules}
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv[:1] == ["serve"]:
+        warm_up(progress=lambda name, seconds: print(f"Warm-up: {name} {seconds * 1000:.0f} ms", file=sys.stderr))
+        from streamlit.web import cli
+
+        page = os.path.join(os.path.dirname(os.path.abspath(__file__)), "a.py")
+        sys.argv = ["streamlit", "run", page, *argv[1:]]
+        return cli.main()
+    if argv == ["--imports"]:
+        for name, seconds in import_breakdown().items():
+            print(f"{name:20s} {seconds * 1000:8.1f} ms")
+        return 0
+    if argv:
+        print(__doc__.split("\n\n")[0], file=sys.stderr)
+        return 2
+    for name, seconds in warm_up().items():
+        print(f"{name:24s} {seconds * 1000:8.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())